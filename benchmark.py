@@ -0,0 +1,276 @@
+"""Benchmarks of the dashboard's data path on synthetic catalogues.
+
+    python benchmark.py --rows 10000 100000 1000000 -o bench.json
+    python benchmark.py --rows 10000 100000 --compare bench.json
+
+For every catalogue size a synthetic CSV shaped like the real one (see
+music_data/synthetic.py) is generated once and kept under the cache
+directory, then one fresh process per size times each stage of what a
+dashboard session does with it:
+
+* load_data, prepare_data: reading and cleaning the CSV
+* year_cube, range_index, ranked_index, trend_engine, album_index: the
+  per-dataset aggregates
+* lyrics_index, similarity_index: the jieba lyrics index and the
+  nearest-neighbour table of Song Details
+* year_filter: the rows of the middle half of the release years
+* pie_aggregation: load_pie_counts' value counts over those rows,
+  and pie_aggregation_cube: the year cube's counts for the same range
+* top_tracks: the ranked indexes' top-K over those rows,
+  and top_tracks_cube: the year cube's top-K for the same range
+* time_series: the aggregates show_time_series_dashboard draws
+* correlation: the correlation page's Pearson and Spearman tables over
+  those rows
+
+Each stage runs --repeat times; its best and median times are kept with
+the process's peak resident memory after it (a stage that raised the
+peak shows as peak_growth). The results are written as JSON, tagged with
+the git commit, so runs on two commits can be compared with --compare,
+which exits with 1 when a stage got slower than --tolerance allows.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from music_data.disk_cache import CACHE_ROOT
+from music_data.synthetic import SYNTHETIC_VERSION, write_catalogue
+
+BENCHMARK_DIR = CACHE_ROOT / 'benchmark'
+DEFAULT_ROWS = [10_000, 100_000]
+# Timing compared by --compare; stages faster than MIN_COMPARED_MS in both runs are too noisy to flag
+COMPARED = 'best_ms'
+MIN_COMPARED_MS = 1.0
+
+
+def peak_memory():
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # Linux reports KiB
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def catalogue_path(n_rows, seed=0):
+    """Synthetic CSV of n_rows, generated on first use."""
+    path = BENCHMARK_DIR / f'tracks_{n_rows}_seed{seed}_v{SYNTHETIC_VERSION}.csv'
+    if not path.exists():
+        BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        write_catalogue(n_rows, tmp_path, seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def run_stage(stages, name, func, repeat):
+    """Runs func repeat times and records its timings; returns its last result."""
+    peak_before = peak_memory()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+    peak_after = peak_memory()
+    stages[name] = {
+        'best_ms': min(times),
+        'median_ms': statistics.median(times),
+        'peak_memory': peak_after,
+        'peak_growth': peak_after - peak_before,
+    }
+    return result
+
+
+def benchmark_catalogue(csv_path, repeat):
+    """{stage: timings} of the dashboard's data path on one CSV (run in a fresh process)."""
+    import streamlit.logger
+    # Quiet the "No runtime found" warnings of importing the app outside `streamlit run`, and the cleaning report
+    streamlit.logger.set_log_level('error')
+    logging.getLogger('music_data').setLevel(logging.ERROR)
+    import streamlit_dashboard as dashboard
+    from music_data.aggregates import YearCube, limit_categories
+    from music_data.albums import AlbumIndex
+    from music_data.app_data import RANGE_FILTER_EDGES, load_data, prepare_data
+    from music_data.correlation import FEATURE_COLS, TARGET_COLS, correlation_table
+    from music_data.lyrics import TermIndex, tokenize_texts
+    from music_data.range_index import RangeIndex
+    from music_data.similarity import SimilarityIndex
+    from music_data.timeseries import TrendEngine
+    from music_data.topk import RankedIndex, metric_values
+    from music_data.views import TableView
+
+    stages = {}
+    raw = run_stage(stages, 'load_data', lambda: load_data(csv_path), repeat)
+    df = run_stage(stages, 'prepare_data', lambda: prepare_data(raw, csv_path), repeat)
+    del raw
+    pie_cols = dashboard.pie_chart_columns(df.columns)
+    cube = run_stage(
+        stages, 'year_cube', lambda: YearCube(df, pie_cols, dashboard.TOP_TRACK_COLS, top_k=dashboard.TOP_K), repeat
+    )
+    range_index = run_stage(stages, 'range_index', lambda: RangeIndex(df, RANGE_FILTER_EDGES), repeat)
+    ranked = run_stage(
+        stages, 'ranked_index',
+        lambda: {col: RankedIndex(metric_values(df[col])) for col in dashboard.TOP_TRACK_COLS}, repeat
+    )
+    trends = run_stage(stages, 'trend_engine', lambda: TrendEngine(df), repeat)
+    run_stage(stages, 'album_index', lambda: AlbumIndex(df), repeat)
+    lyrics_index = None
+    if 'lyrics_text' in df.columns:
+        # Segmented words are persisted, so runs after the first time the index from cached tokens
+        lyrics_index = run_stage(stages, 'lyrics_index', lambda: TermIndex(tokenize_texts(df['lyrics_text'])), repeat)
+    run_stage(stages, 'similarity_index', lambda: SimilarityIndex(df, lyrics_index), repeat)
+
+    # The middle half of the years, as a user narrowing the slider would pick
+    years = cube.years
+    year_range = (int(years[len(years) // 4]), int(years[3 * len(years) // 4])) if len(years) else None
+    rows = run_stage(stages, 'year_filter', lambda: range_index.rows(year_range), repeat)
+    view = TableView(df, rows)
+
+    def pie_aggregation():
+        # load_pie_counts with a range filter set, without caching or drawing
+        for col in pie_cols:
+            value_counts = view[col].value_counts()
+            limit_categories(value_counts[value_counts > 0], dashboard.PIE_MAX_SLICES)
+
+    def pie_aggregation_cube():
+        for col in pie_cols:
+            limit_categories(cube.category_counts(col, year_range), dashboard.PIE_MAX_SLICES)
+
+    def top_tracks():
+        # show_dashboard's top-K tables with a range filter set, without drawing
+        for col in dashboard.TOP_TRACK_COLS:
+            df.iloc[ranked[col].top(dashboard.TOP_K, rows)]
+
+    def top_tracks_cube():
+        for col in dashboard.TOP_TRACK_COLS:
+            df.iloc[cube.top_rows(col, year_range, dashboard.TOP_K)]
+
+    def time_series():
+        # Every chart and table of show_time_series_dashboard, for every grouping and statistic
+        for period, axis in dashboard.TREND_PERIODS.values():
+            if axis not in trends.axes:
+                continue
+            for stat in ['mean', 'median']:
+                trends.wide(stat, period, axis)
+            trends.table(period, axis)
+            for metric in trends.metrics:
+                if trends.has_values(metric, axis):
+                    trends.windows(metric, 3, axis)
+        if cube.has_column('ai_theme'):
+            cube.yearly_counts('ai_theme')
+
+    run_stage(stages, 'pie_aggregation', pie_aggregation, repeat)
+    run_stage(stages, 'pie_aggregation_cube', pie_aggregation_cube, repeat)
+    run_stage(stages, 'top_tracks', top_tracks, repeat)
+    run_stage(stages, 'top_tracks_cube', top_tracks_cube, repeat)
+    run_stage(stages, 'time_series', time_series, repeat)
+    correlation_cols = [col for col in TARGET_COLS + FEATURE_COLS if col in df.columns]
+    run_stage(
+        stages, 'correlation',
+        lambda: [correlation_table(view.frame(correlation_cols), method=method) for method in ['pearson', 'spearman']],
+        repeat
+    )
+    return {'rows': len(df), 'filtered_rows': len(rows), 'peak_memory': peak_memory(), 'stages': stages}
+
+
+def _benchmark_worker(csv_path, repeat, queue):
+    queue.put(benchmark_catalogue(csv_path, repeat))
+
+
+def run_benchmarks(row_counts, repeat=3, seed=0):
+    """Results document for every catalogue size, each measured in its own process."""
+    context = multiprocessing.get_context('spawn') # A fresh process, so peak memory is per size
+    results = []
+    for n_rows in row_counts:
+        csv_path = catalogue_path(n_rows, seed)
+        print(f"{n_rows} rows ({csv_path.stat().st_size / 1e6:.0f} MB)...", flush=True)
+        results_queue = context.Queue()
+        process = context.Process(target=_benchmark_worker, args=(str(csv_path), repeat, results_queue))
+        process.start()
+        while True:
+            try:
+                result = results_queue.get(timeout=1)
+                break
+            except queue.Empty:
+                if not process.is_alive():
+                    raise RuntimeError(f"Benchmark of {n_rows} rows exited with code {process.exitcode}")
+        process.join()
+        results.append(result)
+        for stage, timings in result['stages'].items():
+            print(f"  {stage:22} {timings['best_ms']:10.1f} ms  peak {timings['peak_memory'] / 2 ** 20:8.0f} MiB")
+    return {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'synthetic_version': SYNTHETIC_VERSION,
+        'seed': seed,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Prints current / baseline time per size and stage; returns the regressed (rows, stage) pairs."""
+    baseline_results = {result['rows']: result for result in baseline['results']}
+    regressions = []
+    print(f"Compared with {baseline.get('commit') or 'baseline'} ({COMPARED}, slower than x{tolerance} flagged):")
+    for result in current['results']:
+        old = baseline_results.get(result['rows'])
+        if old is None:
+            continue
+        for stage, timings in result['stages'].items():
+            if stage not in old['stages'] or max(timings[COMPARED], old['stages'][stage][COMPARED]) < MIN_COMPARED_MS:
+                continue
+            ratio = timings[COMPARED] / old['stages'][stage][COMPARED]
+            flag = ' REGRESSION' if ratio > tolerance else ''
+            print(f"  {result['rows']:>9} {stage:22} x{ratio:5.2f}{flag}")
+            if flag:
+                regressions.append((result['rows'], stage))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the dashboard's data path on synthetic catalogues.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help="Catalogue sizes (default: 10000 100000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per stage (the best and median are kept)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help="Write the results as JSON")
+    parser.add_argument('--compare', help="Results JSON of an earlier run to compare with")
+    parser.add_argument('--tolerance', type=float, default=1.25, help="Slowdown ratio flagged by --compare")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.rows, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+        print(f"Wrote {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(baseline, current, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
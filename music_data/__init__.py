@@ -0,0 +1 @@
+"""Data layer for the music dashboard: loading, cleaning and derived indexes."""
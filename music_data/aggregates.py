@@ -0,0 +1,120 @@
+"""Per-release-year aggregate cube.
+
+The cube is built once per dataset version. It holds cumulative per-year
+category counts and per-year top-K candidate rows, so any year range is
+answered by subtracting two small arrays and re-ranking a few hundred
+candidates instead of filtering the full table.
+"""
+import numpy as np
+import pandas as pd
+
+from music_data.topk import metric_values, top_k_positions
+
+
+class YearCube:
+    """Category counts and top-K candidates bucketed by release year.
+
+    Rows without a release year go into an extra trailing bucket; they are
+    only included when no year range is given (matching the slider filter,
+    which drops them).
+    """
+
+    def __init__(self, df, category_cols, metric_cols, top_k=50, year_col='release_year'):
+        self.top_k = top_k
+        years = df[year_col]
+        self.years = np.sort(years.dropna().unique().astype(np.int64))
+        n_buckets = len(self.years) + 1
+
+        bucket = np.full(len(df), len(self.years), dtype=np.int64)
+        has_year = years.notna().to_numpy()
+        bucket[has_year] = np.searchsorted(self.years, years[has_year].to_numpy(dtype=np.int64))
+        bucket_sizes = np.bincount(bucket, minlength=n_buckets)
+        self._row_cum = np.concatenate([[0], np.cumsum(bucket_sizes)])
+
+        # Cumulative counts: row b holds the totals of buckets [0, b)
+        self._categories = {}
+        self._count_cum = {}
+        for col in category_cols:
+            if col not in df.columns:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            valid = codes >= 0
+            flat = bucket[valid] * len(uniques) + codes[valid]
+            counts = np.bincount(flat, minlength=n_buckets * len(uniques)).reshape(n_buckets, len(uniques))
+            self._categories[col] = pd.Index(uniques, name=col)
+            self._count_cum[col] = np.vstack([np.zeros((1, len(uniques)), dtype=np.int64), np.cumsum(counts, axis=0)])
+
+        # Per-bucket top-K candidates, stored bucket by bucket so a year range is one contiguous slice
+        self._metric_values = {}
+        self._candidates = {}
+        self._candidate_offsets = {}
+        for col in metric_cols:
+            if col not in df.columns:
+                continue
+            values = metric_values(df[col])
+            rows = np.flatnonzero(~np.isnan(values))
+            # Sort by bucket, then value descending, then row position for stable ties
+            order = rows[np.lexsort((rows, -values[rows], bucket[rows]))]
+            order_buckets = bucket[order]
+            starts = np.searchsorted(order_buckets, np.arange(n_buckets))
+            rank = np.arange(len(order)) - starts[order_buckets]
+            keep = order[rank < top_k]
+            self._metric_values[col] = values
+            self._candidates[col] = keep
+            self._candidate_offsets[col] = np.searchsorted(bucket[keep], np.arange(n_buckets + 1))
+
+    def _bucket_bounds(self, year_range):
+        """Bucket slice [start, stop) for an inclusive year range; None means every row."""
+        if year_range is None:
+            return 0, len(self.years) + 1
+        start = np.searchsorted(self.years, year_range[0], side='left')
+        stop = np.searchsorted(self.years, year_range[1], side='right')
+        return start, stop
+
+    def row_count(self, year_range=None):
+        start, stop = self._bucket_bounds(year_range)
+        return int(self._row_cum[stop] - self._row_cum[start])
+
+    def has_column(self, col):
+        return col in self._count_cum
+
+    def category_counts(self, col, year_range=None):
+        """Equivalent of value_counts() on the rows in year_range (zero counts dropped)."""
+        start, stop = self._bucket_bounds(year_range)
+        cum = self._count_cum[col]
+        counts = pd.Series(cum[stop] - cum[start], index=self._categories[col], name='count')
+        return counts[counts > 0].sort_values(ascending=False, kind='stable')
+
+    def yearly_counts(self, col):
+        """Long frame of release_year, col and count for every non-zero (year, category) pair."""
+        counts = np.diff(self._count_cum[col], axis=0)[:len(self.years)]
+        year_idx, category_idx = np.nonzero(counts)
+        return pd.DataFrame({
+            'release_year': self.years[year_idx],
+            col: self._categories[col][category_idx],
+            'count': counts[year_idx, category_idx],
+        })
+
+    def top_rows(self, col, year_range=None, k=None):
+        """Row positions of the top k rows by col within year_range, highest first."""
+        k = k or self.top_k
+        if k > self.top_k:
+            raise ValueError(f"The cube only keeps the top {self.top_k} candidates per year.")
+        start, stop = self._bucket_bounds(year_range)
+        offsets = self._candidate_offsets[col]
+        rows = self._candidates[col][offsets[start]:offsets[stop]]
+        return top_k_positions(self._metric_values[col], k, positions=rows)
+
+
+def limit_categories(value_counts, max_categories, other_label='Other'):
+    """Keeps the largest max_categories - 1 counts and sums the rest into other_label.
+
+    value_counts must be sorted in descending order. Returned unchanged when
+    it already fits.
+    """
+    if len(value_counts) <= max_categories:
+        return value_counts
+    kept = value_counts.iloc[:max_categories - 1]
+    other = pd.Series([value_counts.iloc[max_categories - 1:].sum()], index=[other_label])
+    limited = pd.concat([kept.set_axis(kept.index.astype(str)), other])
+    return limited.rename(value_counts.name).rename_axis(value_counts.index.name)
@@ -0,0 +1,221 @@
+"""Album-title consolidation and per-album analytics.
+
+Merged versions carry '|'-joined album titles ('等待 | 等待, 等待 | 精選').
+Each distinct title maps to its most common part, counted over the parts
+of every distinct title in the catalogue; ties go to the part listed
+first. The mapping is persisted per source file and updated incrementally:
+when titles arrive or disappear only the counts of their parts change, and
+only the titles sharing one of those parts are re-consolidated.
+
+AlbumIndex groups the prepared table by consolidated album once per
+dataset version: the rows of every album, a summary row per album and
+per-album counts of the categorical features. The counts are kept sparse,
+one (category, count) run per album, so their size follows the rows rather
+than albums x categories.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from music_data.artifacts import data_fingerprint, load_artifact, save_artifact
+from music_data.topk import metric_values
+
+# Bump whenever the consolidation rule changes
+CONSOLIDATION_VERSION = 1
+# Categorical columns whose per-album distribution is precomputed
+ALBUM_DISTRIBUTION_COLS = ['combined_key', 'genre_ros', 'ai_theme', 'ai_sentiment', 'mood_sad']
+
+
+def split_album_titles(titles):
+    """Long frame with one (title, position, part) row per non-empty '|'-separated part."""
+    titles = pd.Series(pd.unique(np.asarray(titles, dtype=object)), dtype=object)
+    parts = pd.Series(titles.to_numpy(), index=titles.to_numpy()).str.split('|').explode()
+    frame = pd.DataFrame({
+        'title': parts.index.to_numpy(dtype=object),
+        'position': parts.groupby(level=0, sort=False).cumcount().to_numpy(),
+        'part': parts.str.strip().to_numpy(dtype=object),
+    })
+    return frame[frame['part'].str.len() > 0].reset_index(drop=True)
+
+
+def pick_consolidated(parts, counts):
+    """Title -> its part with the highest count, earliest position on ties."""
+    if parts.empty:
+        return {}
+    ranked = parts.assign(count=parts['part'].map(counts).to_numpy())
+    ranked = ranked.sort_values(['title', 'count', 'position'], ascending=[True, False, True], kind='stable')
+    best = ranked.drop_duplicates('title')
+    return dict(zip(best['title'], best['part']))
+
+
+class AlbumTitleMapping:
+    """Title -> consolidated title for a catalogue, kept in step with it by update()."""
+
+    def __init__(self):
+        self.parts = split_album_titles([])
+        self.counts = pd.Series(dtype=np.int64)
+        self.mapping = {}
+
+    def update(self, titles):
+        """Brings the mapping in line with the distinct titles given. Returns True if anything changed."""
+        titles = set(pd.unique(np.asarray(titles, dtype=object)))
+        known = set(self.mapping)
+        added, removed = titles - known, known - titles
+        if not added and not removed:
+            return False
+
+        removed_parts = self.parts[self.parts['title'].isin(removed)]
+        added_parts = split_album_titles(sorted(added))
+        self.counts = (
+            self.counts
+            .sub(removed_parts['part'].value_counts(), fill_value=0)
+            .add(added_parts['part'].value_counts(), fill_value=0)
+            .astype(np.int64)
+        )
+        self.counts = self.counts[self.counts > 0]
+        self.parts = pd.concat([self.parts[~self.parts['title'].isin(removed)], added_parts], ignore_index=True)
+
+        for title in removed:
+            del self.mapping[title]
+        # Only titles sharing a part whose count changed can change their pick
+        changed = set(removed_parts['part']) | set(added_parts['part'])
+        stale = self.parts[self.parts['title'].isin(added) | self.parts['part'].isin(changed)]['title'].unique()
+        self.mapping.update({title: title for title in added}) # Titles without any part keep their text
+        self.mapping.update(pick_consolidated(self.parts[self.parts['title'].isin(stale)], self.counts))
+        return True
+
+
+def consolidate_album_titles(album_titles, source=None, artifact_dir=None):
+    """Maps each '|'-joined album title to its most common sub-title.
+
+    The mapping is loaded from and saved to the artifact cache under the
+    source file's path, so a new version of that file only re-consolidates
+    titles affected by what changed. Without a source it is keyed by the
+    titles themselves.
+    """
+    non_null_albums = album_titles.dropna().astype(str)
+    if source is not None:
+        key = data_fingerprint(os.path.abspath(source), CONSOLIDATION_VERSION)
+    else:
+        key = data_fingerprint(pd.Series(sorted(non_null_albums.unique()), dtype=object), CONSOLIDATION_VERSION)
+    album_mapping = load_artifact('album_titles', key, artifact_dir) or AlbumTitleMapping()
+    if album_mapping.update(non_null_albums.unique()):
+        try:
+            save_artifact('album_titles', key, album_mapping, artifact_dir)
+        except OSError:
+            pass
+    return non_null_albums.map(album_mapping.mapping).reindex(album_titles.index)
+
+
+def grouped_counts(album_codes, n_albums, values):
+    """Per-album category counts of values in CSR form: (categories, offsets, category codes, counts).
+
+    Album i's categories are codes[offsets[i]:offsets[i + 1]], in category
+    order, with their non-zero counts alongside.
+    """
+    category_codes, categories = pd.factorize(values)
+    both = (album_codes >= 0) & (category_codes >= 0)
+    width = max(len(categories), 1)
+    pairs, counts = np.unique(album_codes[both].astype(np.int64) * width + category_codes[both], return_counts=True)
+    offsets = np.searchsorted(pairs // width, np.arange(n_albums + 1))
+    return pd.Index(categories, name=values.name), offsets, pairs % width, counts
+
+
+class AlbumIndex:
+    """Rows, summary and feature distributions of every consolidated album."""
+
+    def __init__(self, df, album_col='consolidated_album_title', distribution_cols=ALBUM_DISTRIBUTION_COLS):
+        codes, albums = pd.factorize(df[album_col], sort=True)
+        self.albums = pd.Index(np.asarray(albums, dtype=object), name=album_col)
+        valid = codes >= 0
+
+        # Rows grouped by album (CSR): album i owns rows[offsets[i]:offsets[i + 1]]
+        self.track_counts = np.bincount(codes[valid], minlength=len(self.albums))
+        self._offsets = np.concatenate([[0], np.cumsum(self.track_counts)])
+        self._rows = np.flatnonzero(valid)[np.argsort(codes[valid], kind='stable')]
+
+        self._distributions = {}
+        for col in distribution_cols:
+            if col not in df.columns:
+                continue
+            self._distributions[col] = grouped_counts(codes, len(self.albums), df[col])
+
+        self.summaries = self._summarize(df, codes, valid)
+
+    def _summarize(self, df, codes, valid):
+        columns = {'album': codes[valid]}
+        for col in ['release_year', 'popularity', 'viewCount', 'likeCount']:
+            if col in df.columns:
+                columns[col] = metric_values(df[col])[valid]
+        mood_cols = [col for col in df.columns if col.startswith('mood_')]
+        for col in mood_cols:
+            # Share of the album's rated tracks carrying the mood ('sad' for mood_sad)
+            mood = df[col].astype('object')
+            columns[col] = np.where(mood.isna(), np.nan, (mood == col[len('mood_'):]).astype(np.float64))[valid]
+        frame = pd.DataFrame(columns)
+
+        aggregations = {'tracks': ('album', 'size')}
+        if 'release_year' in frame:
+            aggregations.update(first_year=('release_year', 'min'), last_year=('release_year', 'max'))
+        if 'popularity' in frame:
+            aggregations.update(popularity_mean=('popularity', 'mean'), popularity_max=('popularity', 'max'))
+        if 'viewCount' in frame:
+            aggregations.update(
+                videos=('viewCount', 'count'), views_total=('viewCount', 'sum'), views_median=('viewCount', 'median')
+            )
+        if 'likeCount' in frame:
+            aggregations.update(likes_total=('likeCount', 'sum'))
+        aggregations.update({f'{col}_share': (col, 'mean') for col in mood_cols})
+        summaries = frame.groupby('album').agg(**aggregations).reindex(range(len(self.albums)))
+        summaries['tracks'] = summaries['tracks'].fillna(0).astype(np.int64)
+        if 'videos' in summaries:
+            no_videos = summaries['videos'].fillna(0) == 0
+            summaries.loc[no_videos, ['views_total'] + (['likes_total'] if 'likes_total' in summaries else [])] = np.nan
+
+        if 'combined_key' in self._distributions:
+            # Most common key per album, the first category on ties
+            categories, offsets, category_codes, counts = self._distributions['combined_key']
+            album_of = np.repeat(np.arange(len(self.albums)), np.diff(offsets))
+            order = np.lexsort((category_codes, -counts, album_of))
+            has_key = np.diff(offsets) > 0
+            top_key = np.full(len(self.albums), None, dtype=object)
+            top_key[has_key] = categories.to_numpy(dtype=object)[category_codes[order[offsets[:-1][has_key]]]]
+            summaries.insert(1, 'top_key', top_key)
+        return summaries.set_axis(self.albums)
+
+    def __len__(self):
+        return len(self.albums)
+
+    def __contains__(self, album):
+        return album in self.albums
+
+    def rows(self, album):
+        """Row positions of album's tracks, in table order (empty if unknown)."""
+        if album not in self.albums:
+            return self._rows[:0]
+        i = self.albums.get_loc(album)
+        return self._rows[self._offsets[i]:self._offsets[i + 1]]
+
+    def has_distribution(self, col):
+        return col in self._distributions
+
+    def distribution(self, album, col):
+        """value_counts() of col over album's tracks (zero counts dropped)."""
+        categories, offsets, category_codes, counts = self._distributions[col]
+        i = self.albums.get_loc(album)
+        run = slice(offsets[i], offsets[i + 1])
+        album_counts = pd.Series(counts[run], index=categories[category_codes[run]], name='count')
+        return album_counts.sort_values(ascending=False, kind='stable')
+
+    def by_size(self):
+        """Album names, most tracks first (ties by name)."""
+        order = np.lexsort((self.albums.to_numpy(dtype=str), -self.track_counts))
+        return self.albums[order]
+
+    def ranking(self, sort_by='popularity_mean', min_tracks=1):
+        """Catalogue-wide album table sorted by a summary column, best first."""
+        ranking = self.summaries[self.summaries['tracks'] >= min_tracks]
+        if sort_by in ranking.columns:
+            ranking = ranking.sort_values(sort_by, ascending=False, na_position='last', kind='stable')
+        return ranking
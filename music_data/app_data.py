@@ -0,0 +1,318 @@
+"""Streamlit-cached data loading shared by the dashboard and its pages."""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from music_data.cleaning import prepare_tracks
+from music_data.dedup import build_duplicate_groups
+from music_data.disk_cache import PreparedTableCache
+from music_data.profiling import PROFILER, profiled_cache, profiling_requested
+from music_data.lyrics import build_lyrics_index
+from music_data.range_index import RangeIndex
+from music_data.registry import list_partitions
+from music_data.search import build_search_index
+from music_data.similarity import build_similarity_index
+from music_data.snapshot import snapshot_is_fresh, snapshot_path_for
+from music_data.text_store import TextStore, compact_table, read_compact_table
+from music_data.track_index import build_track_lookup
+from music_data.views import notna_rows
+
+# Bucket edges offered by the sidebar range filters (inclusive on both ends)
+RANGE_FILTER_EDGES = {
+    'popularity': [0, 20, 40, 60, 80, 100],
+    'viewCount': [0, 10_000, 100_000, 1_000_000, 10_000_000, float('inf')],
+}
+
+# --- UPDATE FILE NAME ---
+# Make sure this points to your LATEST file
+# (e.g., 'final_enriched_tracks_v4.csv' if you ran the fill script)
+FILE_NAME = 'final_enriched_tracks_v3.csv'
+
+# --- 1. Load Data Function ---
+@PROFILER.timed()
+def load_data(file_path):
+    """Loads the CSV data and performs initial type conversion."""
+    try:
+        df = pd.read_csv(file_path)
+        return df
+    except FileNotFoundError:
+        st.error(f"Error: The data file '{file_path}' was not found in the repository. Please ensure it is uploaded.")
+        return pd.DataFrame()
+
+# --- 2. Data Cleaning and Preparation (FIXED) ---
+@PROFILER.timed()
+def prepare_data(df, file_path=None):
+    """Cleans up and prepares data for visualization."""
+    return prepare_tracks(df, file_path)
+
+# Prepared tables persisted across restarts, keyed by file version + cleaning version
+PREPARED_CACHE = PreparedTableCache()
+# Dataset versions whose shared tables and indexes are kept in memory
+DATASETS_CACHED = 4
+
+def prepared_table_path(file_path, cache_key):
+    """Parquet copy of the current prepared table: the fresh snapshot, else the on-disk cache entry.
+
+    The cache entry is built on a miss. None when neither is available (read-only disk, no data).
+    """
+    if snapshot_is_fresh(file_path):
+        return snapshot_path_for(file_path)
+    if cache_key is None:
+        return None
+    return PREPARED_CACHE.entry_for(file_path, lambda: prepare_data(load_data(file_path), file_path), key=cache_key)
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_shared_table(file_path, cache_key):
+    """Fresh snapshot first, then the on-disk cache, then the CSV.
+
+    Returns the compact table: the large text columns stay on disk and are read through load_text_store.
+    One copy per dataset version is held for the whole process and read by every session, so it must
+    never be modified; sessions go through load_prepared_table. cache_key identifies the file version,
+    so Streamlit never has to hash the DataFrame itself.
+    """
+    path = prepared_table_path(file_path, cache_key)
+    if path is not None:
+        try:
+            return read_compact_table(path)
+        except (OSError, pa.ArrowInvalid) as e:
+            st.warning(f"Could not read the prepared table, falling back to the CSV: {e}")
+    return compact_table(prepare_data(load_data(file_path), file_path))
+
+def load_prepared_table(file_path, cache_key):
+    """This session's view of the shared prepared table.
+
+    The view is a shallow copy-on-write copy: it shares every column with
+    the shared table, and a column the session adds or overwrites lives on
+    the view only, so per-session columns never reach other sessions.
+    """
+    return load_shared_table(file_path, cache_key).copy(deep=False)
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_text_store(file_path, cache_key):
+    """Lyrics, descriptions, notes and tags of the prepared table, read on demand and shared read-only."""
+    path = prepared_table_path(file_path, cache_key)
+    if path is None:
+        return TextStore.from_frame(prepare_data(load_data(file_path), file_path))
+    # Rebuilt through the cache if the file is deleted anyway (disk_cache --clear, snapshot --clear)
+    text_store = TextStore(path, reopen=lambda: prepared_table_path(file_path, cache_key))
+    PREPARED_CACHE.pin(path, text_store) # Not evicted while this store may read it
+    return text_store
+
+def dataset_cache_key(file_path):
+    """Cheap version key for file_path (None when only a snapshot is deployed)."""
+    return PREPARED_CACHE.key_for(file_path) if os.path.exists(file_path) else None
+
+@profiled_cache(st.cache_data)
+def load_available_years(file_path, cache_key):
+    """Sorted distinct release years of the prepared table."""
+    df = load_shared_table(file_path, cache_key)
+    if 'release_year' not in df.columns:
+        return np.array([], dtype=np.int64)
+    return np.sort(df['release_year'].dropna().unique().astype(np.int64))
+
+@profiled_cache(st.cache_data)
+def load_notna_rows(file_path, cache_key, col):
+    """Row positions with a value in col, computed once per dataset version (empty if col is missing)."""
+    df = load_shared_table(file_path, cache_key)
+    if col not in df.columns:
+        return np.array([], dtype=np.int64)
+    return notna_rows(df, col)
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_range_index(file_path, cache_key):
+    """Year slices and sorted RANGE_FILTER_EDGES columns of the prepared table, shared read-only."""
+    return RangeIndex(load_shared_table(file_path, cache_key), RANGE_FILTER_EDGES)
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED, show_spinner="Segmenting lyrics..."))
+def load_lyrics_index(file_path, cache_key):
+    """jieba lyrics index for the prepared table (rows match its positions), shared read-only."""
+    text_store = load_text_store(file_path, cache_key)
+    if 'lyrics_text' not in text_store.columns:
+        return None
+    return build_lyrics_index(text_store.column('lyrics_text'))
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED, show_spinner="Building the search index..."))
+def load_search_index(file_path, cache_key):
+    """Full-text search index for the prepared table, shared read-only."""
+    df = load_shared_table(file_path, cache_key)
+    return build_search_index(load_text_store(file_path, cache_key).attach(df))
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_track_lookup(file_path, cache_key):
+    """Identifier -> row index for the prepared table, shared read-only."""
+    return build_track_lookup(load_shared_table(file_path, cache_key))
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED, show_spinner="Finding similar songs..."))
+def load_similarity_index(file_path, cache_key):
+    """Nearest neighbours of every track of the prepared table, shared read-only."""
+    return build_similarity_index(load_shared_table(file_path, cache_key), load_lyrics_index(file_path, cache_key))
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED, show_spinner="Grouping versions of the same song..."))
+def load_duplicate_groups(file_path, cache_key):
+    """Near-duplicate version groups of the prepared table, shared read-only."""
+    df = load_shared_table(file_path, cache_key)
+    text_store = load_text_store(file_path, cache_key)
+    if 'lyrics_text' in text_store.columns:
+        lyrics = text_store.column('lyrics_text')
+    else:
+        lyrics = pd.Series(None, index=range(len(df)), dtype=object)
+    return build_duplicate_groups(df, lyrics)
+
+# --- 3. Shared Sidebar Filter ---
+def sidebar_dataset_selector():
+    """Artist and version pickers over the registered partitions, shared by every page.
+
+    The selection is kept in st.session_state['dataset'] so it survives
+    switching pages. Only the chosen partition is loaded; the loaders are
+    keyed by its file, so switching back to a viewed one is a cache hit.
+    Returns (file path, label); FILE_NAME when no partition is registered.
+    """
+    partitions = list_partitions()
+    if not partitions:
+        return FILE_NAME, None
+
+    st.sidebar.header("Dataset")
+    artists = list(dict.fromkeys(partition.artist for partition in partitions))
+    saved_artist, saved_version = st.session_state.get('dataset', (None, None))
+    artist = st.sidebar.selectbox(
+        "Artist:", artists,
+        index=artists.index(saved_artist) if saved_artist in artists else 0,
+        key='dataset_artist'
+    )
+    versions = [partition.version for partition in partitions if partition.artist == artist][::-1] # Latest first
+    version = st.sidebar.selectbox(
+        "Version:", versions,
+        index=versions.index(saved_version) if saved_version in versions else 0,
+        key='dataset_version'
+    )
+    st.session_state['dataset'] = (artist, version)
+    partition = next(p for p in partitions if p.artist == artist and p.version == version)
+    return str(partition.path), f"{artist} · {version}"
+
+def sidebar_year_filter(available_years, row_count=None):
+    """Release-year slider shared by every page.
+
+    The selection is kept in st.session_state['year_range'] so it survives
+    switching pages. Returns None when there are no usable years (analyze
+    every row). row_count(year_range), if given, is used for the summary line.
+    """
+    st.sidebar.header("Data Filter")
+
+    if available_years.size == 0:
+        st.sidebar.warning("Release year data is not sufficient for range filtering.")
+        return None
+
+    min_year = int(available_years.min())
+    max_year = int(available_years.max())
+    saved_range = st.session_state.get('year_range', (min_year, max_year))
+    default_range = (max(min_year, saved_range[0]), min(max_year, saved_range[1]))
+
+    year_range = st.sidebar.slider(
+        "Filter by Release Year Range:", 
+        min_value=min_year, 
+        max_value=max_year,
+        value=default_range, # Defaults to all years
+        key='year_range_slider'
+    )
+    st.session_state['year_range'] = year_range
+
+    if row_count is not None:
+        st.sidebar.info(f"Filtered to **{row_count(year_range)}** tracks from {year_range[0]} to {year_range[1]}.")
+    return year_range
+
+def sidebar_canonical_toggle(file_path, cache_key):
+    """'Canonical versions only' switch, kept in st.session_state['canonical_only'].
+
+    Returns the canonical row positions when it is on, None otherwise; the
+    version groups are only built once it has been switched on.
+    """
+    canonical_only = st.sidebar.toggle(
+        "Canonical versions only",
+        value=st.session_state.get('canonical_only', False),
+        help="Count each song once, collapsing live, OST, remaster and compilation versions into the most popular one.",
+        key='canonical_only_toggle'
+    )
+    st.session_state['canonical_only'] = canonical_only
+    if not canonical_only:
+        return None
+    duplicate_groups = load_duplicate_groups(file_path, cache_key)
+    st.sidebar.caption(
+        f"{duplicate_groups.duplicate_count} duplicate versions hidden ({duplicate_groups.n_groups} distinct songs)."
+    )
+    return duplicate_groups.canonical_rows
+
+def format_range_edge(value):
+    return "no limit" if value == float('inf') else f"{value:,.0f}"
+
+def sidebar_range_filters(range_index):
+    """Bucket sliders for the RANGE_FILTER_EDGES columns.
+
+    Selections are kept in st.session_state['range_filters']. Returns
+    {column: (low, high)} for the sliders that are narrowed; a slider left
+    at its full range filters nothing, so rows without a value stay in.
+    """
+    saved_ranges = st.session_state.get('range_filters', {})
+    selected_ranges = {}
+    value_ranges = {}
+    for col, edges in RANGE_FILTER_EDGES.items():
+        if not range_index.has_column(col) or range_index.value_bounds(col) is None:
+            continue
+        full_range = (edges[0], edges[-1])
+        low, high = st.sidebar.select_slider(
+            f"Filter by {col}:",
+            options=edges,
+            value=saved_ranges.get(col, full_range),
+            format_func=format_range_edge,
+            key=f'range_filter_{col}'
+        )
+        selected_ranges[col] = (low, high)
+        if (low, high) != full_range:
+            value_ranges[col] = (low, high)
+    st.session_state['range_filters'] = selected_ranges
+    return value_ranges
+
+# --- 4. Profiling ---
+def start_profiling(page):
+    """Begins this run's profile when MUSIC_DASHBOARD_PROFILE is set or the app was opened with ?debug=1.
+
+    The ?debug=1 choice is kept in st.session_state['profiling'], so song deep links do not drop it.
+    """
+    if 'debug' in st.query_params:
+        st.session_state['profiling'] = st.query_params['debug'] not in ('', '0')
+    PROFILER.begin_run(page, enabled=profiling_requested() or st.session_state.get('profiling', False))
+
+def render_chart(fig, name=None):
+    """st.plotly_chart that also records the figure's payload size while profiling."""
+    PROFILER.payload(name or fig.layout.title.text or 'figure', fig)
+    st.plotly_chart(fig, use_container_width=True)
+
+def format_bytes(n_bytes):
+    return "n/a" if n_bytes is None else f"{n_bytes / 2**20:+.1f} MB"
+
+def sidebar_profiling_panel():
+    """Closes this run's profile and, when profiling, shows it in a sidebar panel.
+
+    Call it last, so every stage of the run is in it.
+    """
+    record = PROFILER.end_run()
+    if record is None:
+        return
+    with st.sidebar.expander("🛠 Profiling", expanded=False):
+        st.markdown(f"**Run:** {record['total_ms']:.0f} ms, memory {format_bytes(record['memory_delta'])}")
+        stages = pd.DataFrame(record['stages'], columns=['stage', 'depth', 'ms', 'memory_delta'])
+        stages['stage'] = ['· ' * depth + stage.rsplit('/', 1)[-1] for stage, depth in zip(stages['stage'], stages['depth'])]
+        stages['memory_delta'] = stages['memory_delta'].map(format_bytes)
+        st.dataframe(stages.drop(columns='depth').round({'ms': 1}), hide_index=True)
+
+        st.markdown("**Caches** (this run / since start)")
+        run_caches = pd.DataFrame(record['caches'], columns=['cache', 'calls', 'misses', 'hit_rate'])
+        total_caches = pd.DataFrame(PROFILER.cache_stats(), columns=['cache', 'calls', 'misses', 'hit_rate'])
+        st.dataframe(run_caches.merge(total_caches, on='cache', how='outer', suffixes=('', '_total')), hide_index=True)
+
+        if record['payloads']:
+            payloads = pd.DataFrame(record['payloads'])
+            st.markdown(f"**Figures:** {payloads['bytes'].sum() / 1024:.1f} KB in {len(payloads)} charts")
+            st.dataframe(payloads.assign(KB=payloads.pop('bytes') / 1024).round({'KB': 1}), hide_index=True)
@@ -0,0 +1,99 @@
+"""Persisted build artifacts (models, indexes) keyed by a hash of their inputs.
+
+Each artifact is a pickle under CACHE_ROOT/artifacts named
+'<name>-<key>.pkl'. Artifacts of every dataset share the directory, which
+is capped at MUSIC_DASHBOARD_ARTIFACTS_MB; the least recently used ones
+are removed when a save goes over it.
+"""
+import hashlib
+import os
+import pickle
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from music_data.disk_cache import CACHE_ROOT
+
+ARTIFACT_DIR = CACHE_ROOT / 'artifacts'
+DEFAULT_MAX_BYTES = int(os.environ.get('MUSIC_DASHBOARD_ARTIFACTS_MB', '512')) * 1024 * 1024
+
+
+def data_fingerprint(*parts):
+    """Short content hash of DataFrames, Series, arrays and plain values."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+            columns = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(repr(list(columns)).encode('utf-8'))
+        elif isinstance(part, np.ndarray):
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(name, key, artifact_dir=None):
+    return (artifact_dir or ARTIFACT_DIR) / f"{name}-{key}.pkl"
+
+
+def load_artifact(name, key, artifact_dir=None):
+    """Returns the stored artifact or None."""
+    path = artifact_path(name, key, artifact_dir)
+    try:
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        # Missing, truncated, or pickled from classes that no longer exist
+        return None
+    try:
+        os.utime(path) # Marks it recently used for evict_artifacts
+    except OSError:
+        pass
+    return artifact
+
+
+def evict_artifacts(artifact_dir=None, max_bytes=DEFAULT_MAX_BYTES, keep=None):
+    """Deletes least recently used artifacts until the directory fits in max_bytes."""
+    artifact_dir = artifact_dir or ARTIFACT_DIR
+    entries = []
+    for entry in artifact_dir.glob('*.pkl'):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue # Removed by another process meanwhile
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in entries:
+        if total <= max_bytes:
+            break
+        if entry == keep:
+            continue
+        entry.unlink(missing_ok=True)
+        total -= size
+
+
+def save_artifact(name, key, artifact, artifact_dir=None):
+    """Stores artifact atomically, then evicts the least recently used artifacts over the size cap."""
+    path = artifact_path(name, key, artifact_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict_artifacts(path.parent, keep=path)
+
+
+def load_or_build(name, key, build, artifact_dir=None):
+    """Loads the artifact for key, building and persisting it on a miss."""
+    artifact = load_artifact(name, key, artifact_dir)
+    if artifact is not None:
+        return artifact
+    artifact = build()
+    try:
+        save_artifact(name, key, artifact, artifact_dir)
+    except OSError:
+        pass # Read-only deployments rebuild once per process
+    return artifact
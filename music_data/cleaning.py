@@ -0,0 +1,137 @@
+"""Cleaning and type coercion for the enriched tracks table."""
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever prepare_tracks changes its output; persisted tables built by
+# an older version are then ignored.
+CLEANING_VERSION = 4
+
+# Target dtype per column. Anything that fails to coerce becomes NaN and is
+# counted in the cleaning report.
+COLUMN_SCHEMA = {
+    'viewCount': 'Int64',
+    'likeCount': 'Int64',
+    'commentCount': 'Int64',
+    'popularity': 'Int64',
+    'release_year': 'Int64',
+    'bpm': 'float64',
+    # Low-cardinality dimension columns stored dictionary-encoded
+    # (danceability and timbre are labels: danceable / not_danceable, bright / dark)
+    'danceability': 'category',
+    'timbre': 'category',
+    'genre_ros': 'category',
+    'super_theme': 'category',
+    'combined_key': 'category',
+    'ai_theme': 'category',
+    'ai_sentiment': 'category',
+    'artist_credit_name': 'category',
+    'consolidated_album_title': 'category',
+}
+# Dtypes for whole column families, matched by prefix
+PREFIX_SCHEMA = {
+    'mood_': 'category',
+}
+# Large free-text columns: never scanned for blanks, left exactly as read
+TEXT_BLOB_COLS = ['lyrics_text', 'description', 'ai_notes']
+
+def column_schema(columns):
+    """Resolves the target dtype of every column covered by the schema."""
+    schema = {}
+    for col in columns:
+        if col in COLUMN_SCHEMA:
+            schema[col] = COLUMN_SCHEMA[col]
+            continue
+        for prefix, dtype in PREFIX_SCHEMA.items():
+            if col.startswith(prefix):
+                schema[col] = dtype
+                break
+    return schema
+
+
+def blank_to_nan(series):
+    """Turns empty/whitespace-only strings into NaN. Returns (series, blank count)."""
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return series, 0
+    strings = series.str
+    blank = (series.eq('') | strings.isspace()).fillna(False).astype(bool)
+    n_blank = int(blank.sum())
+    if n_blank == 0:
+        # Nothing to replace, so keep the original column rather than copying it
+        return series, 0
+    return series.mask(blank), n_blank
+
+
+def coerce_column(series, dtype):
+    """Casts a column to its schema dtype. Returns (series, failed count)."""
+    if dtype == 'category':
+        return series.astype('category'), 0
+
+    numeric = pd.to_numeric(series, errors='coerce')
+    if dtype == 'Int64':
+        # Fractional values cannot be stored as counts/years, treat them as bad data
+        numeric = numeric.where(numeric.isna() | (numeric % 1 == 0))
+    n_failed = int(series.notna().sum() - numeric.notna().sum())
+    return numeric.astype(dtype), n_failed
+
+
+def clean_columns(df, schema=None):
+    """Applies the schema to df.
+
+    Blank stripping only touches schema columns and short text columns (the
+    TEXT_BLOB_COLS are skipped), and columns are replaced one at a time so
+    untouched columns are never copied.
+
+    Returns (cleaned frame, report) where the report has one row per column
+    that had blanks or was coerced.
+    """
+    schema = column_schema(df.columns) if schema is None else schema
+    df = df.copy(deep=False)
+    report_rows = []
+
+    for col in df.columns:
+        if col in TEXT_BLOB_COLS and col not in schema:
+            continue
+        series, n_blank = blank_to_nan(df[col])
+        n_failed = 0
+        if col in schema:
+            series, n_failed = coerce_column(series, schema[col])
+        if col in schema or n_blank:
+            df[col] = series
+            report_rows.append({
+                'column': col,
+                'target_dtype': schema.get(col, 'unchanged'),
+                'blank': n_blank,
+                'failed': n_failed,
+            })
+
+    report = pd.DataFrame(report_rows, columns=['column', 'target_dtype', 'blank', 'failed'])
+    return df, report
+
+
+def prepare_tracks(df, source=None):
+    """Cleans up and prepares the raw CSV frame for visualization.
+
+    source is the path of the CSV, used to find the album-title mapping built for earlier versions of it.
+    """
+    if df.empty:
+        return df
+
+    df, report = clean_columns(df)
+    failures = report[report['failed'] > 0]
+    for row in failures.itertuples(index=False):
+        logger.warning("Cleaning: %d value(s) in '%s' could not be coerced to %s", row.failed, row.column, row.target_dtype)
+
+    # Safeguard: Re-integrate Album Consolidation if 'consolidated_album_title' is missing
+    if 'consolidated_album_title' not in df.columns and 'album_title' in df.columns:
+        # Imported here: albums persists through artifacts, which depends on this module via disk_cache
+        from music_data.albums import consolidate_album_titles
+        df['consolidated_album_title'] = consolidate_album_titles(df['album_title'], source).astype(COLUMN_SCHEMA['consolidated_album_title'])
+
+    if 'release_year' in df.columns:
+        # Stored sorted by year (missing years last) so any year range is one contiguous slice of rows
+        df = df.sort_values('release_year', kind='stable', na_position='last', ignore_index=True)
+
+    return df
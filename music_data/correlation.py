@@ -0,0 +1,86 @@
+"""Correlation between popularity metrics and one-hot encoded categorical features.
+
+Missing data is handled pairwise: each (feature, target) pair uses the rows
+where both the feature's source column and the target are present. Every
+source column is factorized, and the r of each category's 0/1 indicator
+comes from per-category counts and target sums, so memory stays linear in
+the rows however many categories a column has.
+"""
+import numpy as np
+import pandas as pd
+
+TARGET_COLS = ['popularity', 'viewCount', 'likeCount']
+FEATURE_COLS = ['ai_sentiment', 'ai_theme', 'genre_ros', 'combined_key']
+
+
+def category_correlations(codes, n_categories, y):
+    """Pearson r of every category's 0/1 indicator against y.
+
+    codes are the category of each row (all rows observed). The indicator
+    sums are per-category counts and sums of y, taken with np.bincount, so
+    no row x category matrix is built. Returns r of shape (n_categories,).
+    """
+    n = len(y)
+    # Centering the target first keeps the sums small and the result stable
+    y = y - y.mean() if n else y
+    sum_x = np.bincount(codes, minlength=n_categories).astype(np.float64) # Also the sum of x**2
+    sum_xy = np.bincount(codes, weights=y, minlength=n_categories)
+    sum_y = y.sum()
+    sum_yy = (y * y).sum()
+
+    cov = n * sum_xy - sum_x * sum_y
+    var_x = n * sum_x - sum_x ** 2
+    var_y = n * sum_yy - sum_y ** 2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = cov / np.sqrt(var_x * var_y)
+    r[(var_x <= 1e-12) | (var_y <= 1e-12)] = np.nan
+    return r
+
+
+def correlation_table(df, targets=TARGET_COLS, features=FEATURE_COLS, method='pearson', min_periods=3):
+    """Long table of r between each one-hot feature and each target.
+
+    method is 'pearson' or 'spearman'. For Spearman the targets are ranked
+    within each pair's complete rows; binary features need no ranking since
+    ranks of a 0/1 column are a linear rescaling of it.
+    """
+    if method not in ('pearson', 'spearman'):
+        raise ValueError(f"Unknown correlation method: {method}")
+    targets = [col for col in targets if col in df.columns]
+    features = [col for col in features if col in df.columns]
+    columns = ['feature_col', 'feature', 'target', 'r', 'n']
+    if not targets or not features:
+        return pd.DataFrame(columns=columns)
+
+    Y = np.column_stack([df[col].to_numpy(dtype='float64', na_value=np.nan) for col in targets])
+    target_observed = ~np.isnan(Y)
+
+    frames = []
+    for col in features:
+        codes, uniques = pd.factorize(df[col])
+        r = np.empty((len(uniques), len(targets)))
+        n = np.empty((len(uniques), len(targets)), dtype=np.int64)
+        for j in range(len(targets)):
+            valid = (codes >= 0) & target_observed[:, j]
+            y = Y[valid, j]
+            if method == 'spearman':
+                y = pd.Series(y).rank().to_numpy()
+            r[:, j] = category_correlations(codes[valid], len(uniques), y)
+            n[:, j] = valid.sum()
+        labels = [str(value) for value in uniques]
+        frames.append(pd.DataFrame({
+            'feature_col': col,
+            'feature': np.repeat(labels, len(targets)),
+            'target': np.tile(targets, len(labels)),
+            'r': r.ravel(),
+            'n': n.ravel(),
+        }))
+
+    table = pd.concat(frames, ignore_index=True)
+    return table[(table['n'] >= min_periods) & table['r'].notna()].reset_index(drop=True)
+
+
+def overlap_counts(df, target, columns):
+    """Rows where target and each column are both present."""
+    has_target = df[target].notna()
+    return {col: int((has_target & df[col].notna()).sum()) for col in columns if col in df.columns}
@@ -0,0 +1,195 @@
+"""Near-duplicate detection of track versions with MinHash and LSH.
+
+Live, OST, remaster and compilation copies of a song carry near-identical
+lyrics. Each track becomes a set of shingles (runs of SHINGLE_SIZE jieba
+tokens of its lyrics; character pairs of its title, stripped of version
+qualifiers, when it has no lyrics) and a MinHash signature of NUM_PERM
+values, whose share of equal values estimates the Jaccard similarity of
+two sets. LSH banding puts tracks that agree on a whole band of
+BAND_ROWS values in the same bucket, so only tracks sharing a bucket are
+compared: near-duplicates are found in about linear time instead of by
+comparing every pair. Candidates at or above DUPLICATE_THRESHOLD are
+merged into groups, and the most popular track of each group is its
+canonical version.
+
+Signatures are persisted by the hash of each text, so a new dataset
+version only computes signatures for texts it has not seen.
+"""
+import hashlib
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from music_data.artifacts import data_fingerprint, load_artifact, load_or_build, save_artifact
+from music_data.lyrics import tokenize_texts
+from music_data.topk import metric_values
+
+# Bump whenever shingling, hashing or grouping change
+DEDUP_VERSION = 1
+SHINGLE_SIZE = 3
+NUM_PERM = 128
+# NUM_PERM = LSH_BANDS * BAND_ROWS; a pair at Jaccard 0.6 shares a band with probability ~0.99
+LSH_BANDS = 32
+BAND_ROWS = 4
+# Estimated Jaccard similarity from which two tracks are versions of one song
+DUPLICATE_THRESHOLD = 0.6
+# Version qualifiers ignored when titles stand in for missing lyrics: (Live), （伴奏）, [Remastered], - 2018 Version
+TITLE_QUALIFIERS = re.compile(r'\s*[(（\[【].*?[)）\]】]|\s+-\s+.*$')
+# Modulus of the MinHash permutations (a Mersenne prime)
+PRIME = (1 << 31) - 1
+# Shingles hashed per chunk while signing, bounding the (shingles x NUM_PERM) work array
+CHUNK_SHINGLES = 1 << 16
+
+
+def token_shingles(tokens, size=SHINGLE_SIZE):
+    """Runs of size consecutive tokens (the whole list when it is shorter)."""
+    if len(tokens) <= size:
+        return {'\x1f'.join(tokens)} if tokens else set()
+    return {'\x1f'.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def clean_title(title):
+    """Title without bracketed or dashed version qualifiers, lowercased."""
+    return TITLE_QUALIFIERS.sub('', str(title)).strip().lower()
+
+
+def title_shingles(title):
+    """Character pairs of a cleaned title, marked so they never match lyric shingles."""
+    title = clean_title(title)
+    return {'\x1etitle' + title[i:i + 2] for i in range(max(len(title) - 1, 1))} if title else set()
+
+
+def permutations(num_perm=NUM_PERM, seed=1):
+    """(a, b) of the num_perm hash permutations x -> (a * x + b) mod PRIME."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(1, PRIME, num_perm, dtype=np.int64), rng.integers(0, PRIME, num_perm, dtype=np.int64)
+
+
+def minhash_signatures(shingle_sets, num_perm=NUM_PERM):
+    """(len(shingle_sets), num_perm) MinHash signatures; every set must be non-empty."""
+    a, b = permutations(num_perm)
+    signatures = np.empty((len(shingle_sets), num_perm), dtype=np.int64)
+    start = 0
+    while start < len(shingle_sets):
+        # Sign whole sets only, about CHUNK_SHINGLES shingles at a time
+        stop, n_shingles = start, 0
+        while stop < len(shingle_sets) and (stop == start or n_shingles + len(shingle_sets[stop]) <= CHUNK_SHINGLES):
+            n_shingles += len(shingle_sets[stop])
+            stop += 1
+        chunk = shingle_sets[start:stop]
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingles in chunk for shingle in shingles),
+            dtype=np.int64, count=n_shingles
+        ) % PRIME
+        offsets = np.concatenate([[0], np.cumsum([len(shingles) for shingles in chunk])[:-1]])
+        signatures[start:stop] = np.minimum.reduceat((hashes[:, None] * a + b) % PRIME, offsets, axis=0)
+        start = stop
+    return signatures
+
+
+def _text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def track_signatures(lyrics, titles, artifact_dir=None):
+    """(signatures, has_signature) per track, from lyrics where present and titles otherwise.
+
+    Signatures are looked up in and added to a persisted cache keyed by the
+    text's hash, so only texts never seen before are tokenized and signed.
+    """
+    cache = load_artifact('minhash_signatures', DEDUP_VERSION, artifact_dir) or {}
+    lyrics = lyrics.astype('object')
+    documents = ['lyrics:' + text if pd.notna(text) else 'title:' + clean_title(title) for text, title in zip(lyrics, titles)]
+    keys = [_text_key(document) for document in documents]
+
+    missing = {key: row for row, key in enumerate(keys) if key not in cache}
+    if missing:
+        rows = list(missing.values())
+        token_lists = tokenize_texts(lyrics.iloc[rows], artifact_dir)
+        shingle_sets = [
+            token_shingles(tokens) if tokens is not None else title_shingles(titles[row])
+            for row, tokens in zip(rows, token_lists)
+        ]
+        signed = [i for i, shingles in enumerate(shingle_sets) if shingles]
+        signatures = minhash_signatures([shingle_sets[i] for i in signed])
+        cache.update({key: None for key in missing})
+        cache.update({keys[rows[i]]: signature for i, signature in zip(signed, signatures)})
+        try:
+            save_artifact('minhash_signatures', DEDUP_VERSION, cache, artifact_dir)
+        except OSError:
+            pass
+
+    has_signature = np.array([cache[key] is not None for key in keys], dtype=bool)
+    signatures = np.zeros((len(keys), NUM_PERM), dtype=np.int64)
+    if has_signature.any():
+        signatures[has_signature] = np.stack([cache[key] for key, has in zip(keys, has_signature) if has])
+    return signatures, has_signature
+
+
+def candidate_pairs(signatures, bands=LSH_BANDS, band_rows=BAND_ROWS):
+    """(i, j) pairs with i < j that agree on every value of at least one band."""
+    pairs = set()
+    for band in range(bands):
+        band_values = signatures[:, band * band_rows:(band + 1) * band_rows]
+        _, buckets = np.unique(band_values, axis=0, return_inverse=True)
+        order = np.argsort(buckets, kind='stable')
+        bucket_starts = np.flatnonzero(np.diff(buckets[order], prepend=-1))
+        for members in np.split(order, bucket_starts[1:]):
+            if len(members) > 1:
+                pairs.update((int(i), int(j)) for k, i in enumerate(members) for j in members[k + 1:])
+    return pairs
+
+
+def estimated_jaccard(signatures, i, j):
+    return float(np.mean(signatures[i] == signatures[j]))
+
+
+class DuplicateGroups:
+    """Groups of track versions and the canonical (most popular) track of each."""
+
+    def __init__(self, df, lyrics, title_col='track_name', threshold=DUPLICATE_THRESHOLD, artifact_dir=None):
+        titles = df[title_col].astype('object').tolist()
+        signatures, has_signature = track_signatures(lyrics, titles, artifact_dir)
+        signed_rows = np.flatnonzero(has_signature)
+
+        # Union-find over the verified candidate pairs
+        parent = np.arange(len(df))
+
+        def find(row):
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+
+        for i, j in candidate_pairs(signatures[signed_rows]):
+            if estimated_jaccard(signatures, signed_rows[i], signed_rows[j]) >= threshold:
+                parent[find(signed_rows[j])] = find(signed_rows[i])
+        roots = np.array([find(row) for row in range(len(df))], dtype=np.int64)
+        _, self.groups = np.unique(roots, return_inverse=True)
+        self.n_groups = int(self.groups.max()) + 1 if len(df) else 0
+
+        # Canonical version: highest popularity, then most views, then the earliest row
+        sort_keys = [np.arange(len(df))] # np.lexsort sorts by the last key first
+        for col in ['viewCount', 'popularity']:
+            if col in df.columns:
+                sort_keys.append(-np.nan_to_num(metric_values(df[col]), nan=-np.inf))
+        order = np.lexsort(sort_keys + [self.groups])
+        first_of_group = np.flatnonzero(np.diff(self.groups[order], prepend=-1))
+        self.canonical_rows = np.sort(order[first_of_group])
+
+    def __len__(self):
+        return len(self.groups)
+
+    @property
+    def duplicate_count(self):
+        """Tracks that are not the canonical version of their song."""
+        return len(self.groups) - self.n_groups
+
+
+def build_duplicate_groups(df, lyrics, artifact_dir=None):
+    """DuplicateGroups for df and its lyrics_text column, persisted per content of the inputs."""
+    cols = [col for col in ['track_name', 'popularity', 'viewCount'] if col in df.columns]
+    key = data_fingerprint(df[cols].astype('object'), lyrics.astype('object'), DEDUP_VERSION, DUPLICATE_THRESHOLD)
+    return load_or_build('duplicate_groups', key, lambda: DuplicateGroups(df, lyrics, artifact_dir=artifact_dir), artifact_dir)
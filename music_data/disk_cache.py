@@ -0,0 +1,180 @@
+"""Persistent on-disk cache of prepared tables.
+
+Entries are Parquet files keyed by the source file's path, size, mtime and
+content hash plus CLEANING_VERSION, so they survive Streamlit restarts and
+rolling deploys but are never reused for a different CSV or cleaning logic.
+The directory is capped in size and the least recently used entries are
+evicted first, except entries pinned by a reader that still holds them
+(a TextStore reading its lyrics from one, say). Clearing the cache removes
+pinned entries too, and may run in another process, so readers must also
+cope with a missing file.
+
+Clear it with:
+
+    python -m music_data.disk_cache --clear [source.csv]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import uuid
+import weakref
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from music_data.cleaning import CLEANING_VERSION
+from music_data.snapshot import file_sha256
+from music_data.text_store import ROW_GROUP_SIZE
+
+# Root for everything persisted between runs (prepared tables, models, indexes)
+CACHE_ROOT = Path(os.environ.get(
+    'MUSIC_DASHBOARD_CACHE_DIR',
+    str(Path(__file__).resolve().parent.parent / '.cache'),
+))
+DEFAULT_CACHE_DIR = CACHE_ROOT / 'prepared'
+DEFAULT_MAX_BYTES = int(os.environ.get('MUSIC_DASHBOARD_CACHE_MB', '256')) * 1024 * 1024
+
+
+def _short_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+class PreparedTableCache:
+    """Size-capped LRU directory of prepared tables."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        # (path, size, mtime_ns) -> sha256, so unchanged files are hashed once per process
+        self._hash_memo = {}
+        # entry -> number of live readers holding it, which evict() leaves alone
+        self._pins = {}
+        self._pins_lock = threading.Lock()
+
+    def _content_hash(self, path, stat):
+        memo_key = (path, stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._hash_memo:
+            self._hash_memo[memo_key] = file_sha256(path)
+        return self._hash_memo[memo_key]
+
+    def key_for(self, source_path):
+        """Cache key for the current version of source_path.
+
+        The key starts with a hash of the path so all versions of one source
+        can be found (and invalidated) together.
+        """
+        path = os.path.abspath(source_path)
+        stat = os.stat(path)
+        version = json.dumps({
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': self._content_hash(path, stat),
+            'cleaning_version': CLEANING_VERSION,
+        }, sort_keys=True)
+        return f"{_short_hash(path)}-{_short_hash(version)}"
+
+    def _entry_path(self, key):
+        return self.cache_dir / f"{key}.parquet"
+
+    def put(self, key, df):
+        """Stores df under key, then evicts old entries beyond the size cap."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entry = self._entry_path(key)
+        # Unique per write: threads of one Streamlit process may build the same entry at once
+        tmp_path = entry.with_name(f"{entry.name}.{uuid.uuid4().hex}.tmp")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_path, entry)
+        self.evict(keep=entry)
+
+    def entry_for(self, source_path, build, key=None):
+        """Path of the cached table for source_path, calling build() on a miss.
+
+        Returns None when the built table is empty or could not be written.
+        """
+        key = key or self.key_for(source_path)
+        entry = self._entry_path(key)
+        if entry.exists():
+            try:
+                os.utime(entry)
+            except OSError:
+                pass
+            return entry
+        df = build()
+        if df.empty:
+            return None
+        try:
+            self.put(key, df)
+        except OSError:
+            return None
+        return entry
+
+    def pin(self, entry, owner):
+        """Keeps entry from being evicted for as long as owner is alive."""
+        entry = Path(entry)
+        with self._pins_lock:
+            self._pins[entry] = self._pins.get(entry, 0) + 1
+        weakref.finalize(owner, self._unpin, entry)
+
+    def _unpin(self, entry):
+        with self._pins_lock:
+            self._pins[entry] -= 1
+            if not self._pins[entry]:
+                del self._pins[entry]
+
+    def pinned(self):
+        with self._pins_lock:
+            return set(self._pins)
+
+    def entries(self):
+        """Cache files, least recently used first."""
+        if not self.cache_dir.exists():
+            return []
+        return sorted(self.cache_dir.glob('*.parquet'), key=lambda p: p.stat().st_mtime)
+
+    def evict(self, keep=None):
+        """Deletes least recently used unpinned entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        pinned = self.pinned()
+        total = sum(p.stat().st_size for p in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry == keep or entry in pinned:
+                continue
+            size = entry.stat().st_size
+            entry.unlink(missing_ok=True)
+            total -= size
+
+    def invalidate(self, source_path=None):
+        """Removes every cached version of source_path, or the whole cache if None."""
+        pattern = '*.parquet'
+        if source_path is not None:
+            pattern = f"{_short_hash(os.path.abspath(source_path))}-*.parquet"
+        removed = 0
+        if self.cache_dir.exists():
+            for entry in self.cache_dir.glob(pattern):
+                entry.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the on-disk cache of prepared tables.")
+    parser.add_argument('--clear', action='store_true', help="Delete cached tables")
+    parser.add_argument('source', nargs='?', help="Only clear entries built from this file")
+    args = parser.parse_args()
+
+    cache = PreparedTableCache()
+    if args.clear:
+        removed = cache.invalidate(args.source)
+        print(f"Removed {removed} cached table(s) from {cache.cache_dir}")
+    else:
+        for entry in cache.entries():
+            print(f"{entry.name}\t{entry.stat().st_size / 1024:.0f} KB")
+
+
+if __name__ == '__main__':
+    main()
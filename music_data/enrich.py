@@ -0,0 +1,522 @@
+"""Concurrent, incremental enrichment of the tracks CSV.
+
+Produces the next enriched CSV from the current one:
+
+    python -m music_data.enrich final_enriched_tracks_v3.csv -o final_enriched_tracks_v4.csv
+
+Each source is an external API that fills some columns from an id column:
+
+* youtube (videoId): viewCount, likeCount, commentCount, publishedAt, yt_duration,
+  categoryId, description, tags; 50 videos per request. Needs YOUTUBE_API_KEY.
+* spotify (track_id): popularity; 50 tracks per request. Needs SPOTIFY_TOKEN.
+* musicbrainz (recording_mbid): isrcs, release_mbids, recording_duration_ms; one
+  recording per request at MusicBrainz's 1 request/second. Set MUSICBRAINZ_USER_AGENT.
+* ai (song_cluster_id): ai_theme, ai_sentiment, ai_notes for tracks with lyrics, from
+  the service at AI_ENRICH_URL (POST {id, track_name, lyrics_text}, answering with
+  those three fields). Never refreshed once filled.
+
+Requests run concurrently on asyncio, within each source's rate and
+concurrency limits, and are retried with exponential backoff on 429/5xx
+and network errors (honouring Retry-After). Merged rows ('id1 | id2')
+are fetched per id and written back ' | '-joined in the same order.
+
+Everything fetched is kept in a SQLite store: the raw responses (so a
+repeated request is answered locally while fresh) and the parsed values
+per id with their fetch time. The values are committed after every
+batch, so the store is also the checkpoint: a run that crashes resumes
+where it stopped. By default only ids never fetched or older than the
+source's max age are requested (--mode missing: only rows with empty
+columns; --mode full: everything, from the APIs rather than the response
+cache).
+
+To try it without touching the real APIs, start the stub server and
+point every source at it:
+
+    python -m music_data.enrich_stub --port 8765
+    python -m music_data.enrich final_enriched_tracks_v3.csv -o /tmp/out.csv --base-url http://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from music_data.disk_cache import CACHE_ROOT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE = CACHE_ROOT / 'enrichment.sqlite'
+MAX_RETRIES = 5
+# First retry delay in seconds, doubled on every further attempt (plus jitter)
+BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Statuses that mean the credentials are wrong: the rest of the source is skipped
+FATAL_STATUSES = {401, 403}
+DAY = 24 * 60 * 60
+MODES = ['stale', 'missing', 'full']
+
+
+class RequestError(Exception):
+    """A request that failed for good (a non-retryable status, or out of retries)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def split_values(value):
+    """Parts of a ' | '-joined cell (empty for a missing one)."""
+    return [part.strip() for part in str(value).split('|') if part.strip()]
+
+
+def format_value(value):
+    """Cell text for an API value: integers without '.0', lists comma-joined, None as ''."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (list, tuple)):
+        return ', '.join(str(part) for part in value)
+    return str(value)
+
+
+# --- Sources ---
+class Source(ABC):
+    """One external API: the id column it is queried by and the columns it fills."""
+    name = None
+    id_col = None
+    fields = []
+    batch_size = 1
+    rate = 1.0 # requests per second
+    concurrency = 1
+    max_age_days = None # None: values never go stale once fetched
+    default_base_url = None
+
+    def __init__(self, base_url=None):
+        self.stubbed = base_url is not None
+        self.base_url = (base_url or self.default_base_url or '').rstrip('/')
+
+    def missing_credentials(self):
+        """Why the source cannot run, or None."""
+        return None
+
+    def wants(self, row):
+        """True if row should be enriched by this source."""
+        return True
+
+    @abstractmethod
+    def request(self, ids, rows):
+        """(url, headers, JSON body or None) for a batch of ids; rows maps each id to its CSV row."""
+
+    @abstractmethod
+    def parse(self, payload, ids):
+        """{id: {field: value}} from a response (payload is None when the API had nothing, e.g. a 404)."""
+
+
+class YouTubeSource(Source):
+    name = 'youtube'
+    id_col = 'videoId'
+    fields = ['viewCount', 'likeCount', 'commentCount', 'publishedAt', 'yt_duration', 'categoryId', 'description', 'tags']
+    batch_size = 50
+    rate = 5.0
+    concurrency = 8
+    max_age_days = 7
+    default_base_url = 'https://www.googleapis.com'
+
+    def missing_credentials(self):
+        if not self.stubbed and not os.environ.get('YOUTUBE_API_KEY'):
+            return "set YOUTUBE_API_KEY"
+        return None
+
+    def request(self, ids, rows):
+        query = {'part': 'snippet,statistics,contentDetails', 'id': ','.join(ids)}
+        if os.environ.get('YOUTUBE_API_KEY'):
+            query['key'] = os.environ['YOUTUBE_API_KEY']
+        return f"{self.base_url}/youtube/v3/videos?{urllib.parse.urlencode(query)}", {}, None
+
+    def parse(self, payload, ids):
+        values = {video_id: {} for video_id in ids}
+        for item in (payload or {}).get('items', []):
+            statistics = item.get('statistics', {})
+            snippet = item.get('snippet', {})
+            values[item['id']] = {
+                'viewCount': statistics.get('viewCount'),
+                'likeCount': statistics.get('likeCount'),
+                'commentCount': statistics.get('commentCount'),
+                'publishedAt': snippet.get('publishedAt'),
+                'yt_duration': item.get('contentDetails', {}).get('duration'),
+                'categoryId': snippet.get('categoryId'),
+                'description': snippet.get('description'),
+                'tags': ','.join(snippet['tags']) if snippet.get('tags') else None,
+            }
+        return values
+
+
+class SpotifySource(Source):
+    name = 'spotify'
+    id_col = 'track_id'
+    fields = ['popularity']
+    batch_size = 50
+    rate = 5.0
+    concurrency = 4
+    max_age_days = 7
+    default_base_url = 'https://api.spotify.com'
+
+    def missing_credentials(self):
+        if not self.stubbed and not os.environ.get('SPOTIFY_TOKEN'):
+            return "set SPOTIFY_TOKEN (a client-credentials access token)"
+        return None
+
+    def request(self, ids, rows):
+        headers = {'Authorization': f"Bearer {os.environ['SPOTIFY_TOKEN']}"} if os.environ.get('SPOTIFY_TOKEN') else {}
+        return f"{self.base_url}/v1/tracks?{urllib.parse.urlencode({'ids': ','.join(ids)})}", headers, None
+
+    def parse(self, payload, ids):
+        values = {track_id: {} for track_id in ids}
+        for track in (payload or {}).get('tracks', []):
+            if track:
+                values[track['id']] = {'popularity': track.get('popularity')}
+        return values
+
+
+class MusicBrainzSource(Source):
+    name = 'musicbrainz'
+    id_col = 'recording_mbid'
+    fields = ['isrcs', 'release_mbids', 'recording_duration_ms']
+    rate = 1.0 # https://musicbrainz.org/doc/MusicBrainz_API/Rate_Limiting
+    max_age_days = 90
+    default_base_url = 'https://musicbrainz.org'
+
+    def request(self, ids, rows):
+        user_agent = os.environ.get('MUSICBRAINZ_USER_AGENT', 'music-dashboard/1.0 (enrichment)')
+        url = f"{self.base_url}/ws/2/recording/{urllib.parse.quote(ids[0])}?inc=isrcs+releases&fmt=json"
+        return url, {'User-Agent': user_agent, 'Accept': 'application/json'}, None
+
+    def parse(self, payload, ids):
+        if payload is None:
+            return {ids[0]: {}}
+        return {ids[0]: {
+            'isrcs': payload.get('isrcs') or None,
+            'release_mbids': [release['id'] for release in payload.get('releases', [])] or None,
+            'recording_duration_ms': payload.get('length'),
+        }}
+
+
+class AISource(Source):
+    name = 'ai'
+    id_col = 'song_cluster_id'
+    fields = ['ai_theme', 'ai_sentiment', 'ai_notes']
+    rate = 2.0
+    concurrency = 2
+
+    def __init__(self, base_url=None):
+        super().__init__(base_url)
+        if base_url is not None:
+            self.base_url += '/ai'
+        else:
+            self.base_url = os.environ.get('AI_ENRICH_URL', '').rstrip('/')
+
+    def missing_credentials(self):
+        return None if self.base_url else "set AI_ENRICH_URL"
+
+    def wants(self, row):
+        return bool(row.get('lyrics_text', '').strip())
+
+    def request(self, ids, rows):
+        row = rows[ids[0]]
+        headers = {'Content-Type': 'application/json'}
+        if os.environ.get('AI_ENRICH_TOKEN'):
+            headers['Authorization'] = f"Bearer {os.environ['AI_ENRICH_TOKEN']}"
+        body = {'id': ids[0], 'track_name': row.get('track_name', ''), 'lyrics_text': row.get('lyrics_text', '')}
+        return self.base_url, headers, body
+
+    def parse(self, payload, ids):
+        return {ids[0]: {field: (payload or {}).get(field) for field in self.fields}}
+
+
+SOURCES = {source.name: source for source in [YouTubeSource, SpotifySource, MusicBrainzSource, AISource]}
+
+
+# --- Store (response cache and checkpoint) ---
+class EnrichmentStore:
+    """SQLite file of raw responses per request and parsed values per id, with fetch times."""
+
+    def __init__(self, path=DEFAULT_STORE):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                source TEXT, request_key TEXT, body TEXT, fetched_at REAL, PRIMARY KEY (source, request_key));
+            CREATE TABLE IF NOT EXISTS items (
+                source TEXT, item_id TEXT, payload TEXT, fetched_at REAL, PRIMARY KEY (source, item_id));
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def cached_response(self, source, request_key, max_age):
+        """The stored response for a request while younger than max_age seconds (None: any age)."""
+        row = self.db.execute(
+            "SELECT body, fetched_at FROM responses WHERE source = ? AND request_key = ?", (source, request_key)
+        ).fetchone()
+        if row is None or (max_age is not None and time.time() - row[1] > max_age):
+            return None
+        return row
+
+    def save_batch(self, source, request_key, body, values):
+        """Stores a response and its parsed values in one transaction (the checkpoint)."""
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (source, request_key, json.dumps(body), now)
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                [(source, item_id, json.dumps(item), now) for item_id, item in values.items()]
+            )
+
+    def fetched_at(self, source):
+        """{id: fetch time} of every id fetched for source."""
+        return dict(self.db.execute("SELECT item_id, fetched_at FROM items WHERE source = ?", (source,)))
+
+    def items(self, source):
+        """{id: {field: value}} of every id fetched for source."""
+        rows = self.db.execute("SELECT item_id, payload FROM items WHERE source = ?", (source,))
+        return {item_id: json.loads(payload) for item_id, payload in rows}
+
+
+# --- Fetching ---
+class RateLimiter:
+    """Spaces request starts at least 1 / rate seconds apart; pause() holds every request back."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds):
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+
+def http_json(url, headers, body, timeout=REQUEST_TIMEOUT):
+    """Blocking JSON GET (POST when body is given); None for a 404."""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers, method='POST' if data is not None else 'GET')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            return None
+        raise
+
+
+def request_key(url, body):
+    """Cache key of a request, without credentials."""
+    parts = urllib.parse.urlsplit(url)
+    query = [(key, value) for key, value in urllib.parse.parse_qsl(parts.query) if key != 'key']
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query))) + (json.dumps(body) if body else '')
+
+
+async def fetch_with_retries(source, limiter, url, headers, body):
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.wait()
+        try:
+            return await asyncio.to_thread(http_json, url, headers, body)
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise RequestError(f"{source.name}: HTTP {e.code}", e.code) from e
+            retry_after = e.headers.get('Retry-After') if e.headers else None
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+        # Dropped connections (ConnectionResetError, RemoteDisconnected) and cut-short bodies are retried too
+        except (
+            urllib.error.URLError, TimeoutError, ConnectionError, http.client.IncompleteRead, json.JSONDecodeError
+        ) as e:
+            if attempt == MAX_RETRIES:
+                raise RequestError(f"{source.name}: {e}") from e
+            delay = None
+        delay = delay or BACKOFF_SECONDS * 2 ** attempt * (1 + random.random())
+        limiter.pause(delay) # Back off the whole source, not just this request
+        await asyncio.sleep(delay)
+
+
+async def run_source(source, batches, rows, store, use_cache=True):
+    """Fetches every batch of ids, checkpointing each one. Returns (batches done, batches failed).
+
+    Without use_cache every batch is requested, even one with a fresh stored response.
+    """
+    limiter = RateLimiter(source.rate)
+    semaphore = asyncio.Semaphore(source.concurrency)
+    max_age = source.max_age_days * DAY if source.max_age_days is not None else None
+    done, failed = 0, 0
+    fatal = None
+
+    async def run_batch(ids):
+        nonlocal done, failed, fatal
+        async with semaphore:
+            if fatal is not None:
+                failed += 1
+                return
+            url, headers, body = source.request(ids, rows)
+            key = request_key(url, body)
+            cached = store.cached_response(source.name, key, max_age) if use_cache else None
+            try:
+                payload = json.loads(cached[0]) if cached else await fetch_with_retries(source, limiter, url, headers, body)
+            except RequestError as e:
+                failed += 1
+                if e.status in FATAL_STATUSES:
+                    fatal = e
+                logger.warning("%s (ids %s%s)", e, ', '.join(ids[:3]), '...' if len(ids) > 3 else '')
+                return
+            store.save_batch(source.name, key, payload, source.parse(payload, ids))
+            done += 1
+            if done % 100 == 0:
+                logger.info("%s: %d/%d batches", source.name, done, len(batches))
+
+    await asyncio.gather(*(run_batch(ids) for ids in batches))
+    if fatal is not None:
+        logger.error("%s: stopped after %s; check the credentials", source.name, fatal)
+    return done, failed
+
+
+# --- Planning and merging ---
+def ids_to_fetch(df, source, fetched_at, mode='stale', now=None):
+    """Sorted ids the source should request, plus {id: row} for building requests."""
+    now = time.time() if now is None else now
+    max_age = source.max_age_days * DAY if source.max_age_days is not None else None
+    rows = {}
+    wanted = set()
+    for row in df.to_dict('records'):
+        if not source.wants(row):
+            continue
+        ids = split_values(row.get(source.id_col, ''))
+        missing_fields = any(not str(row.get(field, '')).strip() for field in source.fields)
+        for item_id in ids:
+            rows.setdefault(item_id, row)
+            if mode == 'full':
+                wanted.add(item_id)
+            elif item_id not in fetched_at:
+                if mode == 'stale' or missing_fields:
+                    wanted.add(item_id)
+            elif mode == 'stale' and max_age is not None and now - fetched_at[item_id] > max_age:
+                wanted.add(item_id)
+    return sorted(wanted), rows
+
+
+def apply_items(df, source, items):
+    """df with the source's columns filled from the fetched items.
+
+    A cell is only replaced when every id of its row has been fetched and
+    the API returned some value; otherwise the current value is kept.
+    """
+    df = df.copy()
+    for field in source.fields:
+        if field not in df.columns:
+            df[field] = ''
+    for position, value in enumerate(df[source.id_col] if source.id_col in df.columns else []):
+        ids = split_values(value)
+        if not ids or any(item_id not in items for item_id in ids):
+            continue
+        for field in source.fields:
+            values = [items[item_id].get(field) for item_id in ids]
+            if all(v is None for v in values):
+                continue
+            df.iat[position, df.columns.get_loc(field)] = ' | '.join(format_value(v) for v in values)
+    return df
+
+
+async def enrich_async(df, sources, store, mode='stale'):
+    plans = []
+    for source in sources:
+        if source.id_col not in df.columns:
+            logger.warning("%s: no '%s' column, skipped", source.name, source.id_col)
+            continue
+        ids, rows = ids_to_fetch(df, source, store.fetched_at(source.name), mode)
+        batches = [ids[i:i + source.batch_size] for i in range(0, len(ids), source.batch_size)]
+        logger.info("%s: %d ids to fetch in %d requests", source.name, len(ids), len(batches))
+        plans.append((source, batches, rows))
+
+    # Requests block in threads: one per request a source may have in flight
+    workers = sum(source.concurrency for source, _, _ in plans) or 1
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    # Sources are independent, so they run side by side, each within its own limits
+    results = await asyncio.gather(*(
+        run_source(source, batches, rows, store, use_cache=mode != 'full') for source, batches, rows in plans
+    ))
+    for (source, _, _), (done, failed) in zip(plans, results):
+        logger.info("%s: %d requests done, %d failed", source.name, done, failed)
+        df = apply_items(df, source, store.items(source.name))
+    return df
+
+
+def enrich(df, sources, store, mode='stale'):
+    """Runs the sources over df (read as strings) and returns the enriched frame."""
+    return asyncio.run(enrich_async(df, sources, store, mode))
+
+
+def write_csv(df, path):
+    """Writes atomically, so a crash never leaves a half-written CSV."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich the tracks CSV from YouTube, Spotify, MusicBrainz and an AI service.")
+    parser.add_argument('input')
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--sources', default=','.join(SOURCES), help="Comma-separated sources (default: all)")
+    parser.add_argument('--mode', choices=MODES, default='stale',
+                        help="stale: never fetched or too old (default); missing: rows with empty columns; "
+                             "full: everything, bypassing the response cache")
+    parser.add_argument('--base-url', help="Send every source to this server (e.g. the stub server)")
+    parser.add_argument('--store', default=str(DEFAULT_STORE), help="Response cache and checkpoint file")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+    sources = []
+    for name in args.sources.split(','):
+        if name not in SOURCES:
+            parser.error(f"unknown source '{name}' (choose from {', '.join(SOURCES)})")
+        source = SOURCES[name](args.base_url)
+        reason = source.missing_credentials()
+        if reason:
+            logger.warning("%s: skipped, %s", name, reason)
+        else:
+            sources.append(source)
+
+    df = pd.read_csv(args.input, dtype=str, keep_default_na=False)
+    store = EnrichmentStore(args.store)
+    start = time.perf_counter()
+    try:
+        df = enrich(df, sources, store, args.mode)
+    finally:
+        store.close()
+    write_csv(df, args.output)
+    logger.info("Wrote %d rows to %s in %.1fs", len(df), args.output, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""Local stand-in for the enrichment APIs, for trying and testing music_data.enrich.
+
+    python -m music_data.enrich_stub --port 8765 --fail-rate 0.1 --latency 0.05
+
+Serves the YouTube, Spotify, MusicBrainz and AI paths music_data.enrich
+requests, answering with made-up values derived from a hash of each id
+(the same id always gets the same answer). --fail-rate answers that share
+of requests with a 429 or 503 to exercise the retries, and --latency
+delays every response.
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+def stable_number(item_id, field, high):
+    """Deterministic 0 <= n < high for an id and field."""
+    digest = hashlib.sha1(f'{field}:{item_id}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % high
+
+
+def youtube_video(video_id):
+    return {
+        'id': video_id,
+        'statistics': {
+            'viewCount': str(stable_number(video_id, 'views', 10_000_000)),
+            'likeCount': str(stable_number(video_id, 'likes', 100_000)),
+            'commentCount': str(stable_number(video_id, 'comments', 5_000)),
+        },
+        'snippet': {
+            'publishedAt': f"20{10 + stable_number(video_id, 'year', 15)}-0{1 + stable_number(video_id, 'month', 9)}-15T00:00:00Z",
+            'categoryId': '10',
+            'description': f'Stub description of {video_id}',
+            'tags': ['stub', f'tag{stable_number(video_id, "tag", 10)}'],
+        },
+        'contentDetails': {'duration': f"PT{2 + stable_number(video_id, 'minutes', 4)}M{stable_number(video_id, 'seconds', 60)}S"},
+    }
+
+
+def spotify_track(track_id):
+    return {'id': track_id, 'popularity': stable_number(track_id, 'popularity', 101)}
+
+
+def musicbrainz_recording(mbid):
+    return {
+        'id': mbid,
+        'length': 150_000 + stable_number(mbid, 'length', 150_000),
+        'isrcs': [f"TW{stable_number(mbid, 'isrc', 10 ** 10):010d}"],
+        'releases': [{'id': hashlib.md5(f'{mbid}:{i}'.encode('utf-8')).hexdigest()} for i in range(1 + stable_number(mbid, 'releases', 3))],
+    }
+
+
+AI_THEMES = ['love', 'longing', 'hope', 'nostalgia', 'heartbreak']
+AI_SENTIMENTS = ['positive', 'negative', 'bittersweet']
+
+
+def ai_notes(request):
+    item_id = str(request.get('id', ''))
+    theme = AI_THEMES[stable_number(item_id, 'theme', len(AI_THEMES))]
+    return {
+        'ai_theme': theme,
+        'ai_sentiment': AI_SENTIMENTS[stable_number(item_id, 'sentiment', len(AI_SENTIMENTS))],
+        'ai_notes': f"Stub notes: a song about {theme} ({len(request.get('lyrics_text', ''))} characters of lyrics).",
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    fail_rate = 0.0
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def failed(self):
+        """Answers with an injected failure; True when it did."""
+        time.sleep(self.latency)
+        if random.random() >= self.fail_rate:
+            return False
+        if random.random() < 0.5:
+            self.send_json(429, {'error': 'rate limited'}, {'Retry-After': '1'})
+        else:
+            self.send_json(503, {'error': 'unavailable'})
+        return True
+
+    def do_GET(self):
+        if self.failed():
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        ids = [item_id for value in query.get('id', query.get('ids', [])) for item_id in value.split(',') if item_id]
+        if url.path == '/youtube/v3/videos':
+            self.send_json(200, {'items': [youtube_video(video_id) for video_id in ids]})
+        elif url.path == '/v1/tracks':
+            self.send_json(200, {'tracks': [spotify_track(track_id) for track_id in ids]})
+        elif url.path.startswith('/ws/2/recording/'):
+            self.send_json(200, musicbrainz_recording(unquote(url.path[len('/ws/2/recording/'):])))
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.failed():
+            return
+        if urlsplit(self.path).path == '/ai':
+            self.send_json(200, ai_notes(request))
+        else:
+            self.send_json(404, {'error': 'not found'})
+
+
+def serve(port=8765, fail_rate=0.0, latency=0.0):
+    handler = type('Handler', (StubHandler,), {'fail_rate': fail_rate, 'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"Stub enrichment APIs on http://127.0.0.1:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stand-in enrichment APIs on localhost.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="Share of requests answered with 429 / 503")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds every response is delayed")
+    args = parser.parse_args()
+    serve(args.port, args.fail_rate, args.latency)
+
+
+if __name__ == '__main__':
+    main()
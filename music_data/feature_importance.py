@@ -0,0 +1,170 @@
+"""Random Forest feature-importance pipeline for predicting popularity.
+
+Impurity importance is reported per feature. Permutation importance is
+measured per feature group (all one-hot columns of a source column are
+shuffled together), which is both more meaningful for one-hot encodings
+and far cheaper than permuting hundreds of dummy columns one by one.
+
+The fitted model and its importances are persisted under a hash of the
+feature matrix and target, so they are only retrained when the data
+that feeds the model changes.
+"""
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.impute import SimpleImputer
+from sklearn.metrics import r2_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+
+from music_data.artifacts import data_fingerprint, load_or_build
+from music_data.lyrics import lyric_word_counts
+
+# Bump whenever the features or model settings change
+PIPELINE_VERSION = 3
+TARGET_COL = 'popularity'
+# Categorical columns expanded into one-hot features, with their display prefix
+ONE_HOT_COLS = {
+    'combined_key': 'Key',
+    'genre_ros': 'Genre',
+    'ai_theme': 'AI Theme',
+    'ai_sentiment': 'AI Sentiment',
+}
+# Numeric audio features; missing values are imputed with the median
+NUMERIC_COLS = {
+    'bpm': 'BPM',
+}
+# Two-valued audio labels scored 1.0 for the given label, 0.0 for the other
+LABEL_COLS = {
+    'danceability': ('danceable', 'Danceable'),
+    'timbre': ('bright', 'Bright Timbre'),
+}
+MODEL_PARAMS = {
+    'n_estimators': 300,
+    'random_state': 42,
+}
+
+
+def label_score(series, label):
+    """1.0 where the column holds label (e.g. 'sad' for mood_sad), 0.0 for any other label, NaN when missing."""
+    score = series.astype('object').eq(label).astype('float64')
+    return score.mask(series.isna())
+
+
+def build_feature_matrix(df):
+    """Feature matrix plus a display label and a feature group for every column."""
+    features = {}
+    labels = {}
+    groups = {}
+
+    if 'lyrics_text' in df.columns:
+        features['lyric_word_count'] = lyric_word_counts(df['lyrics_text'])
+        labels['lyric_word_count'] = groups['lyric_word_count'] = 'Lyric Word Count'
+
+    for col, label in NUMERIC_COLS.items():
+        if col in df.columns:
+            features[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+            labels[col] = groups[col] = label
+
+    for col, (value, label) in LABEL_COLS.items():
+        if col in df.columns:
+            features[col] = label_score(df[col], value)
+            labels[col] = groups[col] = label
+
+    for col in sorted(c for c in df.columns if c.startswith('mood_')):
+        mood = col[len('mood_'):]
+        features[col] = label_score(df[col], mood)
+        labels[col] = groups[col] = f"Mood: {mood}"
+
+    for col, prefix in ONE_HOT_COLS.items():
+        if col not in df.columns:
+            continue
+        dummies = pd.get_dummies(df[col].astype('object'), prefix=col, prefix_sep='=', dtype='float64')
+        for dummy_col in dummies.columns:
+            features[dummy_col] = dummies[dummy_col]
+            labels[dummy_col] = f"{prefix}: {dummy_col.split('=', 1)[1]}"
+            groups[dummy_col] = prefix
+
+    X = pd.DataFrame(features, index=df.index)
+    return X, labels, groups
+
+
+def grouped_permutation_importance(model, X, y, groups, n_repeats=5, random_state=42, n_jobs=-1):
+    """Mean/std drop in R² when each feature group is shuffled, groups scored in parallel."""
+    baseline = r2_score(y, model.predict(X))
+    group_cols = {}
+    for col, group in groups.items():
+        if col in X.columns:
+            group_cols.setdefault(group, []).append(col)
+
+    def score_group(cols, seed):
+        rng = np.random.default_rng(seed)
+        drops = []
+        for _ in range(n_repeats):
+            X_permuted = X.copy()
+            X_permuted[cols] = X[cols].to_numpy()[rng.permutation(len(X))]
+            drops.append(baseline - r2_score(y, model.predict(X_permuted)))
+        return np.mean(drops), np.std(drops)
+
+    # Tree prediction releases the GIL, so threads avoid copying the model into worker processes
+    scores = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(score_group)(cols, random_state + i) for i, cols in enumerate(group_cols.values())
+    )
+    return pd.DataFrame({
+        'group': list(group_cols),
+        'permutation_mean': [mean for mean, _ in scores],
+        'permutation_std': [std for _, std in scores],
+    }).sort_values('permutation_mean', ascending=False).reset_index(drop=True)
+
+
+def fit_feature_importance(X, y, labels, groups, n_jobs=-1, n_repeats=5, test_size=0.2):
+    """Trains the model on all cores and measures impurity and permutation importance."""
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=test_size, random_state=MODEL_PARAMS['random_state']
+    )
+    model = make_pipeline(
+        SimpleImputer(strategy='median', keep_empty_features=True),
+        RandomForestRegressor(n_jobs=n_jobs, **MODEL_PARAMS),
+    )
+    model.fit(X_train, y_train)
+    r2 = r2_score(y_test, model.predict(X_test))
+
+    forest = model[-1]
+    importances = pd.DataFrame({
+        'feature': X.columns,
+        'label': [labels[col] for col in X.columns],
+        'group': [groups[col] for col in X.columns],
+        'importance': forest.feature_importances_,
+    }).sort_values('importance', ascending=False).reset_index(drop=True)
+
+    # The forest parallelizes each predict itself; hand the cores to the group loop instead
+    forest.set_params(n_jobs=1)
+    group_importances = grouped_permutation_importance(
+        model, X_test, y_test, groups, n_repeats=n_repeats, random_state=MODEL_PARAMS['random_state'], n_jobs=n_jobs
+    )
+    forest.set_params(n_jobs=n_jobs)
+
+    return {
+        'model': model,
+        'importances': importances,
+        'group_importances': group_importances,
+        'r2': float(r2),
+        'n_train': len(X_train),
+        'n_test': len(X_test),
+    }
+
+
+def feature_importance(df, n_jobs=-1):
+    """Fitted model and importances for df, loaded from disk when the inputs are unchanged."""
+    if TARGET_COL not in df.columns:
+        raise KeyError(f"Column '{TARGET_COL}' is required to train the model.")
+    X, labels, groups = build_feature_matrix(df)
+    has_target = df[TARGET_COL].notna()
+    X = X[has_target]
+    y = df.loc[has_target, TARGET_COL].astype('float64')
+    if len(y) < 10:
+        raise ValueError(f"Only {len(y)} tracks have a '{TARGET_COL}' value; at least 10 are needed.")
+
+    key = data_fingerprint(X, y, PIPELINE_VERSION, MODEL_PARAMS)
+    return load_or_build('feature_importance', key, lambda: fit_feature_importance(X, y, labels, groups, n_jobs=n_jobs))
@@ -0,0 +1,158 @@
+"""jieba tokenization of lyrics_text and a compact inverted index over it.
+
+Each distinct text is segmented once. Tokens are kept in a persisted
+cache keyed by the text's hash, so a new dataset version only segments
+texts it has not seen before. The index itself is stored as flat
+integer arrays (CSR style) in both directions:
+
+* per track: the term ids and term frequencies of its text
+* per term: the tracks it appears in and how often (the inverted index)
+"""
+import hashlib
+import logging
+import re
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from music_data.artifacts import data_fingerprint, load_artifact, load_or_build, save_artifact
+
+# Bump whenever tokenize() changes its output
+TOKENIZER_VERSION = 1
+# A token counts as a word if it has at least one Han character, letter or digit
+WORD_PATTERN = re.compile('[\u4e00-\u9fffA-Za-z0-9]')
+
+logging.getLogger('jieba').setLevel(logging.WARNING)
+
+
+def tokenize(text):
+    """Segments one lyric with jieba, dropping whitespace and punctuation tokens."""
+    return [token.lower() for token in jieba.lcut(text) if WORD_PATTERN.search(token)]
+
+
+def concat_ranges(starts, stops):
+    """Positions of every [start, stop) range, concatenated in order."""
+    lengths = stops - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+
+def _text_key(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def tokenize_texts(texts, artifact_dir=None):
+    """Token lists for a column of texts (None where the text is missing).
+
+    Distinct texts are segmented once, and only texts missing from the
+    persisted token cache are segmented at all.
+    """
+    cache = load_artifact('jieba_tokens', TOKENIZER_VERSION, artifact_dir) or {}
+    keys = {}
+    new_tokens = 0
+    for text in pd.unique(texts.dropna().astype(str)):
+        key = _text_key(text)
+        keys[text] = key
+        if key not in cache:
+            cache[key] = tokenize(text)
+            new_tokens += 1
+    if new_tokens:
+        try:
+            save_artifact('jieba_tokens', TOKENIZER_VERSION, cache, artifact_dir)
+        except OSError:
+            pass
+    return [None if pd.isna(text) else cache[keys[str(text)]] for text in texts]
+
+
+class TermIndex:
+    """Term statistics and an inverted index over one tokenized text per row."""
+
+    def __init__(self, token_lists):
+        vocabulary = {}
+        doc_terms = []
+        doc_tf = []
+        doc_lengths = np.zeros(len(token_lists), dtype=np.int64)
+        self.has_text = np.array([tokens is not None for tokens in token_lists])
+
+        for row, tokens in enumerate(token_lists):
+            if not tokens:
+                continue
+            term_ids = np.fromiter((vocabulary.setdefault(token, len(vocabulary)) for token in tokens), dtype=np.int32, count=len(tokens))
+            terms, counts = np.unique(term_ids, return_counts=True)
+            doc_terms.append(terms)
+            doc_tf.append(counts.astype(np.int32))
+            doc_lengths[row] = len(terms)
+
+        self.vocabulary = np.array(list(vocabulary), dtype=object)
+        self.term_ids = vocabulary
+        empty = np.array([], dtype=np.int32)
+        self.doc_offsets = np.concatenate([[0], np.cumsum(doc_lengths)])
+        self.doc_terms = np.concatenate(doc_terms) if doc_terms else empty
+        self.doc_tf = np.concatenate(doc_tf) if doc_tf else empty
+        doc_rows = np.repeat(np.arange(len(token_lists), dtype=np.int32), doc_lengths)
+
+        # Per-track statistics
+        self.word_count = np.bincount(doc_rows, weights=self.doc_tf, minlength=len(token_lists)).astype(np.int64)
+        self.unique_terms = doc_lengths
+
+        # Inverted index: the same (row, term, tf) triples grouped by term
+        order = np.argsort(self.doc_terms, kind='stable')
+        self.term_docs = doc_rows[order]
+        self.term_tf = self.doc_tf[order]
+        self.doc_freq = np.bincount(self.doc_terms, minlength=len(self.vocabulary))
+        self.term_offsets = np.concatenate([[0], np.cumsum(self.doc_freq)])
+
+    def __len__(self):
+        return len(self.has_text)
+
+    def stats(self):
+        """Per-row lyric_word_count, lyric_unique_terms and lyric_richness (NaN without lyrics).
+
+        Richness is the type-token ratio: distinct words / total words.
+        """
+        word_count = np.where(self.has_text, self.word_count, np.nan)
+        unique_terms = np.where(self.has_text, self.unique_terms, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            richness = unique_terms / word_count
+        return pd.DataFrame({
+            'lyric_word_count': word_count,
+            'lyric_unique_terms': unique_terms,
+            'lyric_richness': richness,
+        })
+
+    def _postings_for_rows(self, rows):
+        """(term ids, term frequencies) of every row in rows, concatenated."""
+        if rows is None:
+            return self.doc_terms, self.doc_tf
+        rows = np.asarray(rows, dtype=np.int64)
+        positions = concat_ranges(self.doc_offsets[rows], self.doc_offsets[rows + 1])
+        return self.doc_terms[positions], self.doc_tf[positions]
+
+    def top_terms(self, rows=None, n=20, min_length=2):
+        """Most frequent terms over rows, with the number of those rows using each.
+
+        min_length drops single-character particles (的, 我, 你).
+        """
+        terms, tf = self._postings_for_rows(rows)
+        counts = np.bincount(terms, weights=tf, minlength=len(self.vocabulary))
+        if min_length > 1:
+            lengths = np.fromiter((len(term) for term in self.vocabulary), dtype=np.int64, count=len(self.vocabulary))
+            counts = np.where(lengths >= min_length, counts, 0)
+        top = np.argsort(-counts, kind='stable')[:n]
+        top = top[counts[top] > 0]
+        tracks = np.bincount(terms, minlength=len(self.vocabulary))
+        return pd.DataFrame({
+            'term': self.vocabulary[top],
+            'count': counts[top].astype(np.int64),
+            'tracks': tracks[top],
+        })
+
+def build_lyrics_index(lyrics, artifact_dir=None):
+    """TermIndex for a lyrics_text column, persisted per distinct column content."""
+    key = data_fingerprint(lyrics.astype('object'), TOKENIZER_VERSION)
+    return load_or_build('lyrics_index', key, lambda: TermIndex(tokenize_texts(lyrics, artifact_dir)), artifact_dir)
+
+
+def lyric_word_counts(lyrics, artifact_dir=None):
+    """jieba word count per lyric (NaN where there are no lyrics)."""
+    return build_lyrics_index(lyrics, artifact_dir).stats()['lyric_word_count'].set_axis(lyrics.index)
@@ -0,0 +1,191 @@
+"""Per-rerun profiling: stage timers, memory deltas, cache hits and figure sizes.
+
+Every script run opens a run record (begin_run) and closes it (end_run).
+In between, stage() times a block and notes the change in resident
+memory, payload() notes the serialized size of a chart, and functions
+wrapped by profiled_cache() count how often their cache answered. Stages
+and payloads are only collected for runs begun with enabled=True, so the
+normal dashboard pays nothing but a flag check; cache counters are
+process-wide and always kept.
+
+A finished run is logged as one JSON line on the 'music_data.profiling'
+logger and, when MUSIC_DASHBOARD_METRICS names a file, appended to it.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# JSON-lines file every finished run is appended to (unset: no file)
+METRICS_PATH_ENV = 'MUSIC_DASHBOARD_METRICS'
+# Profile every run, not only the ones that ask for it
+PROFILE_ENV = 'MUSIC_DASHBOARD_PROFILE'
+
+
+def resident_memory():
+    """Resident set size of this process in bytes, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def figure_payload_bytes(fig):
+    """Size of the JSON a Plotly figure is sent to the browser as."""
+    return len(fig.to_json().encode('utf-8'))
+
+
+def profiling_requested():
+    return os.environ.get(PROFILE_ENV, '') not in ('', '0')
+
+
+class Profiler:
+    """Collects the current run of each thread (Streamlit runs every session's script on its own thread)."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.cache_calls = Counter()
+        self.cache_misses = Counter()
+
+    @property
+    def run(self):
+        return getattr(self._local, 'run', None)
+
+    @property
+    def enabled(self):
+        return self.run is not None
+
+    def begin_run(self, page, enabled=True):
+        """Starts a run record for this thread, dropping any unfinished one."""
+        self._local.run = {
+            'page': page,
+            'started': time.time(),
+            'start_clock': time.perf_counter(),
+            'start_memory': resident_memory(),
+            'stages': [],
+            'payloads': [],
+            'cache_calls': Counter(),
+            'cache_misses': Counter(),
+        } if enabled else None
+        self._local.stack = []
+
+    @contextmanager
+    def stage(self, name):
+        """Times the block as a stage nested under the enclosing ones."""
+        run = self.run
+        if run is None:
+            yield
+            return
+        stack = self._local.stack
+        stack.append(name)
+        record = {'stage': '/'.join(stack), 'depth': len(stack) - 1}
+        run['stages'].append(record)
+        memory = resident_memory()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['ms'] = (time.perf_counter() - start) * 1000
+            end_memory = resident_memory()
+            record['memory_delta'] = end_memory - memory if memory is not None and end_memory is not None else None
+            stack.pop()
+
+    def timed(self, name=None):
+        """Decorator running the function as a stage (named after it by default)."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def payload(self, name, fig):
+        """Notes the serialized size of a figure about to be rendered."""
+        run = self.run
+        if run is not None:
+            run['payloads'].append({'figure': name, 'bytes': figure_payload_bytes(fig)})
+
+    def count_cache(self, name, miss):
+        with self._lock:
+            self.cache_calls[name] += 1
+            self.cache_misses[name] += miss
+        run = self.run
+        if run is not None:
+            run['cache_calls'][name] += 1
+            run['cache_misses'][name] += miss
+
+    def cache_stats(self, run=None):
+        """[{cache, calls, misses, hit_rate}] for a run, or process-wide when run is None."""
+        calls = self.cache_calls if run is None else run['cache_calls']
+        misses = self.cache_misses if run is None else run['cache_misses']
+        return [
+            {'cache': name, 'calls': calls[name], 'misses': misses[name], 'hit_rate': 1 - misses[name] / calls[name]}
+            for name in sorted(calls)
+        ]
+
+    def end_run(self):
+        """Closes this thread's run; returns its record (None when it was not profiled) after logging it."""
+        run = self.run
+        self._local.run = None
+        if run is None:
+            return None
+        end_memory = resident_memory()
+        record = {
+            'page': run['page'],
+            'started': run['started'],
+            'total_ms': (time.perf_counter() - run['start_clock']) * 1000,
+            'memory': end_memory,
+            'memory_delta': end_memory - run['start_memory'] if end_memory is not None and run['start_memory'] is not None else None,
+            'stages': run['stages'],
+            'payloads': run['payloads'],
+            'caches': self.cache_stats(run),
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        logger.info(line)
+        metrics_path = os.environ.get(METRICS_PATH_ENV)
+        if metrics_path:
+            try:
+                with self._lock, open(metrics_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", metrics_path, e)
+        return record
+
+
+PROFILER = Profiler()
+
+
+def profiled_cache(cache_decorator, name=None):
+    """Applies a caching decorator (st.cache_data(...), st.cache_resource) and counts its hits and misses.
+
+    A call whose body runs is a miss; every other call was answered by the cache.
+    """
+    def decorate(func):
+        label = name or func.__name__
+        missed = threading.local()
+
+        @functools.wraps(func)
+        def body(*args, **kwargs):
+            missed.value = True
+            return func(*args, **kwargs)
+        cached = cache_decorator(body)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            missed.value = False
+            with PROFILER.stage(label):
+                result = cached(*args, **kwargs)
+            PROFILER.count_cache(label, missed.value)
+            return result
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorate
@@ -0,0 +1,77 @@
+"""Binary-search range filters over the prepared table.
+
+prepare_tracks stores the table sorted by release_year with missing years
+last, so the rows of any year range form one contiguous slice, located by
+two binary searches. Other numeric columns (popularity, viewCount) keep
+their values sorted alongside the matching row positions, so a value
+range is also a single slice of that order.
+"""
+import numpy as np
+
+from music_data.topk import metric_values
+
+
+class RangeIndex:
+    """Year slices plus sorted value orders for the secondary range columns."""
+
+    def __init__(self, df, range_cols=(), year_col='release_year'):
+        years = metric_values(df[year_col])
+        self.n_rows = len(years)
+        self.n_dated = int((~np.isnan(years)).sum())
+        self.years = years[:self.n_dated]
+        if np.isnan(self.years).any() or (np.diff(self.years) < 0).any():
+            raise ValueError(f"The table is not sorted by '{year_col}' (missing values last).")
+
+        self._sorted_values = {}
+        self._sorted_rows = {}
+        for col in range_cols:
+            if col not in df.columns:
+                continue
+            values = metric_values(df[col])
+            rows = np.flatnonzero(~np.isnan(values))
+            rows = rows[np.argsort(values[rows], kind='stable')]
+            self._sorted_values[col] = values[rows]
+            self._sorted_rows[col] = rows
+
+    def has_column(self, col):
+        return col in self._sorted_rows
+
+    def value_bounds(self, col):
+        """(min, max) of col, or None when it has no values."""
+        values = self._sorted_values[col]
+        return (values[0], values[-1]) if len(values) else None
+
+    def year_slice(self, year_range=None):
+        """Rows of an inclusive year range as a slice; None means every row (undated ones too)."""
+        if year_range is None:
+            return slice(0, self.n_rows)
+        start = int(np.searchsorted(self.years, year_range[0], side='left'))
+        stop = int(np.searchsorted(self.years, year_range[1], side='right'))
+        return slice(start, stop)
+
+    def value_rows(self, col, value_range):
+        """Sorted positions of rows with low <= col <= high (rows missing col are excluded)."""
+        values = self._sorted_values[col]
+        start = np.searchsorted(values, value_range[0], side='left')
+        stop = np.searchsorted(values, value_range[1], side='right')
+        return np.sort(self._sorted_rows[col][start:stop])
+
+    def rows(self, year_range=None, value_ranges=None):
+        """Sorted positions of rows in year_range and every {col: (low, high)} of value_ranges."""
+        year_slice = self.year_slice(year_range)
+        rows = None
+        for col, value_range in (value_ranges or {}).items():
+            if value_range is None:
+                continue
+            col_rows = self.value_rows(col, value_range)
+            col_rows = col_rows[(col_rows >= year_slice.start) & (col_rows < year_slice.stop)]
+            rows = col_rows if rows is None else np.intersect1d(rows, col_rows, assume_unique=True)
+        if rows is None:
+            return np.arange(year_slice.start, year_slice.stop)
+        return rows
+
+    def row_count(self, year_range=None, value_ranges=None):
+        if not value_ranges or all(value_range is None for value_range in value_ranges.values()):
+            year_slice = self.year_slice(year_range)
+            return year_slice.stop - year_slice.start
+        return len(self.rows(year_range, value_ranges))
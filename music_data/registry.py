@@ -0,0 +1,122 @@
+"""Registry of datasets stored as artist / version partitions.
+
+Every dataset lives in its own directory, named the Hive way:
+
+    data/artist=<artist>/version=<version>/tracks.csv
+    data/artist=<artist>/version=<version>/tracks.parquet   (prepared snapshot)
+
+Add one with:
+
+    python -m music_data.registry add final_enriched_tracks_v4.csv --artist 張信哲 --version v4
+
+Partitions are found by listing the directories only; nothing inside a
+partition is read until the dashboard selects it, and every loader is
+keyed by the partition's file, so each one is loaded and cached on its
+own. Without any partition the dashboard falls back to the single CSV in
+the repository root.
+"""
+import argparse
+import os
+import re
+import shutil
+from collections import namedtuple
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+from music_data.snapshot import build_snapshot, snapshot_path_for
+
+# Root of the partitioned datasets (override with MUSIC_DASHBOARD_DATA_DIR)
+DATA_ROOT = Path(os.environ.get('MUSIC_DASHBOARD_DATA_DIR', Path(__file__).resolve().parent.parent / 'data'))
+# Source file of every partition; its snapshot is written next to it
+PARTITION_FILE = 'tracks.csv'
+
+Partition = namedtuple('Partition', ['artist', 'version', 'path'])
+
+
+def partition_dir(artist, version, root=None):
+    """Directory of one artist / version partition (names are %-escaped)."""
+    root = Path(root or DATA_ROOT)
+    return root / f"artist={quote(artist, safe='')}" / f"version={quote(version, safe='')}"
+
+
+def version_sort_key(version):
+    """Orders versions naturally, so v10 comes after v9."""
+    return [(0, int(part), '') if part.isdigit() else (1, 0, part) for part in re.split(r'(\d+)', version) if part]
+
+
+def _partition_value(directory, name):
+    """Unescaped value of a '<name>=<value>' directory, or None."""
+    prefix = f'{name}='
+    if not directory.is_dir() or not directory.name.startswith(prefix):
+        return None
+    return unquote(directory.name[len(prefix):])
+
+
+def list_partitions(root=None):
+    """Every partition with a data file, by artist and then oldest version first."""
+    root = Path(root or DATA_ROOT)
+    if not root.is_dir():
+        return []
+    partitions = []
+    for artist_dir in root.iterdir():
+        artist = _partition_value(artist_dir, 'artist')
+        if artist is None:
+            continue
+        for version_dir in artist_dir.iterdir():
+            version = _partition_value(version_dir, 'version')
+            path = version_dir / PARTITION_FILE
+            # A deployment may ship only the snapshot
+            if version is not None and (path.exists() or snapshot_path_for(path).exists()):
+                partitions.append(Partition(artist, version, path))
+    return sorted(partitions, key=lambda p: (p.artist, version_sort_key(p.version)))
+
+
+def add_partition(csv_path, artist, version, root=None, snapshot=True):
+    """Copies csv_path into the artist / version partition and compiles its snapshot."""
+    directory = partition_dir(artist, version, root)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / PARTITION_FILE
+    shutil.copy2(csv_path, path)
+    if snapshot:
+        build_snapshot(path)
+    return Partition(artist, version, path)
+
+
+def remove_partition(artist, version, root=None):
+    """Deletes a partition. Returns False when it did not exist."""
+    directory = partition_dir(artist, version, root)
+    if not directory.is_dir():
+        return False
+    shutil.rmtree(directory)
+    if not any(directory.parent.iterdir()):
+        directory.parent.rmdir()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the artist / version dataset partitions.")
+    parser.add_argument('--root', help=f"Partition root (defaults to {DATA_ROOT})")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="List the registered partitions")
+    add = commands.add_parser('add', help="Register a CSV as a partition")
+    add.add_argument('csv_path')
+    add.add_argument('--artist', required=True)
+    add.add_argument('--version', required=True)
+    add.add_argument('--no-snapshot', action='store_true', help="Skip compiling the Parquet snapshot")
+    remove = commands.add_parser('remove', help="Delete a partition")
+    remove.add_argument('--artist', required=True)
+    remove.add_argument('--version', required=True)
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        for partition in list_partitions(args.root):
+            print(f"{partition.artist}\t{partition.version}\t{partition.path}")
+    elif args.command == 'add':
+        partition = add_partition(args.csv_path, args.artist, args.version, args.root, snapshot=not args.no_snapshot)
+        print(f"Registered {partition.artist} {partition.version} at {partition.path}")
+    elif not remove_partition(args.artist, args.version, args.root):
+        parser.exit(1, f"No partition for {args.artist} {args.version}\n")
+
+
+if __name__ == '__main__':
+    main()
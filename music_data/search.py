@@ -0,0 +1,124 @@
+"""Ranked full-text search over track metadata and jieba-segmented lyrics.
+
+Every searchable field gets its own TermIndex; a query is segmented the
+same way and scored with BM25 per field, weighted by field and summed.
+Each query term also matches vocabulary terms it is a prefix of (found by
+binary search over the sorted vocabulary), at a reduced weight, so partial
+input such as "寂" still finds "寂寞".
+"""
+import numpy as np
+import pandas as pd
+
+from music_data.artifacts import data_fingerprint, load_or_build
+from music_data.lyrics import TOKENIZER_VERSION, TermIndex, concat_ranges, tokenize, tokenize_texts
+
+# Searchable columns and how much a match in each counts
+FIELD_WEIGHTS = {
+    'track_name': 3.0,
+    'consolidated_album_title': 2.0,
+    '作詞': 1.5,
+    '作曲': 1.5,
+    '編曲': 1.5,
+    'tags': 1.0,
+    'lyrics_text': 1.0,
+}
+# Weight of a prefix-only match relative to an exact term match
+PREFIX_WEIGHT = 0.5
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Bump whenever the index layout or scoring inputs change
+SEARCH_VERSION = 2
+
+
+def display_names(df):
+    """'track - artist' label for every row."""
+    if 'artist_credit_name' in df.columns:
+        return (df['track_name'].astype('object').fillna('') + ' - ' + df['artist_credit_name'].astype('object').fillna('Unknown Artist')).to_numpy()
+    return df['track_name'].astype('object').fillna('').to_numpy()
+
+
+class FieldIndex:
+    """BM25 statistics and a sorted vocabulary for one field."""
+
+    def __init__(self, term_index, weight):
+        self.terms = term_index
+        self.weight = weight
+        lengths = term_index.word_count.astype(np.float64)
+        avg_length = lengths[lengths > 0].mean() if (lengths > 0).any() else 1.0
+        self.length_norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / avg_length)
+        n_docs = max(int(term_index.has_text.sum()), 1)
+        doc_freq = term_index.doc_freq.astype(np.float64)
+        self.idf = np.log(1 + (n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        self.sorted_order = np.argsort(term_index.vocabulary.astype(str), kind='stable')
+        self.sorted_vocabulary = term_index.vocabulary[self.sorted_order].astype(str)
+
+    def expand(self, token):
+        """(term ids, match weights): the exact term plus every term it prefixes."""
+        start = np.searchsorted(self.sorted_vocabulary, token, side='left')
+        stop = np.searchsorted(self.sorted_vocabulary, token + '\uffff', side='right')
+        term_ids = self.sorted_order[start:stop]
+        weights = np.where(self.sorted_vocabulary[start:stop] == token, 1.0, PREFIX_WEIGHT)
+        return term_ids, weights
+
+    def score(self, tokens, scores):
+        """Adds this field's weighted BM25 score for tokens into scores."""
+        terms = self.terms
+        for token in tokens:
+            term_ids, match_weights = self.expand(token)
+            if len(term_ids) == 0:
+                continue
+            starts, stops = terms.term_offsets[term_ids], terms.term_offsets[term_ids + 1]
+            positions = concat_ranges(starts, stops)
+            rows = terms.term_docs[positions]
+            tf = terms.term_tf[positions].astype(np.float64)
+            term_weight = np.repeat(self.idf[term_ids] * match_weights, stops - starts)
+            contribution = term_weight * tf * (BM25_K1 + 1) / (tf + self.length_norm[rows])
+            scores += self.weight * np.bincount(rows, weights=contribution, minlength=len(scores))
+
+
+class SearchIndex:
+    """Per-field inverted indexes plus display labels for every row."""
+
+    def __init__(self, df, field_weights=FIELD_WEIGHTS):
+        self.labels = display_names(df)
+        self.fields = {}
+        for col, weight in field_weights.items():
+            if col in df.columns:
+                texts = df[col].astype('object')
+                self.fields[col] = FieldIndex(TermIndex(tokenize_texts(texts)), weight)
+        # Row positions sorted by label, for browsing without a query, and each row's place in that order
+        self.sorted_rows = np.argsort(self.labels.astype(str), kind='stable')
+        self.label_rank = np.empty_like(self.sorted_rows)
+        self.label_rank[self.sorted_rows] = np.arange(len(self.sorted_rows))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, query, page=1, per_page=20):
+        """One page of results for query as (rows, scores, total matches), best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        scores = np.zeros(len(self), dtype=np.float64)
+        for field in self.fields.values():
+            field.score(tokens, scores)
+
+        matches = np.flatnonzero(scores > 0)
+        # Highest score first, ties by label so results are stable between reruns
+        order = matches[np.lexsort((self.labels[matches].astype(str), -scores[matches]))]
+        start = (page - 1) * per_page
+        rows = order[start:start + per_page]
+        return rows, scores[rows], len(order)
+
+    def results_frame(self, df, rows, scores, columns=('consolidated_album_title', 'release_year')):
+        """Display table for one page of results."""
+        results = pd.DataFrame({'Track': self.labels[rows], 'Score': np.round(scores, 2)})
+        for col in columns:
+            if col in df.columns:
+                results[col] = df[col].iloc[rows].to_numpy()
+        return results
+
+
+def build_search_index(df):
+    """SearchIndex for df, persisted per content of the searchable columns."""
+    cols = [col for col in list(FIELD_WEIGHTS) + ['artist_credit_name'] if col in df.columns]
+    key = data_fingerprint(df[cols].astype('object'), FIELD_WEIGHTS, TOKENIZER_VERSION, SEARCH_VERSION)
+    return load_or_build('search_index', key, lambda: SearchIndex(df))
@@ -0,0 +1,341 @@
+"""Similar-song recommendations from a precomputed nearest-neighbour table.
+
+Every track is described by feature blocks: audio (tuning, bpm and the
+danceability, timbre and mood_* labels), musical key, genre, theme,
+the lyrics and the AI theme/sentiment notes. Numeric features are
+standardized, categories one-hot encoded, and texts turned into TF-IDF
+vectors hashed to a fixed width. Each block is L2-normalized, so within a
+block two tracks compare by cosine.
+
+Audio features exist for a small share of the catalogue only, so missing
+blocks are neither imputed nor compared: the similarity of a track to
+another is the weighted sum of the cosines of the blocks both have,
+divided by the weight of every block the first track has. A candidate
+lacking some of the track's features thus ranks below one that matches
+on all of them, and pairs sharing less than MIN_SHARED_WEIGHT are not
+compared at all. Both sums are matrix products, computed a block of query
+rows at a time, so the exact top NEIGHBOURS of every track are found
+without ever holding the full n x n matrix; blocks shrink as the catalogue
+grows so their scratch arrays stay within BLOCK_BYTES. That search is
+O(n^2), so above EXACT_MAX_ROWS tracks an inverted file narrows each
+track's candidates to a few clusters of similar ones before the same
+exact scoring (approximate_neighbours). The table is built once per
+dataset version and persisted; a query is a row lookup.
+"""
+import numpy as np
+import pandas as pd
+
+from music_data.artifacts import data_fingerprint, load_or_build
+from music_data.lyrics import TermIndex, tokenize_texts
+
+# Bump whenever the features, weights or scoring change
+SIMILARITY_VERSION = 3
+# Standardized numeric audio features
+AUDIO_COLS = ['tuning_frequency', 'bpm']
+# Two-valued audio labels, +1 for the given label and -1 for the other (the mood_* columns also count)
+AUDIO_LABELS = {'danceability': 'danceable', 'timbre': 'bright'}
+# One-hot blocks: block -> columns ('|'-joined values count for each part)
+CATEGORY_BLOCKS = {
+    'key': ['combined_key'],
+    'genre': ['genre_ros'],
+    'theme': ['super_theme'],
+}
+# Free-text AI notes compared as a text block
+AI_TEXT_COLS = ['ai_theme', 'ai_sentiment']
+# Relative weight of every block in the combined similarity
+BLOCK_WEIGHTS = {
+    'audio': 1.0,
+    'key': 0.5,
+    'genre': 0.5,
+    'theme': 1.0,
+    'lyrics': 1.5,
+    'ai_text': 1.0,
+}
+# Width of the hashed TF-IDF vectors
+TEXT_DIMS = 256
+# Pairs must share at least this much block weight to be compared
+MIN_SHARED_WEIGHT = 1.0
+# Neighbours stored per track
+NEIGHBOURS = 20
+# Query rows per block of the exact search, at most
+BLOCK_SIZE = 1024
+# Scratch memory of one block, about BYTES_PER_PAIR per query row and candidate
+BLOCK_BYTES = 256 * 2 ** 20
+BYTES_PER_PAIR = 24
+# Larger tables are searched approximately (approximate_neighbours), the exact search being O(n^2)
+EXACT_MAX_ROWS = 10_000
+# Inverted lists each row is filed under, and spherical k-means rounds and sample rows per list
+PROBES = 8
+KMEANS_ITERATIONS = 5
+KMEANS_SAMPLE = 40
+
+
+def standardize(values):
+    """Z-scores of the columns of values (each with at least one value), missing entries at 0 (the mean)."""
+    std = np.nanstd(values, axis=0)
+    z = (values - np.nanmean(values, axis=0)) / np.where(std > 0, std, 1)
+    return np.nan_to_num(z, nan=0.0)
+
+
+def audio_block(df):
+    """(features, present) of the audio block: standardized numbers plus +-1 labels."""
+    columns = []
+    for col in AUDIO_COLS:
+        if col in df.columns:
+            columns.append(pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan))
+    n_numeric = len(columns)
+    labels = {col: label for col, label in AUDIO_LABELS.items() if col in df.columns}
+    labels.update({col: col[len('mood_'):] for col in sorted(df.columns) if col.startswith('mood_')})
+    for col, label in labels.items():
+        # 1 when the label is positive (e.g. 'sad' for mood_sad), -1 when negative
+        values = df[col].astype('object')
+        columns.append(np.where(values.isna(), np.nan, np.where(values == label, 1.0, -1.0)))
+    if not columns:
+        return None
+    columns = np.column_stack(columns)
+    has_values = ~np.isnan(columns).all(axis=0)
+    present = ~np.isnan(columns).all(axis=1)
+    numeric = columns[:, :n_numeric][:, has_values[:n_numeric]]
+    label_values = np.nan_to_num(columns[:, n_numeric:][:, has_values[n_numeric:]], nan=0.0)
+    return np.hstack([standardize(numeric), label_values]), present
+
+
+def category_block(df, cols):
+    """(multi-hot features, present) of categorical columns."""
+    cols = [col for col in cols if col in df.columns]
+    if not cols:
+        return None
+    parts = []
+    for col in cols:
+        values = df[col].astype('object').str.split('|').explode().str.strip()
+        dummies = pd.get_dummies(values[values.str.len() > 0], prefix=col, dtype=np.float64)
+        parts.append(dummies.groupby(level=0).max().reindex(df.index, fill_value=0.0))
+    features = pd.concat(parts, axis=1).to_numpy(dtype=np.float64)
+    return features, features.any(axis=1)
+
+
+def hashed_tfidf(term_index, dims=TEXT_DIMS, seed=0):
+    """(TF-IDF vectors hashed to dims columns with random signs, present) of a TermIndex."""
+    n_rows = len(term_index)
+    rng = np.random.default_rng(seed)
+    buckets = rng.integers(0, dims, len(term_index.vocabulary))
+    signs = rng.choice([-1.0, 1.0], len(term_index.vocabulary))
+    idf = np.log((1 + n_rows) / (1 + term_index.doc_freq)) + 1
+    rows = np.repeat(np.arange(n_rows), np.diff(term_index.doc_offsets))
+    terms = term_index.doc_terms
+    features = np.zeros((n_rows, dims))
+    np.add.at(features, (rows, buckets[terms]), signs[terms] * term_index.doc_tf * idf[terms])
+    return features, term_index.unique_terms > 0
+
+
+def feature_blocks(df, lyrics_index=None):
+    """{block: (features, present)} for every block the table has data for."""
+    blocks = {'audio': audio_block(df)}
+    for block, cols in CATEGORY_BLOCKS.items():
+        blocks[block] = category_block(df, cols)
+    if lyrics_index is not None:
+        blocks['lyrics'] = hashed_tfidf(lyrics_index)
+    ai_cols = [col for col in AI_TEXT_COLS if col in df.columns]
+    if ai_cols:
+        # Non-missing notes of each row, space-joined
+        values = df[ai_cols].astype('object').set_axis(np.arange(len(df))).stack(future_stack=True).dropna()
+        notes = values.astype(str).groupby(level=0).agg(' '.join).reindex(np.arange(len(df))).set_axis(df.index)
+        blocks['ai_text'] = hashed_tfidf(TermIndex(tokenize_texts(notes.where(notes.str.len() > 0))))
+    return {block: value for block, value in blocks.items() if value is not None and value[1].any()}
+
+
+def search_block_size(n_rows, max_rows=BLOCK_SIZE, max_bytes=BLOCK_BYTES):
+    """Query rows per block of the exact search over n_rows candidates."""
+    return int(max(1, min(max_rows, max_bytes // (BYTES_PER_PAIR * max(n_rows, 1)))))
+
+
+def rank_candidates(query_features, query_weighted, query_positions, features, present, k, min_shared):
+    """Top-k of some query rows among candidate rows by the shared-block weighted cosine.
+
+    query_positions are the queries' own rows among the candidates, which
+    are never their own neighbours. Returns (candidate positions, scores) of
+    shape (queries, k); -1 / NaN pad rows with fewer comparable candidates.
+    """
+    n_queries = len(query_features)
+    positions = np.full((n_queries, k), -1, dtype=np.int64)
+    scores = np.full((n_queries, k), np.nan, dtype=np.float32)
+    k_found = min(k, len(features) - 1)
+    if k_found <= 0:
+        return positions, scores
+    own = query_weighted.sum(axis=1, keepdims=True)
+    # Negated in place, so the block holds one similarity matrix besides the shared weights
+    distance = query_features @ features.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        distance /= -own
+    distance[(query_weighted @ present.T) < min_shared] = np.inf
+    distance[np.arange(n_queries), query_positions] = np.inf
+    top = np.argpartition(distance, k_found - 1, axis=1)[:, :k_found]
+    top_scores = np.take_along_axis(distance, top, axis=1)
+    order = np.argsort(top_scores, axis=1, kind='stable')
+    top, top_scores = np.take_along_axis(top, order, axis=1), -np.take_along_axis(top_scores, order, axis=1)
+    valid = np.isfinite(top_scores)
+    positions[:, :k_found] = np.where(valid, top, -1)
+    scores[:, :k_found] = np.where(valid, top_scores, np.nan)
+    return positions, scores
+
+
+def top_neighbours(features, weights, present, k, min_shared=MIN_SHARED_WEIGHT, block_size=None):
+    """Exact top-k of every row by the shared-block weighted cosine, block_size rows at a time.
+
+    features are the block-normalized vectors scaled by the block weights,
+    so features @ features.T is the weighted sum of the shared blocks'
+    cosines; it is divided by the weight of the query row's own blocks.
+    Returns (neighbours, scores) of shape (n, k); -1 / NaN pad rows with
+    fewer comparable tracks. block_size defaults to search_block_size(n).
+    """
+    n_rows = len(features)
+    block_size = block_size or search_block_size(n_rows)
+    k = min(k, max(n_rows - 1, 0))
+    neighbours = np.full((n_rows, k), -1, dtype=np.int64)
+    scores = np.full((n_rows, k), np.nan, dtype=np.float32)
+    weighted_present = present * weights
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        neighbours[start:stop], scores[start:stop] = rank_candidates(
+            features[start:stop], weighted_present[start:stop], np.arange(start, stop), features, present, k, min_shared
+        )
+    return neighbours, scores
+
+
+def unit_rows(values):
+    """values with every non-zero row scaled to length 1."""
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return values / np.where(norms > 0, norms, 1)
+
+
+def nearest_lists(vectors, centroids, n):
+    """The n centroids with the highest dot product with each row, best first."""
+    lists = np.empty((len(vectors), n), dtype=np.int64)
+    block_size = search_block_size(len(centroids))
+    for start in range(0, len(vectors), block_size):
+        similarity = vectors[start:start + block_size] @ centroids.T
+        top = np.argpartition(-similarity, n - 1, axis=1)[:, :n]
+        order = np.argsort(-np.take_along_axis(similarity, top, axis=1), axis=1, kind='stable')
+        lists[start:start + block_size] = np.take_along_axis(top, order, axis=1)
+    return lists
+
+
+def train_centroids(vectors, n_lists, rng, iterations=KMEANS_ITERATIONS, sample_per_list=KMEANS_SAMPLE):
+    """n_lists unit centroids from spherical k-means on a sample of the (unit) rows."""
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), n_lists * sample_per_list), replace=False)]
+    centroids = sample[:n_lists].copy()
+    for _ in range(iterations):
+        labels = nearest_lists(sample, centroids, 1)[:, 0]
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        filled = np.bincount(labels, minlength=n_lists) > 0
+        centroids[filled] = unit_rows(sums[filled]) # Empty lists keep their centroid
+    return centroids
+
+
+def grouped_rows(lists, n_lists):
+    """(rows, offsets): the rows filed under each list, ascending, list i at rows[offsets[i]:offsets[i + 1]]."""
+    flat = lists.ravel()
+    rows = np.repeat(np.arange(len(lists)), lists.shape[1])[np.argsort(flat, kind='stable')]
+    return rows, np.concatenate([[0], np.cumsum(np.bincount(flat, minlength=n_lists))])
+
+
+def approximate_neighbours(features, weights, present, k, min_shared=MIN_SHARED_WEIGHT, probes=PROBES, seed=0):
+    """Top-k of every row like top_neighbours, searching an inverted file instead of every row.
+
+    Rows whose blocks weigh less than min_shared can share no more than
+    that with anyone and are left out. The others are clustered into about
+    sqrt(n) lists by spherical k-means and filed under their `probes`
+    nearest lists; each row is compared exactly with the rows filed under
+    its nearest list only. A true neighbour is missed when the two rows
+    share none of those lists, so the scores are exact but a few of the
+    neighbours may not be.
+    """
+    n_rows = len(features)
+    k = min(k, max(n_rows - 1, 0))
+    neighbours = np.full((n_rows, k), -1, dtype=np.int64)
+    scores = np.full((n_rows, k), np.nan, dtype=np.float32)
+    weighted_present = present * weights
+    comparable = np.flatnonzero(weighted_present.sum(axis=1) >= min_shared)
+    if k == 0 or len(comparable) < 2:
+        return neighbours, scores
+    features, present, weighted_present = features[comparable], present[comparable], weighted_present[comparable]
+
+    vectors = unit_rows(features)
+    n_lists = max(1, int(np.sqrt(len(comparable))))
+    lists = nearest_lists(vectors, train_centroids(vectors, n_lists, np.random.default_rng(seed)), min(probes, n_lists))
+    del vectors
+    candidates, candidate_offsets = grouped_rows(lists, n_lists)
+    queries, query_offsets = grouped_rows(lists[:, :1], n_lists)
+    for i in range(n_lists):
+        list_queries = queries[query_offsets[i]:query_offsets[i + 1]]
+        list_candidates = candidates[candidate_offsets[i]:candidate_offsets[i + 1]]
+        if len(list_queries) == 0:
+            continue
+        # A row's nearest list is one of its probes, so it is among the candidates
+        query_positions = np.searchsorted(list_candidates, list_queries)
+        list_features, list_present = features[list_candidates], present[list_candidates]
+        block_size = search_block_size(len(list_candidates))
+        for start in range(0, len(list_queries), block_size):
+            block = list_queries[start:start + block_size]
+            positions, block_scores = rank_candidates(
+                features[block], weighted_present[block], query_positions[start:start + block_size],
+                list_features, list_present, k, min_shared
+            )
+            rows = comparable[block]
+            neighbours[rows] = np.where(positions >= 0, comparable[list_candidates[positions]], -1)
+            scores[rows] = block_scores
+    return neighbours, scores
+
+
+class SimilarityIndex:
+    """The NEIGHBOURS most similar tracks of every row, with their scores (approximate unless exact)."""
+
+    def __init__(self, df, lyrics_index=None, weights=BLOCK_WEIGHTS, n_neighbours=NEIGHBOURS):
+        blocks = feature_blocks(df, lyrics_index)
+        self.blocks = [block for block in blocks if block in weights]
+        self.coverage = {block: int(blocks[block][1].sum()) for block in self.blocks}
+        self.exact = len(df) <= EXACT_MAX_ROWS
+        if not self.blocks:
+            self._present = np.zeros((len(df), 0), dtype=bool)
+            self.neighbours = np.full((len(df), 0), -1, dtype=np.int64)
+            self.scores = np.full((len(df), 0), np.nan, dtype=np.float32)
+            return
+
+        vectors = []
+        for block in self.blocks:
+            features, present = blocks[block]
+            norms = np.linalg.norm(features, axis=1, keepdims=True)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                unit = np.where((norms > 0) & present[:, None], features / norms, 0.0)
+            vectors.append(unit * np.sqrt(weights[block]))
+        features = np.hstack(vectors).astype(np.float32)
+        self._present = np.column_stack([blocks[block][1] for block in self.blocks])
+        block_weights = np.array([weights[block] for block in self.blocks], dtype=np.float32)
+        search = top_neighbours if self.exact else approximate_neighbours
+        self.neighbours, self.scores = search(features, block_weights, self._present.astype(np.float32), n_neighbours)
+
+    def __len__(self):
+        return len(self.neighbours)
+
+    def blocks_of(self, row):
+        """Feature blocks row has data for."""
+        return [block for block, present in zip(self.blocks, self._present[row]) if present]
+
+    def similar(self, row, k=10):
+        """(rows, scores) of the k tracks most similar to row, best first (fewer when few are comparable)."""
+        neighbours = self.neighbours[row, :k]
+        valid = neighbours >= 0
+        return neighbours[valid], self.scores[row, :k][valid]
+
+
+def build_similarity_index(df, lyrics_index=None):
+    """SimilarityIndex for df, persisted per content of the feature columns and lyrics."""
+    cols = [
+        col for col in df.columns
+        if col in AUDIO_COLS or col in AUDIO_LABELS or col.startswith('mood_') or col in AI_TEXT_COLS
+    ]
+    cols += [col for block_cols in CATEGORY_BLOCKS.values() for col in block_cols if col in df.columns]
+    lyrics = () if lyrics_index is None else (lyrics_index.doc_offsets, lyrics_index.doc_terms, lyrics_index.doc_tf)
+    key = data_fingerprint(df[cols].astype('object'), *lyrics, SIMILARITY_VERSION, BLOCK_WEIGHTS, NEIGHBOURS)
+    return load_or_build('similarity_index', key, lambda: SimilarityIndex(df, lyrics_index))
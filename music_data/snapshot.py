@@ -0,0 +1,126 @@
+"""Typed columnar (Parquet) snapshot of the prepared tracks table.
+
+Build it ahead of time with:
+
+    python -m music_data.snapshot final_enriched_tracks_v3.csv
+
+(the dev container's updateContentCommand runs this, so new containers
+start from the snapshot).
+
+The snapshot embeds a fingerprint of the CSV it was compiled from, so the
+dashboard only trusts it while the CSV is unchanged.
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from music_data.cleaning import CLEANING_VERSION, prepare_tracks
+from music_data.text_store import ROW_GROUP_SIZE
+
+# Bump whenever the snapshot layout itself changes
+SNAPSHOT_VERSION = 2
+METADATA_KEY = b'music_data.snapshot'
+
+
+def snapshot_path_for(csv_path):
+    """Returns the default snapshot location next to the CSV."""
+    return Path(csv_path).with_suffix('.parquet')
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(csv_path):
+    """Size, mtime and content hash of the source CSV."""
+    stat = os.stat(csv_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': file_sha256(csv_path),
+    }
+
+
+def read_snapshot_metadata(snapshot_path):
+    """Reads the embedded metadata from the Parquet footer (no row data)."""
+    metadata = pq.read_schema(snapshot_path).metadata or {}
+    if METADATA_KEY not in metadata:
+        return None
+    return json.loads(metadata[METADATA_KEY])
+
+
+def write_snapshot(df, csv_path, snapshot_path=None):
+    """Writes an already prepared frame as the snapshot for csv_path."""
+    snapshot_path = Path(snapshot_path or snapshot_path_for(csv_path))
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({
+        'version': SNAPSHOT_VERSION,
+        'cleaning_version': CLEANING_VERSION,
+        'source': source_fingerprint(csv_path),
+    }).encode('utf-8')
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temporary file first so readers never see a half-written snapshot
+    tmp_path = snapshot_path.with_name(snapshot_path.name + '.tmp')
+    # Small row groups let the text store read one track's text without the whole column
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def build_snapshot(csv_path, snapshot_path=None):
+    """Compiles the CSV into a prepared, typed snapshot."""
+    df = prepare_tracks(pd.read_csv(csv_path), csv_path)
+    return write_snapshot(df, csv_path, snapshot_path)
+
+
+def snapshot_is_fresh(csv_path, snapshot_path=None):
+    """True when the snapshot exists and was built from the current CSV."""
+    snapshot_path = Path(snapshot_path or snapshot_path_for(csv_path))
+    if not snapshot_path.exists():
+        return False
+    try:
+        metadata = read_snapshot_metadata(snapshot_path)
+    except (OSError, pa.ArrowInvalid):
+        return False
+    if not metadata or metadata.get('version') != SNAPSHOT_VERSION:
+        return False
+    if metadata.get('cleaning_version') != CLEANING_VERSION:
+        return False
+    if not os.path.exists(csv_path):
+        # Deployments may ship the snapshot without the CSV
+        return True
+
+    source = metadata['source']
+    stat = os.stat(csv_path)
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns == source['mtime_ns']:
+        return True
+    # A fresh checkout resets mtimes, so fall back to comparing content
+    return file_sha256(csv_path) == source['sha256']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the enriched tracks CSV into a Parquet snapshot.")
+    parser.add_argument('csv_path')
+    parser.add_argument('-o', '--output', help="Snapshot path (defaults to the CSV name with .parquet)")
+    args = parser.parse_args()
+
+    path = build_snapshot(args.csv_path, args.output)
+    print(f"Wrote snapshot to {path}")
+
+
+if __name__ == '__main__':
+    main()
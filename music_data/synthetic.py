@@ -0,0 +1,240 @@
+"""Synthetic catalogues shaped like final_enriched_tracks_v3.csv, for benchmarks.
+
+    python -m music_data.synthetic 100000 -o /tmp/tracks_100k.csv
+
+Every column of the real file is generated, with about its share of
+missing values and its kind of content: multiline Chinese lyrics and
+YouTube descriptions, ' | '-joined album titles and merged-row counts
+('1728785.0 | 45591.0', which cleaning turns into NaN), low-cardinality
+categories (moods, genre, key, super theme) and near-unique AI theme,
+sentiment and notes texts. Values are drawn with numpy from a seeded
+generator, so a (rows, seed) pair always gives the same table.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Bump whenever the generated table changes, so cached benchmark inputs are rebuilt
+SYNTHETIC_VERSION = 1
+# Columns of final_enriched_tracks_v3.csv, in file order
+COLUMNS = [
+    'song_cluster_id', 'grouping_key', 'mood_party', 'mood_aggressive', 'mood_happy', 'mood_sad', 'mood_relaxed',
+    'genre_ros', 'timbre', 'bpm', 'danceability', 'submission_offset', 'tuning_frequency',
+    'tuning_equal_tempered_deviation', 'lyrics_text', '作詞', '作曲', '製作', '編曲', 'track_name', 'duration_ms',
+    'artist_credit', 'album_title', 'release_date', 'release_group_mbid', 'release_group_mbid.1', 'ai_theme',
+    'ai_sentiment', 'ai_notes', 'recording_mbid', 'recording_mbid.1', 'super_theme', 'recording_duration_ms',
+    'artist_credit_name', 'isrcs', 'release_mbids', 'work_titles', 'work_mbids', 'videoId', 'url', 'viewCount',
+    'likeCount', 'commentCount', 'publishedAt', 'description', 'tags', 'categoryId', 'yt_duration', 'track_id',
+    'popularity', 'normalized_key', 'combined_key', 'consolidated_album_title', 'release_year',
+]
+# Share of rows with a value, as in the real file
+AUDIO_SHARE = 0.19
+LYRICS_SHARE = 0.24
+RECORDING_SHARE = 0.76
+YOUTUBE_SHARE = 0.55
+SPOTIFY_SHARE = 0.49
+RELEASE_YEAR_SHARE = 0.64
+ALBUM_SHARE = 0.89
+# Share of rows with a value that are merged rows (' | '-joined ids and values)
+MERGED_SHARE = 0.18
+
+CHARACTERS = (
+    '我你他她們的是在不了有人這來到時大地為子中說生國年著就那和要出也得裡後自以會家可下而過天去能對小多然於心學麼之都好'
+    '看起發當沒成只如事把還用第樣道想作種開美總從無情己面最女但現前些所同日手又行意動方期它頭經長兒回位分愛老因很給名法'
+    '間斯知世什兩次使身者被高已親其進此話常與活正感見明問力理爾點文幾定本公特做外孩相西果走將月十實向聲車全信重三機工物氣'
+    '每並別真打太新比才便夫再書部水像眼等體卻加電主界門利海受聽表德少克代員許稜先口由死安寫性馬光白或住難望教命花結樂色'
+    '夢淚風雨夜路星雲海河山城春秋冬夏溫柔寂寞思念等待擁抱離開回憶永遠燈火黃昏歲月'
+)
+MOODS = ['party', 'aggressive', 'happy', 'sad', 'relaxed']
+GENRES = ['pop', 'rhy', 'roc', 'cla']
+KEYS = [f'{note} {scale}' for note in ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'] for scale in ['major', 'minor']]
+SUPER_THEMES = [
+    'Love_Longing', 'Heartbreak_Loss', 'Internal_Conflict_Pain', 'Hope_Healing', 'Nostalgia_Memory',
+    'Life_Reflection', 'Devotion_Commitment',
+]
+ARTISTS = ['張信哲'] + [f'張信哲 & 歌手{i}' for i in range(35)]
+
+
+def chinese_words(rng, n_words, length=2):
+    """n_words random words of length characters."""
+    picks = rng.integers(0, len(CHARACTERS), (n_words, length))
+    alphabet = np.array(list(CHARACTERS))
+    return [''.join(word) for word in alphabet[picks]]
+
+
+def lyrics_texts(rng, n_texts, vocabulary, lines=(8, 20), words_per_line=(3, 7)):
+    """Multiline texts of random words from vocabulary."""
+    n_lines = rng.integers(*lines, n_texts)
+    line_lengths = rng.integers(*words_per_line, int(n_lines.sum()))
+    words = np.asarray(vocabulary, dtype=object)[rng.integers(0, len(vocabulary), int(line_lengths.sum()))]
+    text_lines = [''.join(part) for part in np.split(words, np.cumsum(line_lengths)[:-1])]
+    line_offsets = np.concatenate([[0], np.cumsum(n_lines)])
+    return ['\n'.join(text_lines[line_offsets[i]:line_offsets[i + 1]]) for i in range(n_texts)]
+
+
+def hex_ids(rng, n_ids, length=32):
+    """Random lowercase hex strings."""
+    alphabet = np.array(list('0123456789abcdef'))
+    return [''.join(chars) for chars in alphabet[rng.integers(0, 16, (n_ids, length))]]
+
+
+def uuids(rng, n_ids):
+    return [f'{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}' for h in hex_ids(rng, n_ids)]
+
+
+def with_missing(rng, values, share):
+    """Object array of values with about 1 - share of them set to None."""
+    values = np.asarray(values, dtype=object)
+    values[rng.random(len(values)) >= share] = None
+    return values
+
+
+def counts(rng, n_rows, mean_log, merged):
+    """Nullable count texts: integers, or ' | '-joined floats on merged rows."""
+    first = np.floor(rng.lognormal(mean_log, 2.0, n_rows)).astype(np.int64)
+    second = np.floor(rng.lognormal(mean_log, 2.0, n_rows)).astype(np.int64)
+    return np.array(
+        [f'{a}.0 | {b}.0' if is_merged else str(a) for a, b, is_merged in zip(first, second, merged)], dtype=object
+    )
+
+
+def pick(rng, options, n_rows):
+    return np.asarray(options, dtype=object)[rng.integers(0, len(options), n_rows)]
+
+
+def synthetic_catalogue(n_rows, seed=0):
+    """DataFrame of n_rows made-up tracks with the columns of the real CSV, as raw strings and numbers."""
+    rng = np.random.default_rng(seed)
+    vocabulary = chinese_words(rng, 4000) + chinese_words(rng, 1000, 1) + chinese_words(rng, 1000, 3)
+    columns = {}
+    ids = np.arange(n_rows)
+    # Titles are a few words plus the row number, so they stay unique at any size
+    titles = np.array([f'{words}{i}' for i, words in zip(ids, pick(rng, vocabulary, n_rows))], dtype=object)
+
+    columns['song_cluster_id'] = ids
+    columns['grouping_key'] = np.array([f'{t} | {t}' for t in titles], dtype=object)
+    has_audio = rng.random(n_rows) < AUDIO_SHARE
+    for mood in MOODS:
+        columns[f'mood_{mood}'] = np.where(has_audio, np.where(rng.random(n_rows) < 0.3, mood, f'not_{mood}'), None)
+    columns['genre_ros'] = np.where(has_audio, pick(rng, GENRES, n_rows), None)
+    columns['timbre'] = np.where(has_audio, pick(rng, ['dark', 'bright'], n_rows), None)
+    columns['bpm'] = np.full(n_rows, np.nan)
+    columns['danceability'] = np.where(has_audio, pick(rng, ['danceable', 'not_danceable'], n_rows), None)
+    columns['submission_offset'] = np.where(has_audio, 0.0, np.nan)
+    columns['tuning_frequency'] = np.where(has_audio, rng.normal(440, 3, n_rows).round(4), np.nan)
+    columns['tuning_equal_tempered_deviation'] = np.where(has_audio, rng.random(n_rows) / 10, np.nan)
+
+    has_lyrics = rng.random(n_rows) < LYRICS_SHARE
+    n_lyrics = int(has_lyrics.sum())
+    lyrics = np.full(n_rows, None, dtype=object)
+    lyrics[has_lyrics] = lyrics_texts(rng, n_lyrics, vocabulary)
+    columns['lyrics_text'] = lyrics
+    lyricists = np.array([f'{name} \xa0\xa0\xa0 作曲：{name}' for name in chinese_words(rng, 200, 3)], dtype=object)
+    columns['作詞'] = with_missing(rng, pick(rng, lyricists, n_rows), 0.21)
+    columns['作曲'] = with_missing(rng, pick(rng, chinese_words(rng, 100, 3), n_rows), 0.04)
+    columns['製作'] = with_missing(rng, pick(rng, chinese_words(rng, 20, 3), n_rows), 0.01)
+    columns['編曲'] = with_missing(rng, pick(rng, chinese_words(rng, 20, 3), n_rows), 0.01)
+    columns['track_name'] = titles
+
+    has_recording = rng.random(n_rows) < RECORDING_SHARE
+    durations = rng.integers(150_000, 330_000, (2, n_rows))
+    merged_recording = rng.random(n_rows) < MERGED_SHARE
+    columns['duration_ms'] = np.where(
+        has_recording & (rng.random(n_rows) < 0.8),
+        [f'{a} | {b}' if is_merged else str(a) for a, b, is_merged in zip(durations[0], durations[1], merged_recording)],
+        None
+    )
+    columns['artist_credit'] = np.where(has_recording, '張信哲', None)
+
+    # About one album per seven tracks; some rows list the album twice (a reissue)
+    n_albums = max(n_rows // 7, 1)
+    album_names = np.array(chinese_words(rng, n_albums, 4), dtype=object)
+    album = rng.integers(0, n_albums, n_rows)
+    has_album = rng.random(n_rows) < ALBUM_SHARE
+    reissue = rng.random(n_rows) < 0.3
+    columns['album_title'] = np.where(
+        has_album,
+        [f'{name} | {name} (原聲帶)' if twice else name for name, twice in zip(album_names[album], reissue)],
+        None
+    )
+    album_years = rng.integers(1984, 2025, n_albums)
+    has_year = has_album & (rng.random(n_rows) < RELEASE_YEAR_SHARE / ALBUM_SHARE)
+    columns['release_date'] = np.where(has_year & (rng.random(n_rows) < 0.25), [f'{year}-10-01' for year in album_years[album]], None)
+    album_mbids = np.array(uuids(rng, n_albums), dtype=object)
+    columns['release_group_mbid'] = np.where(has_recording, album_mbids[album], None)
+    columns['release_group_mbid.1'] = columns['release_group_mbid']
+
+    theme_words = chinese_words(rng, 300, 2)
+    columns['ai_theme'] = np.where(has_lyrics, [''.join(words) + '的念舊' for words in rng.choice(theme_words, (n_rows, 3))], None)
+    columns['ai_sentiment'] = np.where(has_lyrics, ['、'.join(words) for words in rng.choice(theme_words, (n_rows, 3))], None)
+    notes = np.full(n_rows, None, dtype=object)
+    notes[has_lyrics] = [text.replace('\n', '，') + '。' for text in lyrics_texts(rng, n_lyrics, vocabulary, lines=(3, 6))]
+    columns['ai_notes'] = notes
+
+    columns['recording_mbid'] = np.where(has_recording, uuids(rng, n_rows), None)
+    columns['recording_mbid.1'] = np.full(n_rows, np.nan)
+    columns['super_theme'] = np.where(has_lyrics, pick(rng, SUPER_THEMES, n_rows), None)
+    columns['recording_duration_ms'] = columns['duration_ms']
+    columns['artist_credit_name'] = np.where(has_recording, pick(rng, ARTISTS, n_rows), None)
+    columns['isrcs'] = with_missing(rng, [f'TWA45{n:07d}' for n in rng.integers(0, 10 ** 7, n_rows)], 0.015)
+    columns['release_mbids'] = np.where(has_recording, album_mbids[album], None)
+    has_work = rng.random(n_rows) < 0.1
+    columns['work_titles'] = np.where(has_work, titles, None)
+    columns['work_mbids'] = np.where(has_work, uuids(rng, n_rows), None)
+
+    has_video = rng.random(n_rows) < YOUTUBE_SHARE
+    merged_video = has_video & (rng.random(n_rows) < MERGED_SHARE)
+    video_ids = np.array(hex_ids(rng, n_rows, 11), dtype=object)
+    columns['videoId'] = np.where(has_video, video_ids, None)
+    columns['url'] = np.where(has_video, ['https://www.youtube.com/watch?v=' + v for v in video_ids], None)
+    columns['viewCount'] = np.where(has_video, counts(rng, n_rows, 10, merged_video), None)
+    columns['likeCount'] = np.where(has_video, counts(rng, n_rows, 4, merged_video), None)
+    columns['commentCount'] = np.where(has_video, counts(rng, n_rows, 0, merged_video), None)
+    published = np.datetime64('2009-01-01T00:00:00') + rng.integers(0, 16 * 365 * 86400, n_rows).astype('timedelta64[s]')
+    columns['publishedAt'] = np.where(has_video, np.datetime_as_string(published, unit='s').astype(object) + 'Z', None)
+    descriptions = np.full(n_rows, None, dtype=object)
+    descriptions[has_video] = [
+        f'Provided to YouTube by YOYOROCK\n\n{title} · 張信哲\n\n{text}'
+        for title, text in zip(titles[has_video], lyrics_texts(rng, int(has_video.sum()), vocabulary, lines=(2, 5)))
+    ]
+    columns['description'] = descriptions
+    columns['tags'] = np.where(has_video, [f'張信哲,{title},{word}' for title, word in zip(titles, pick(rng, vocabulary, n_rows))], None)
+    columns['categoryId'] = np.where(has_video, 10.0, np.nan)
+    columns['yt_duration'] = np.where(has_video, [f'PT{d // 60_000}M{d // 1000 % 60}S' for d in durations[0]], None)
+
+    has_spotify = rng.random(n_rows) < SPOTIFY_SHARE
+    merged_spotify = has_spotify & (rng.random(n_rows) < MERGED_SHARE)
+    columns['track_id'] = np.where(has_spotify, hex_ids(rng, n_rows, 22), None)
+    popularity = rng.integers(0, 60, (2, n_rows))
+    columns['popularity'] = np.where(
+        has_spotify,
+        [f'{a} | {b}' if is_merged else str(a) for a, b, is_merged in zip(popularity[0], popularity[1], merged_spotify)],
+        None
+    )
+
+    columns['normalized_key'] = titles
+    columns['combined_key'] = np.where(has_audio, pick(rng, KEYS, n_rows), None)
+    columns['consolidated_album_title'] = np.where(has_album, album_names[album], None)
+    columns['release_year'] = np.where(has_year, album_years[album].astype(np.float64), np.nan)
+    return pd.DataFrame(columns, columns=COLUMNS)
+
+
+def write_catalogue(n_rows, path, seed=0):
+    """Writes a synthetic catalogue as CSV; returns path."""
+    synthetic_catalogue(n_rows, seed).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic tracks CSV shaped like final_enriched_tracks_v3.csv.")
+    parser.add_argument('rows', type=int)
+    parser.add_argument('-o', '--output', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_catalogue(args.rows, args.output, args.seed)
+    print(f"Wrote {args.rows} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
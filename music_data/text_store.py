@@ -0,0 +1,105 @@
+"""Large text columns kept out of the resident tracks table.
+
+Lyrics, descriptions, AI notes and tags are most of the table's memory,
+but they are only read for one track at a time (Song Details) or once
+while an index is built. The compact table leaves them out, and a
+TextStore reads them on demand from the Parquet copy of the prepared
+table, touching only the row group that holds the requested track.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# Columns left out of the resident table
+LAZY_TEXT_COLS = ['lyrics_text', 'description', 'ai_notes', 'tags']
+# Rows per Parquet row group when prepared tables are written
+ROW_GROUP_SIZE = 1024
+
+
+def compact_columns(columns):
+    """columns without the LAZY_TEXT_COLS, order kept."""
+    return [col for col in columns if col not in LAZY_TEXT_COLS]
+
+
+def compact_table(df):
+    """The resident part of an in-memory prepared table."""
+    return df[compact_columns(df.columns)]
+
+
+def read_compact_table(path):
+    """Loads a prepared Parquet table without its LAZY_TEXT_COLS.
+
+    Every column gets its own block, so a copy-on-write view that changes
+    one column copies only that column.
+    """
+    columns = compact_columns(pq.read_schema(path).names)
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas(split_blocks=True)
+
+
+class TextStore:
+    """On-demand access to the LAZY_TEXT_COLS of a prepared table, by row position.
+
+    Backed by the prepared Parquet file, or by an in-memory frame where no
+    file could be written. The file may live in an evictable cache: when it
+    is gone, reopen() (if given) is called for the path of a rebuilt copy.
+    """
+
+    def __init__(self, path=None, frame=None, reopen=None):
+        self._frame = None
+        self._reopen = reopen
+        if path is not None:
+            self._open(path)
+        else:
+            self.path = None
+            self.columns = [col for col in LAZY_TEXT_COLS if col in frame.columns]
+            self._frame = frame[self.columns].reset_index(drop=True)
+
+    def _open(self, path):
+        metadata = pq.read_metadata(path)
+        names = pq.read_schema(path).names
+        self.columns = [col for col in LAZY_TEXT_COLS if col in names]
+        row_counts = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        self._group_starts = np.concatenate([[0], np.cumsum(row_counts, dtype=np.int64)])
+        self.path = path
+
+    def _read(self, read):
+        """read(path), reopening the file once if it has been deleted."""
+        try:
+            return read(self.path)
+        except FileNotFoundError:
+            path = self._reopen() if self._reopen is not None else None
+            if path is None:
+                raise
+            self._open(path)
+            return read(self.path)
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(frame=df)
+
+    def row(self, position):
+        """{column: text} for one row; missing values are left out."""
+        if not self.columns:
+            return {}
+        if self._frame is not None:
+            values = self._frame.iloc[position].to_dict()
+        else:
+            values = self._read(lambda path: self._read_row(path, position))
+        return {col: value for col, value in values.items() if not pd.isna(value)}
+
+    def column(self, col):
+        """A whole text column, in table row order."""
+        if self._frame is not None:
+            return self._frame[col]
+        table = self._read(lambda path: pq.read_table(path, columns=[col], memory_map=True))
+        return table.column(col).to_pandas().rename(col)
+
+    def _read_row(self, path, position):
+        group = int(np.searchsorted(self._group_starts, position, side='right')) - 1
+        table = pq.ParquetFile(path, memory_map=True).read_row_group(group, columns=self.columns)
+        return table.slice(position - int(self._group_starts[group]), 1).to_pylist()[0]
+
+    def attach(self, df, columns=None):
+        """df with text columns added back, e.g. to build an index from it."""
+        columns = self.columns if columns is None else [col for col in columns if col in self.columns]
+        return df.assign(**{col: self.column(col).to_numpy() for col in columns})
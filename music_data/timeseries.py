@@ -0,0 +1,181 @@
+"""Time-series aggregates of the track metrics.
+
+For every metric the engine keeps only the (year, value) pairs of rows
+that have both, sorted by year and then by value. Per-period statistics
+(count, mean, median, percentiles) are read off those sorted runs, so any
+grouping of years - single years, multi-year buckets, named eras - costs
+one pass over a small array. Years come either from release_year or from
+the YouTube upload timestamp (publishedAt). Rolling and cumulative windows
+are built from per-year sums and counts. The danceability and timbre
+labels are trended as 0/1 values, so their mean is the share of
+danceable and of bright tracks.
+"""
+import numpy as np
+import pandas as pd
+
+from music_data.topk import metric_values
+
+TREND_METRICS = ['popularity', 'viewCount', 'likeCount', 'danceability', 'timbre']
+# Two-valued label metrics, valued 1.0 for the given label and 0.0 for the other: their mean is its share
+LABEL_METRICS = {'danceability': 'danceable', 'timbre': 'bright'}
+# Percentiles reported next to the median
+PERCENTILES = (25, 75)
+# Width of the default multi-year bucket
+BUCKET_YEARS = 5
+# Named eras as (label, first year, last year), both inclusive
+ERAS = [
+    ('1980s', 1980, 1989),
+    ('1990s', 1990, 1999),
+    ('2000s', 2000, 2009),
+    ('2010s', 2010, 2019),
+    ('2020s', 2020, 2029),
+]
+STAT_COLS = ['count', 'mean', 'median'] + [f'p{q}' for q in PERCENTILES]
+
+
+def _sorted_quantile(values, starts, counts, q):
+    """Quantile q of every group of an array sorted within groups (linear interpolation, as numpy)."""
+    position = starts + q * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.minimum(low + 1, starts + counts - 1)
+    frac = position - low
+    return values[low] * (1 - frac) + values[high] * frac
+
+
+def grouped_stats(keys, values, percentiles=PERCENTILES):
+    """count, mean, median and percentiles of values per distinct key, indexed by key."""
+    columns = ['count', 'mean', 'median'] + [f'p{q}' for q in percentiles]
+    if len(keys) == 0:
+        return pd.DataFrame(columns=columns, dtype='float64')
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    uniques, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    stats = {
+        'count': counts,
+        'mean': np.add.reduceat(values, starts) / counts,
+        'median': _sorted_quantile(values, starts, counts, 0.5),
+    }
+    for q in percentiles:
+        stats[f'p{q}'] = _sorted_quantile(values, starts, counts, q / 100)
+    return pd.DataFrame(stats, index=uniques, columns=columns)
+
+
+def trend_values(series, label=None):
+    """Float values of a metric column; for a label metric, 1.0 where it holds label and 0.0 elsewhere."""
+    if label is None:
+        return metric_values(series)
+    return np.where(series.isna().to_numpy(), np.nan, (series.astype('object') == label).to_numpy(dtype=np.float64))
+
+
+def upload_years(published):
+    """Year of each publishedAt timestamp (NaN where missing or unparsable)."""
+    timestamps = pd.to_datetime(published, utc=True, errors='coerce')
+    return timestamps.dt.year.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class TrendEngine:
+    """Per-period statistics of TREND_METRICS by release year or upload year."""
+
+    def __init__(self, df, metrics=TREND_METRICS, year_col='release_year', published_col='publishedAt'):
+        axes = {'release': metric_values(df[year_col])}
+        if published_col in df.columns:
+            axes['upload'] = upload_years(df[published_col])
+        self.metrics = [metric for metric in metrics if metric in df.columns]
+        self.axes = list(axes)
+        self.missing_years = int(np.isnan(axes['release']).sum())
+
+        # (axis, metric) -> (years, values) of rows having both, sorted by year then value
+        self._pairs = {}
+        for metric in self.metrics:
+            values = trend_values(df[metric], LABEL_METRICS.get(metric))
+            for axis, years in axes.items():
+                valid = ~np.isnan(years) & ~np.isnan(values)
+                pair_years, pair_values = years[valid].astype(np.int64), values[valid]
+                order = np.lexsort((pair_values, pair_years))
+                self._pairs[axis, metric] = (pair_years[order], pair_values[order])
+
+        self._tables = {}
+        for axis in self.axes:
+            self.table('year', axis)
+        self.table(BUCKET_YEARS)
+        self.table('era')
+
+    def has_values(self, metric, axis='release'):
+        """True when some row has both metric and a year on axis."""
+        return (axis, metric) in self._pairs and len(self._pairs[axis, metric][0]) > 0
+
+    @staticmethod
+    def _periods(years, period):
+        """(period key, label, first year) per year for a period spec; key -1 drops the year."""
+        if period == 'year':
+            return years, years.astype(str), years
+        if period == 'era':
+            starts = np.array([start for _, start, _ in ERAS])
+            ends = np.array([end for _, _, end in ERAS])
+            keys = np.searchsorted(starts, years, side='right') - 1
+            keys = np.where((keys >= 0) & (years <= ends[np.clip(keys, 0, None)]), keys, -1)
+            labels = np.array([label for label, _, _ in ERAS] + [''], dtype=object)[keys]
+            return keys, labels, starts[np.clip(keys, 0, None)]
+        starts = years - years % period
+        labels = np.char.add(np.char.add(starts.astype(str), '–'), (starts + period - 1).astype(str))
+        return starts, labels, starts
+
+    def table(self, period='year', axis='release'):
+        """Long frame of period, start, metric and the STAT_COLS.
+
+        period is 'year', 'era' or a bucket width in years; axis is
+        'release' (release_year) or 'upload' (publishedAt).
+        """
+        cache_key = (period, axis)
+        if cache_key not in self._tables:
+            frames = []
+            for metric in self.metrics:
+                years, values = self._pairs[axis, metric]
+                keys, labels, starts = self._periods(years, period)
+                keep = keys >= 0
+                if not keep.any():
+                    continue
+                keys, labels, starts = keys[keep], labels[keep], starts[keep]
+                stats = grouped_stats(keys, values[keep])
+                first = np.searchsorted(keys, stats.index.to_numpy())
+                stats.insert(0, 'period', labels[first])
+                stats.insert(1, 'start', starts[first])
+                stats.insert(2, 'metric', metric)
+                frames.append(stats.reset_index(drop=True))
+            columns = ['period', 'start', 'metric'] + STAT_COLS
+            self._tables[cache_key] = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        return self._tables[cache_key]
+
+    def wide(self, stat='mean', period='year', axis='release', metrics=None):
+        """One stat as a frame with period, start and a column per metric, ordered by start."""
+        table = self.table(period, axis)
+        if metrics is not None:
+            table = table[table['metric'].isin(metrics)]
+        wide = table.pivot_table(index=['start', 'period'], columns='metric', values=stat, aggfunc='first')
+        return wide.reset_index().rename_axis(columns=None)
+
+    def windows(self, metric, window=3, axis='release'):
+        """Yearly mean plus rolling (trailing window years) and cumulative means, one row per year.
+
+        Years without tracks stay in so the windows cover calendar years.
+        """
+        years, values = self._pairs[axis, metric]
+        if len(years) == 0:
+            return pd.DataFrame(columns=['year', 'count', 'mean', 'rolling_mean', 'cumulative_mean'])
+        offsets = years - years[0]
+        n_years = int(offsets[-1]) + 1
+        counts = np.bincount(offsets, minlength=n_years)
+        sums = np.bincount(offsets, weights=values, minlength=n_years)
+        cum_counts = np.concatenate([[0], np.cumsum(counts)])
+        cum_sums = np.concatenate([[0.0], np.cumsum(sums)])
+        stop = np.arange(1, n_years + 1)
+        start = np.maximum(stop - window, 0)
+        window_counts = cum_counts[stop] - cum_counts[start]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame({
+                'year': years[0] + np.arange(n_years),
+                'count': counts,
+                'mean': sums / counts,
+                'rolling_mean': (cum_sums[stop] - cum_sums[start]) / window_counts,
+                'cumulative_mean': cum_sums[stop] / cum_counts[stop],
+            })
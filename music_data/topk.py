@@ -0,0 +1,74 @@
+"""Top-K selection over nullable metric columns without full sorts.
+
+Ordering is always: metric descending, then the optional tie-break values
+descending, then row position ascending, so results are deterministic.
+"""
+import numpy as np
+
+
+def metric_values(series):
+    """Float view of a (nullable) numeric column with NaN for missing values."""
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def rank_positions(values, positions, tie_values=None):
+    """Sorts positions by the top-K ordering."""
+    keys = [positions]
+    if tie_values is not None:
+        keys.append(-tie_values[positions])
+    keys.append(-values[positions])
+    return positions[np.lexsort(keys)]
+
+
+def top_k_positions(values, k, positions=None, tie_values=None):
+    """Row positions of the k largest non-NaN values, best first.
+
+    Uses a partial selection to find the k-th largest value, so only the
+    rows at or above it are sorted. positions restricts the search to a
+    subset of rows (e.g. an active filter).
+    """
+    if positions is None:
+        positions = np.flatnonzero(~np.isnan(values))
+    else:
+        positions = positions[~np.isnan(values[positions])]
+    if k <= 0 or len(positions) == 0:
+        return positions[:0]
+
+    if len(positions) > k:
+        candidate_values = values[positions]
+        kth = np.partition(candidate_values, len(positions) - k)[len(positions) - k]
+        # Keep every row tied with the k-th value so tie-breaking stays exact
+        positions = positions[candidate_values >= kth]
+    return rank_positions(values, positions, tie_values)[:k]
+
+
+class RankedIndex:
+    """A metric's rows pre-sorted once per dataset version.
+
+    Any filter is then applied by walking the sorted order and keeping the
+    first k rows that pass, with no per-query sort.
+    """
+
+    def __init__(self, values, tie_values=None):
+        self.values = values
+        positions = np.flatnonzero(~np.isnan(values))
+        self.order = rank_positions(values, positions, tie_values)
+
+    def top(self, k, rows=None):
+        """Top k row positions among rows (all rows if None)."""
+        if rows is None:
+            return self.order[:k]
+        mask = np.zeros(len(self.values), dtype=bool)
+        mask[rows] = True
+        # Scan the sorted order in blocks so selective filters stop early
+        found = []
+        n_found = 0
+        block_size = max(4 * k, 1024)
+        for start in range(0, len(self.order), block_size):
+            block = self.order[start:start + block_size]
+            block = block[mask[block]]
+            found.append(block)
+            n_found += len(block)
+            if n_found >= k:
+                break
+        return np.concatenate(found)[:k] if found else self.order[:0]
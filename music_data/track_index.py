@@ -0,0 +1,81 @@
+"""Constant-time lookup of track rows by their identifiers.
+
+Built once per dataset version from the prepared table. Multi-valued
+identifiers ('id1 | id2', as produced when versions were merged) are
+indexed under each of their parts. An identifier that maps to more than
+one row is reported as ambiguous instead of silently picking the first.
+"""
+from music_data.artifacts import data_fingerprint, load_or_build
+
+# Identifier columns in order of preference for links
+KEY_COLS = ['song_cluster_id', 'track_id', 'recording_mbid']
+# Bump whenever the lookup layout changes
+LOOKUP_VERSION = 1
+
+
+class AmbiguousTrackError(LookupError):
+    """An identifier matched more than one track."""
+
+
+def _split_ids(value):
+    return [part.strip() for part in str(value).split('|') if part.strip()]
+
+
+class TrackLookup:
+    """Maps identifier values to row positions, one dict per identifier column."""
+
+    def __init__(self, df, key_cols=KEY_COLS):
+        self.key_cols = [col for col in key_cols if col in df.columns]
+        self._rows = {}
+        for col in self.key_cols:
+            mapping = {}
+            for row, value in enumerate(df[col].astype('object')):
+                if value is None or value != value:  # missing (None or NaN)
+                    continue
+                for part in _split_ids(value):
+                    mapping.setdefault(part, []).append(row)
+            self._rows[col] = {key: tuple(rows) for key, rows in mapping.items()}
+
+        # The identifier each row should be linked by: the first column where its value is unique
+        self._link_keys = [None] * len(df)
+        for col in reversed(self.key_cols):
+            for key, rows in self._rows[col].items():
+                if len(rows) == 1:
+                    self._link_keys[rows[0]] = (col, key)
+
+    def rows(self, col, value):
+        """Every row position with this identifier (empty if unknown)."""
+        return self._rows.get(col, {}).get(str(value).strip(), ())
+
+    def row(self, col, value):
+        """The single row position for an identifier, or None if unknown.
+
+        Raises AmbiguousTrackError when several rows share it.
+        """
+        rows = self.rows(col, value)
+        if len(rows) > 1:
+            raise AmbiguousTrackError(f"{col}={value} matches {len(rows)} tracks.")
+        return rows[0] if rows else None
+
+    def resolve(self, params):
+        """Row for the first identifier column present in params (e.g. st.query_params)."""
+        for col in self.key_cols:
+            if col in params:
+                return self.row(col, params[col])
+        return None
+
+    def link_key(self, row):
+        """(column, value) that identifies row unambiguously, or None."""
+        return self._link_keys[row]
+
+    def link(self, row):
+        """Relative URL that opens row in the Song Details tab."""
+        key = self._link_keys[row]
+        return f"?{key[0]}={key[1]}" if key else None
+
+
+def build_track_lookup(df):
+    """TrackLookup for df, persisted per content of the identifier columns."""
+    cols = [col for col in KEY_COLS if col in df.columns]
+    key = data_fingerprint(df[cols].astype('object'), LOOKUP_VERSION)
+    return load_or_build('track_lookup', key, lambda: TrackLookup(df))
@@ -0,0 +1,44 @@
+"""Row-index views over the prepared table.
+
+A TableView is the shared, read-only table plus the positions of the rows
+in a subset. Filtering only produces a new position array, and a column
+is gathered for the subset when a chart or table asks for it, so no
+filter copies the whole frame.
+"""
+import numpy as np
+
+
+def notna_rows(df, col):
+    """Positions of rows with a value in col."""
+    return np.flatnonzero(df[col].notna().to_numpy())
+
+
+class TableView:
+    """A subset of df given by sorted row positions.
+
+    Indexing works like a DataFrame for reading: view['col'] is that column
+    for the subset's rows and view[['a', 'b']] the subset of those columns,
+    both keeping df's index.
+    """
+
+    def __init__(self, df, rows=None):
+        self.df = df
+        self.rows = np.arange(len(df)) if rows is None else np.asarray(rows, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return len(self.rows) == 0
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    def __getitem__(self, key):
+        return self.df[key].take(self.rows)
+
+    def frame(self, columns=None):
+        """The subset as a DataFrame, gathering only columns (all if None)."""
+        return (self.df if columns is None else self.df[list(columns)]).take(self.rows)
@@ -1,130 +1,157 @@
 import streamlit as st
 import pandas as pd
 
+from music_data.app_data import (
+    dataset_cache_key, load_available_years, load_prepared_table, load_range_index, sidebar_dataset_selector,
+    sidebar_profiling_panel, sidebar_year_filter, start_profiling
+)
+from music_data.correlation import FEATURE_COLS, TARGET_COLS, correlation_table, overlap_counts
+from music_data.profiling import profiled_cache
+from music_data.views import TableView
+
 # Set the page title and layout
 st.set_page_config(layout="wide")
+start_profiling('correlation')
 st.title("Correlation: What Makes a Song Popular?")
 
+# Audio features that the popularity analysis depends on but that are often missing
+AUDIO_COLS = ['bpm', 'danceability', 'mood_happy', 'mood_sad', 'mood_party', 'mood_relaxed', 'mood_aggressive']
+
+# --- Live Correlation Engine ---
+@profiled_cache(st.cache_data)
+def compute_correlations(file_path, cache_key, year_range, method):
+    """Correlations for one dataset version, year range and method."""
+    df = load_prepared_table(file_path, cache_key)
+    # Gather only the columns the correlations read, for the rows in range
+    used_cols = [col for col in TARGET_COLS + FEATURE_COLS + AUDIO_COLS if col in df.columns]
+    df = TableView(df, load_range_index(file_path, cache_key).rows(year_range)).frame(used_cols)
+    table = correlation_table(df, method=method)
+    overlaps = {target: overlap_counts(df, target, AUDIO_COLS) for target in TARGET_COLS if target in df.columns}
+    target_counts = {target: int(df[target].notna().sum()) for target in TARGET_COLS if target in df.columns}
+    return table, overlaps, target_counts
+
+def correlation_series(table, feature_col, target, prefix, top_n=None):
+    """r values for one source column, labelled and sorted for a bar chart."""
+    rows = table[(table['feature_col'] == feature_col) & (table['target'] == target)]
+    rows = rows.sort_values('r', ascending=False)
+    if top_n is not None and len(rows) > 2 * top_n:
+        rows = pd.concat([rows.head(top_n), rows.tail(top_n)])
+    labels = [f"{prefix}{feature} (n={n})" for feature, n in zip(rows['feature'], rows['n'])]
+    return pd.Series(rows['r'].to_numpy(), index=labels, name='Correlation (r)')
+
+file_path, _ = sidebar_dataset_selector()
+cache_key = dataset_cache_key(file_path)
+df = load_prepared_table(file_path, cache_key)
+if df.empty:
+    st.stop()
+
+year_range = sidebar_year_filter(load_available_years(file_path, cache_key))
+st.sidebar.header("Correlation Settings")
+method = st.sidebar.radio("Method", ['pearson', 'spearman'], format_func=str.title)
+available_targets = [col for col in TARGET_COLS if col in df.columns]
+target = st.sidebar.selectbox("Measure of popularity", available_targets)
+
+table, overlaps, target_counts = compute_correlations(file_path, cache_key, year_range, method)
+method_label = "Pearson" if method == 'pearson' else "Spearman (rank)"
+
 # --- Introduction & Explanation ---
 st.info(
-    """
-    **What is this?** This page shows the **linear correlation (r)** between a song's features
-    and its popularity score.
-    
-    * A value near **+1.0** means as the feature increases, popularity tends to increase.
-    * A value near **-1.0** means as the feature increases, popularity tends to decrease.
-    * A value near **0.0** means there is little to no *linear* relationship.
-    
-    This is a first step. The **Random Forest** model (in progress) will find more 
-    complex, non-linear patterns.
-    """
-)
+    f"""
+    **What is this?** This page shows the **{method_label} correlation (r)** between a song's features
+    and its **{target}**, computed live from the loaded dataset and the sidebar year filter.
 
-# --- NEW: Traditional Chinese Summary ---
-st.subheader("中文重點總結")
-st.markdown(
-    """
-    這次的「線性相關」分析發現，**歌詞情感**是與歌曲受歡迎程度連結最強的因素。
-    特別是像「懇切的深情與隱藏的焦慮」($r=0.46$) 這類複雜的情感，顯示出最強的正相關。
-
-    在音訊特徵方面，**「古典」類型** ($r=0.24$) 和**「E調」** ($r=0.22$) 的歌曲也與高受歡迎度有中等程度的關聯。
+    * A value near **+1.0** means songs with this feature tend to score higher.
+    * A value near **-1.0** means songs with this feature tend to score lower.
+    * A value near **0.0** means there is little to no relationship.
 
-    **重要限制：** 值得注意的是，由於數據缺失，我們無法分析 `bpm`（速度）、`danceability`（舞蹈性）和各種 `mood`（情緒）分數與受歡迎程度的關聯。
+    Each feature is compared only on songs where both the feature and the score are present (n).
+    The **Random Forest** model (on the next page) will find more complex, non-linear patterns.
     """
 )
-# --- End of New Section ---
+
+sentiment = correlation_series(table, 'ai_sentiment', target, '')
+audio = pd.concat([
+    correlation_series(table, 'genre_ros', target, 'Genre: '),
+    correlation_series(table, 'combined_key', target, 'Key: '),
+]).sort_values(ascending=False)
+missing_audio = [col for col, count in overlaps.get(target, {}).items() if count == 0]
+
+# --- Traditional Chinese Summary ---
+st.subheader("中文重點總結")
+summary_lines = []
+if not sentiment.empty:
+    summary_lines.append(
+        f"這次的「{method_label}」相關分析發現，在**歌詞情感**中，"
+        f"「{sentiment.index[0]}」與 `{target}` 的正相關最強 ($r={sentiment.iloc[0]:.2f}$)。"
+    )
+if not audio.empty:
+    summary_lines.append(
+        f"在音訊特徵方面，**{audio.index[0]}** ($r={audio.iloc[0]:.2f}$) 與較高的 `{target}` 關聯最強。"
+    )
+if missing_audio:
+    missing_list = "、".join(f"`{col}`" for col in missing_audio)
+    summary_lines.append(f"**重要限制：** 由於數據缺失，目前無法分析 {missing_list} 與 `{target}` 的關聯。")
+st.markdown("\n\n".join(summary_lines) or "目前篩選範圍內的數據不足以計算相關性。")
 
 st.markdown("---")
 
 # --- Finding 1: Lyric Sentiment ---
-st.header("Finding 1: Lyric Sentiment (The Strongest Link)")
+st.header("Finding 1: Lyric Sentiment")
 st.write(
     """
-    The **AI-analyzed sentiment** of the lyrics was the feature with the strongest
-    connection to popularity. Complex, emotional sentiments showed the highest positive
-    correlation.
+    The **AI-analyzed sentiment** of the lyrics, showing the most positively and
+    most negatively correlated sentiments.
     """
 )
-
-# Create a DataFrame for the sentiment correlations
-sentiment_data = {
-    'Sentiment': [
-        'Sincere affection w/ hidden anxiety (懇切的深情與隱藏的焦慮和脆弱)',
-        'Firm, affectionate, hopeful love (堅定、深情、充滿希望的愛意...)',
-        'Nostalgic, gentle, helplessness (懷舊、溫柔、對時光飛逝的無奈與感傷)',
-        'Melancholy w/ firm relief (憂鬱中帶有堅定的釋懷與自我安慰)',
-        'Anxious, contradictory, hopeful (忐忑不安、矛盾、帶有希望的猶豫)',
-        '...',
-        'Passionate worship, dramatic tension (激昂的崇拜、迷戀與戲劇性的張力)',
-        'Firm, rebellious, resolute (堅定、反抗、追求自主的決心)',
-        'Active, optimistic, uplifting (積極、樂觀、振奮)',
-        'Warm, sincere gratitude, joy (溫暖、真摯的感激、喜悅)',
-        'Reflective and tranquil (反思與平靜)'
-    ],
-    'Correlation (r)': [
-        0.46,  # 懇切的深情與隱藏的焦慮和脆弱
-        0.27,  # 堅定、深情、充滿希望的愛意...
-        0.22,  # 懷舊、溫柔、對時光飛逝的無奈與感傷
-        0.20,  # 憂鬱中帶有堅定的釋懷與自我安慰
-        0.20,  # 忐忑不安、矛盾、帶有希望的猶豫
-        0.0,   # ... separator
-        -0.11, # 激昂的崇拜、迷戀與戲劇性的張力
-        -0.11, # 堅定、反抗、追求自主的決心
-        -0.10, # 積極、樂觀、振奮
-        -0.10, # 溫暖、真摯的感激、喜悅
-        -0.10  # 反思與平靜
-    ]
-}
-sentiment_df = pd.DataFrame(sentiment_data).set_index('Sentiment')
-
-# Display the bar chart
-st.bar_chart(sentiment_df['Correlation (r)'])
-
+sentiment_top = correlation_series(table, 'ai_sentiment', target, '', top_n=5)
+if sentiment_top.empty:
+    st.warning("Not enough overlapping data to correlate `ai_sentiment`.")
+else:
+    st.bar_chart(sentiment_top)
+
+# --- Finding 2: Lyric Theme ---
+st.header("Finding 2: Lyric Theme")
+theme_top = correlation_series(table, 'ai_theme', target, '', top_n=5)
+if theme_top.empty:
+    st.warning("Not enough overlapping data to correlate `ai_theme`.")
+else:
+    st.bar_chart(theme_top)
 
 st.markdown("---")
 
-# --- Finding 2: Audio Features ---
-st.header("Finding 2: Audio Features (Genre & Key)")
-st.write(
-    """
-    Basic audio features also showed a moderate correlation. 
-    Songs identified as **"Classical"** or in the **"Key of E"** had a noticeable positive link to popularity.
-    """
-)
-
-# Create a DataFrame for the audio feature correlations
-audio_data = {
-    'Feature': [
-        'Genre: Classical (cla)',
-        'Key: E',
-        'Genre: Pop (pop)'
-    ],
-    'Correlation (r)': [
-        0.24,  # genre_ros_cla
-        0.22,  # key_E
-        -0.10  # genre_ros_pop
-    ]
-}
-audio_df = pd.DataFrame(audio_data).set_index('Feature')
-
-# Display the bar chart
-st.bar_chart(audio_df['Correlation (r)'])
+# --- Finding 3: Audio Features ---
+st.header("Finding 3: Audio Features (Genre & Key)")
+if audio.empty:
+    st.warning("Not enough overlapping data to correlate `genre_ros` or `combined_key`.")
+else:
+    st.bar_chart(audio)
 
+with st.expander("All correlations"):
+    st.dataframe(
+        table[table['target'] == target].sort_values('r', ascending=False).reset_index(drop=True),
+        use_container_width=True
+    )
 
 st.markdown("---")
 
-# --- Finding 3: The Missing Data Caveat ---
+# --- Finding 4: The Missing Data Caveat ---
 st.header("Important Data Limitations")
-st.warning(
-    """
-    **Critical Finding:** For the 245 songs that had a `popularity` score, 
-    there was **0% overlap** with the following audio features:
-    
-    * `bpm` (Beats Per Minute)
-    * `danceability`
-    * All `mood_*` columns (happy, sad, party, etc.)
-    
-    Because this data was missing, **their correlation could not be calculated.** The next step, a Machine Learning model, will use data imputation to help 
-    analyze these features.
-    """
-)
+if target in overlaps:
+    overlap_lines = "\n".join(f"    * `{col}`: {count} songs" for col, count in overlaps[target].items())
+    message = (
+        f"""
+    Of the **{target_counts[target]}** songs that have a `{target}` value, these also have audio features:
+
+{overlap_lines}
+        """
+    )
+    if missing_audio:
+        message += (
+            "\n    Features with **0% overlap** cannot be correlated. The Machine Learning model "
+            "uses data imputation to help analyze them."
+        )
+        st.warning(message)
+    else:
+        st.info(message)
+
+sidebar_profiling_panel()
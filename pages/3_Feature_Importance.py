@@ -1,110 +1,115 @@
 import streamlit as st
-import pandas as pd
+
+from music_data.app_data import (
+    DATASETS_CACHED, dataset_cache_key, load_prepared_table, load_text_store, sidebar_dataset_selector,
+    sidebar_profiling_panel, start_profiling
+)
+from music_data.feature_importance import TARGET_COL, feature_importance
+from music_data.profiling import profiled_cache
 
 # Set the page title and layout
 st.set_page_config(layout="wide")
+start_profiling('feature_importance')
 st.title("🤖 Model Feature Importance")
 
+# --- Cached Model Pipeline ---
+@profiled_cache(st.cache_resource(
+    max_entries=DATASETS_CACHED, show_spinner="Training the Random Forest model (only needed when the data changes)..."
+))
+def load_feature_importance(file_path, cache_key):
+    """Fitted model and importances, persisted on disk per dataset version."""
+    df = load_text_store(file_path, cache_key).attach(load_prepared_table(file_path, cache_key), ['lyrics_text'])
+    return feature_importance(df)
+
+file_path, _ = sidebar_dataset_selector()
+cache_key = dataset_cache_key(file_path)
+df = load_prepared_table(file_path, cache_key)
+if df.empty:
+    st.stop()
+
+try:
+    result = load_feature_importance(file_path, cache_key)
+except (KeyError, ValueError) as e:
+    st.error(f"The model could not be trained on this dataset: {e}")
+    st.stop()
+
+importances = result['importances']
+group_importances = result['group_importances']
+r2 = result['r2']
+top_features = importances.head(3)
+
 # --- Introduction & Explanation ---
 st.info(
-    """
-    **What is this?** This page shows the results from a **Random Forest** model. 
-    
-    Unlike simple correlation, this model finds complex, non-linear patterns. The "Importance Score" 
+    f"""
+    **What is this?** This page shows the results from a **Random Forest** model trained on the
+    loaded dataset ({result['n_train']} training / {result['n_test']} test tracks with a `{TARGET_COL}` score).
+
+    Unlike simple correlation, this model finds complex, non-linear patterns. The "Importance Score"
     shows which features were the **most *predictive*** of a song's popularity.
-    
+
     A higher score means the feature was more important to the model's predictions.
     """
 )
 
-# --- NEW: Traditional Chinese Summary ---
+# --- Traditional Chinese Summary ---
 st.subheader("中文重點總結")
+top_lines = "、".join(
+    f"**「{label}」**（{score:.3f}）" for label, score in zip(top_features['label'], top_features['importance'])
+)
+accuracy_note = (
+    "模型的整體準確度不高，這表示單靠目前有的歌詞、類型和音調特徵，並**不足以**準確預測受歡迎度。"
+    if r2 < 0.3 else
+    "模型已能解釋相當部分的受歡迎度差異。"
+)
 st.markdown(
-    """
+    f"""
     這次我們使用更進階的「隨機森林」模型，來找出哪些特徵最能**預測**一首歌的受歡迎程度。
 
-    **重要發現：** 模型的整體準確度不高 (R-squared = -0.23)。這反過來證明了一個關鍵點：
-    單靠目前有的歌詞、類型和音調特徵，並**不足以**準確預測受歡迎度。
-    這強烈暗示，那些**缺失的音訊數據（如 `bpm` 速度、`danceability` 舞蹈性）**可能才是決定受歡迎度的真正關鍵因素。
+    **重要發現：** 模型的 R-squared = {r2:.2f}。{accuracy_note}
 
-    儘管如此，在現有特徵中，模型認為**「歌詞字數」**是目前數據中**最重要**的預測指標（重要性 0.167），
-    其次是**「D調」**（0.057）以及關於**「無條件奉獻」**的AI主題（0.044）。
+    在現有特徵中，模型認為最重要的預測指標依序為：{top_lines}。
     """
 )
-# --- End of New Section ---
 
 # --- The Most Important Caveat ---
-st.warning(
-    """
-    **Key Finding:** The model's low accuracy score (R-squared = -0.23) tells us that the 
-    available features (lyrics, genre, key) are **not enough** to reliably predict a 
-    popularity score. 
-    
-    This strongly implies that the **missing audio data** (like `bpm`, `danceability`, 
-    and `mood_*`) are the most critical features for predicting popularity.
-    """
-)
+if r2 < 0.3:
+    st.warning(
+        f"""
+        **Key Finding:** The model's low accuracy score (R-squared = {r2:.2f}) tells us that the
+        available features (lyrics, genre, key) are **not enough** to reliably predict a
+        popularity score.
+
+        Missing audio data (like `bpm`, `danceability`, and `mood_*`) is imputed with the median,
+        so those features can only become predictive as more of it is filled in.
+        """
+    )
+else:
+    st.success(f"The model explains a meaningful share of popularity (R-squared = {r2:.2f}).")
 
 st.markdown("---")
 
 # --- Finding 1: Top 20 Most Important Features ---
 st.header("Top 20 Most Predictive Features")
 st.write(
+    f"""
+    The features the model relied on most. **{top_features['label'].iloc[0]}** was the most
+    important feature in this run.
     """
-    Even with low accuracy, the model shows us which of the available features it
-    relied on most. **Lyric Word Count** was, by far, the most important feature,
-    followed by specific keys and AI-generated themes.
+)
+feature_df = importances.head(20).set_index('label')
+st.bar_chart(feature_df['importance'].rename('Importance Score'))
+
+# --- Finding 2: Permutation Importance by Feature Group ---
+st.header("Permutation Importance by Feature Group")
+st.write(
+    """
+    How much the test R-squared drops when all features of a group (e.g. every Key one-hot column)
+    are shuffled together. Values near zero or below mean the group adds little beyond chance.
     """
 )
+st.bar_chart(group_importances.set_index('group')['permutation_mean'].rename('Drop in R-squared'))
+
+with st.expander("All feature importances"):
+    st.dataframe(importances, use_container_width=True, hide_index=True)
 
-# Create a DataFrame for the Feature Importance
-feature_data = {
-    'Feature': [
-        'Lyric Word Count',
-        'Key: D',
-        'AI Theme: Unconditional Devotion (無條件的奉獻與承諾...)',
-        'Genre: Pop',
-        'AI Sentiment: Melancholy w/ Firm Relief (憂鬱中帶有堅定的釋懷...)',
-        'AI Theme: Early-love Hesitation (戀愛初期的猶豫...)',
-        'Genre: Jazz',
-        'AI Theme: No-Regret Love & Fated Parting (無悔的愛與和平的分手...)',
-        'Genre: Classical',
-        'AI Theme: Firm Love Commitment (堅定的愛情承諾...)',
-        'AI Sentiment: Anxious & Hopeful (忐忑不安、矛盾...)',
-        'AI Sentiment: Firm, Hopeful Love (堅定、深情、充滿希望的愛意...)',
-        'AI Sentiment: Urban Alienation to Hope (初始帶有都會的疏離...)',
-        'AI Theme: Pain of Heartbreak (失戀的痛苦、情感的自我防衛...)',
-        'AI Sentiment: Melancholy & Apathy (憂鬱、孤寂、決絕...)',
-        'AI Theme: Yearning for Stable Love (對穩定關係的渴望...)',
-        'AI Sentiment: Melancholy & Helplessness (憂鬱、沉重、無奈...)',
-        'AI Sentiment: Relief & Gratitude (釋然、感恩與對幸福的珍視...)',
-        'AI Sentiment: Passionate, Protective Melancholy (堅定、熱切...)',
-        'AI Theme: Hidden Pain & Self-Sacrifice (隱藏的痛苦與自我犧D牲...)'
-    ],
-    'Importance Score': [
-        0.1667,  # lyric_word_count
-        0.0569,  # key_D
-        0.0436,  # ai_theme_無條件的奉獻與承諾...
-        0.0341,  # genre_ros_pop
-        0.0303,  # ai_sentiment_憂鬱中帶有堅定的釋懷...
-        0.0290,  # ai_theme_戀愛初期的猶豫...
-        0.0280,  # genre_ros_jaz
-        0.0276,  # ai_theme_無悔的愛與和平的分手...
-        0.0266,  # genre_ros_cla
-        0.0263,  # ai_theme_堅定的愛情承諾...
-        0.0245,  # ai_sentiment_忐忑不安、矛盾...
-        0.0233,  # ai_sentiment_堅定、深情、充滿希望的愛意...
-        0.0178,  # ai_sentiment_初始帶有都會的疏離...
-        0.0166,  # ai_theme_失戀的痛苦、情感的自我防衛...
-        0.0155,  # ai_sentiment_憂鬱、孤寂、決絕...
-        0.0133,  # ai_theme_對穩定關係的渴望...
-        0.0115,  # ai_sentiment_憂鬱、沉重、無奈...
-        0.0112,  # ai_sentiment_釋然、感恩與對幸福的珍視...
-        0.0104,  # ai_sentiment_堅定、熱切...
-        0.0103   # ai_theme_隱藏的痛苦與自我犧牲...
-    ]
-}
-feature_df = pd.DataFrame(feature_data).set_index('Feature')
-
-# Display the bar chart
-st.bar_chart(feature_df['Importance Score'])
+sidebar_profiling_panel()
@@ -1,8 +1,21 @@
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.express as px
-import numpy as np
-from collections import Counter
+
+from music_data.aggregates import YearCube, limit_categories
+from music_data.albums import AlbumIndex
+from music_data.app_data import (
+    DATASETS_CACHED, FILE_NAME, dataset_cache_key, load_lyrics_index, load_notna_rows, load_prepared_table,
+    load_range_index, load_duplicate_groups, load_search_index, load_similarity_index, load_text_store,
+    load_track_lookup, render_chart, sidebar_canonical_toggle, sidebar_dataset_selector, sidebar_profiling_panel, sidebar_range_filters,
+    sidebar_year_filter, start_profiling
+)
+from music_data.profiling import PROFILER, profiled_cache
+from music_data.timeseries import BUCKET_YEARS, TrendEngine
+from music_data.topk import RankedIndex, metric_values
+from music_data.track_index import KEY_COLS as TRACK_KEY_COLS, AmbiguousTrackError
+from music_data.views import TableView
 
 # Set Streamlit page configuration
 st.set_page_config(
@@ -11,79 +24,20 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# --- 1. Load Data Function ---
-@st.cache_data
-def load_data(file_path):
-    """Loads the CSV data and performs initial type conversion."""
-    try:
-        df = pd.read_csv(file_path)
-        return df
-    except FileNotFoundError:
-        st.error(f"Error: The data file '{file_path}' was not found in the repository. Please ensure it is uploaded.")
-        return pd.DataFrame()
-
-# --- 2. Data Cleaning and Preparation (FIXED) ---
-@st.cache_data
-def prepare_data(df):
-    """Cleans up and prepares data for visualization."""
-    if df.empty:
-        return df
-
-    # Replace empty strings/whitespace with NaN
-    df = df.replace(r'^\s*$', np.nan, regex=True)
-    
-    # Define all columns that need to be numeric for analysis/sorting
-    numeric_cols = [
-        'viewCount', 'likeCount', 'commentCount', 'popularity', 
-        'danceability', 'timbre' 
-    ]
-    
-    for col in numeric_cols:
-        if col in df.columns:
-            # Coerce all to numeric. errors='coerce' turns bad data into NaN
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            if col in ['viewCount', 'likeCount', 'commentCount', 'popularity']:
-                 df[col] = df[col].astype('Int64', errors='ignore')
-            else:
-                 pass # danceability and timbre will remain floats
-            
-    # Ensure release_year is Int64 (nullable integer) for filtering
-    if 'release_year' in df.columns:
-        df['release_year'] = pd.to_numeric(df['release_year'], errors='coerce').astype('Int64', errors='ignore')
-    
-    # Safeguard: Re-integrate Album Consolidation if 'consolidated_album_title' is missing
-    if 'consolidated_album_title' not in df.columns and 'album_title' in df.columns:
-        non_null_albums = df['album_title'].dropna().astype(str)
-        all_sub_contents = []
-        for title in non_null_albums.unique():
-            all_sub_contents.extend([part.strip() for part in title.split('|') if part.strip()])
-        sub_content_counts = Counter(all_sub_contents)
-        title_mapping = {}
-        for original_title in non_null_albums.unique():
-            sub_contents = [part.strip() for part in original_title.split('|')]
-            valid_sub_contents = [part for part in sub_contents if part]
-            if valid_sub_contents:
-                consolidated_title = max(valid_sub_contents, key=lambda x: sub_content_counts[x])
-            else:
-                consolidated_title = original_title 
-            title_mapping[original_title] = consolidated_title
-        df['consolidated_album_title'] = df['album_title'].map(title_mapping)
-    
-    return df
+# --- 1. & 2. Data Loading and Preparation ---
+# Shared with the pages, see music_data/app_data.py
 
 # --- 3. Visualization Helper Functions (Reusable) ---
 
-def generate_pie_chart(data, column_name):
-    data_filtered = data.dropna(subset=[column_name])
-    
-    if data_filtered.empty:
-        st.warning(f"No non-empty data available for **{column_name}**.")
-        return
+# Slices per pie chart; smaller categories are merged into "Other"
+PIE_MAX_SLICES = 12
 
-    value_counts = data_filtered[column_name].value_counts().reset_index()
+def pie_chart_figure(value_counts, column_name, max_slices=PIE_MAX_SLICES):
+    """Builds a pie chart from precomputed value counts."""
+    total = value_counts.sum()
+    value_counts = limit_categories(value_counts, max_slices)
+    value_counts = value_counts.rename_axis(column_name).reset_index()
     value_counts.columns = [column_name, 'Count']
-    total = value_counts['Count'].sum()
 
     fig = px.pie(
         value_counts, 
@@ -93,95 +47,223 @@ def generate_pie_chart(data, column_name):
         hole=0.3, 
         color_discrete_sequence=px.colors.qualitative.D3
     )
-    st.plotly_chart(fig, use_container_width=True)
+    # The Streamlit theme restyles the chart in the browser, so don't ship Plotly's own template
+    fig.update_layout(template=None)
+    return fig
+
+@PROFILER.timed()
+def render_pie_chart(value_counts, column_name, chart_name=None):
+    """Draws a pie chart from precomputed value counts."""
+    if value_counts.empty:
+        st.warning(f"No non-empty data available for **{column_name}**.")
+        return
+    render_chart(pie_chart_figure(value_counts, column_name), chart_name or f'pie:{column_name}')
 
-def generate_top_tracks_table(data, sort_column):
-    data_filtered = data.dropna(subset=[sort_column])
-    
-    if data_filtered.empty:
+@PROFILER.timed()
+def render_top_tracks_table(top_tracks, sort_column, k=50, links=None):
+    """Displays an already ranked top-tracks frame, optionally with a link to each song's details."""
+    if top_tracks.empty:
         st.warning(f"No non-empty data available for **{sort_column}**.")
         return
 
     display_cols = ['track_name', 'artist_credit_name', 'consolidated_album_title', 'release_year', sort_column]
-    final_cols = [col for col in display_cols if col in data_filtered.columns]
-    
-    top_tracks = data_filtered[final_cols] \
-        .sort_values(by=sort_column, ascending=False) \
-        .head(50) \
-        .reset_index(drop=True)
-
-    st.subheader(f"🏆 Top 50 Tracks by **{sort_column}**")
+    final_cols = [col for col in display_cols if col in top_tracks.columns]
+    top_tracks = top_tracks[final_cols].reset_index(drop=True)
+    column_config = None
+    if links is not None:
+        top_tracks['details'] = links
+        column_config = {'details': st.column_config.LinkColumn("Details", display_text="Open")}
+
+    st.subheader(f"🏆 Top {k} Tracks by **{sort_column}**")
     st.dataframe(
         top_tracks.style.format({
             sort_column: "{:,.0f}" 
         }), 
         use_container_width=True, 
-        height=750
+        height=750,
+        column_config=column_config
     )
 
 # --- 4. Dashboard Page Function ---
-def show_dashboard(df_filtered):
-    """Displays the main visualization dashboard, now filtered by year."""
-    
-    st.header(f"General Dashboard (Analyzing {len(df_filtered)} rows)")
+PIE_CHART_BASE_COLS = ['super_theme', 'genre_ros', 'timbre', 'danceability', 'combined_key']
+TOP_TRACK_COLS = ['popularity', 'viewCount', 'likeCount', 'commentCount']
+TOP_K = 50
+# Column families shown in their own collapsible pie-chart group
+PIE_CHART_GROUPS = {'mood_': "Mood Features", 'ai_': "AI Analysis Features"}
+
+def pie_chart_columns(all_cols):
+    """Categorical columns shown in the pie-chart grid."""
+    pie_chart_cols = list(PIE_CHART_BASE_COLS)
+    pie_chart_cols.extend(col for col in all_cols if col.startswith('mood_'))
+    pie_chart_cols.extend(col for col in all_cols if col.startswith('ai_'))
+
+    pie_chart_cols = sorted(set(pie_chart_cols))
+    for text_col in ['ai_notes', 'lyrics_text']:
+        if text_col in pie_chart_cols: pie_chart_cols.remove(text_col)
+    return pie_chart_cols
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_year_cube(file_path, cache_key):
+    """Builds the per-year aggregate cube once per dataset version; shared read-only."""
+    df = load_prepared_table(file_path, cache_key)
+    return YearCube(df, pie_chart_columns(df.columns), TOP_TRACK_COLS, top_k=TOP_K)
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED * len(TOP_TRACK_COLS)))
+def load_ranked_index(file_path, cache_key, col):
+    """Rows of one metric sorted once per dataset version, for top-K tables over filtered rows; shared read-only."""
+    return RankedIndex(metric_values(load_prepared_table(file_path, cache_key)[col]))
+
+@profiled_cache(st.cache_data(max_entries=512))
+def load_pie_counts(file_path, cache_key, column_name, year_range, value_ranges=None, canonical_only=False):
+    """Non-zero value counts for one pie chart and filter state, computed once per dataset version.
+
+    Without value_ranges or canonical_only the counts come from the year
+    cube, otherwise from the rows the range index selects (canonical
+    versions only, if asked).
+    """
+    if value_ranges or canonical_only:
+        df = load_prepared_table(file_path, cache_key)
+        rows = load_range_index(file_path, cache_key).rows(year_range, value_ranges)
+        if canonical_only:
+            rows = np.intersect1d(rows, load_duplicate_groups(file_path, cache_key).canonical_rows, assume_unique=True)
+        value_counts = TableView(df, rows)[column_name].value_counts()
+        return value_counts[value_counts > 0]
+    return load_year_cube(file_path, cache_key).category_counts(column_name, year_range)
+
+@PROFILER.timed()
+def render_pie_grid(file_path, cache_key, columns, year_range, value_ranges, canonical_only=False, num_cols=3):
+    """Grid of pie charts drawn from cached counts."""
+    cols = st.columns(num_cols)
+    for i, col_name in enumerate(columns):
+        with cols[i % num_cols]:
+            render_pie_chart(
+                load_pie_counts(file_path, cache_key, col_name, year_range, value_ranges, canonical_only), col_name
+            )
+
+@PROFILER.timed()
+def show_dashboard(
+    df, cube, year_range=None, track_lookup=None, rows=None, value_ranges=None, cache_key=None, file_path=FILE_NAME,
+    canonical_only=False
+):
+    """Displays the main visualization dashboard, now filtered by year.
+
+    All counts and rankings come from the precomputed cube, so moving the
+    year slider never rescans df. rows, set when a sidebar range filter or
+    canonical_only (one version per song) is active, are the matching row
+    positions; charts are then computed from those rows only. Pie counts are
+    cached per (column, year range, range filters, canonical_only, dataset
+    version), and the mood and AI groups are only built while their
+    expander is open.
+    """
+    view = TableView(df, rows) if rows is not None else None
+    row_count = cube.row_count(year_range) if view is None else len(view)
+    
+    st.header(f"General Dashboard (Analyzing {row_count} rows)")
     st.markdown("---")
     
     st.header("Pie Chart Analysis: Categorical Features")
     
-    pie_chart_cols = ['super_theme', 'genre_ros', 'timbre', 'danceability', 'combined_key']
-    all_cols = df_filtered.columns.tolist()
-    mood_cols = [col for col in all_cols if col.startswith('mood_')]
-    ai_cols = [col for col in all_cols if col.startswith('ai_')]
-    
-    pie_chart_cols.extend(mood_cols)
-    pie_chart_cols.extend(ai_cols)
-    
-    pie_chart_cols = sorted(list(set(pie_chart_cols)))
-    if 'ai_notes' in pie_chart_cols: pie_chart_cols.remove('ai_notes')
-    if 'lyrics_text' in pie_chart_cols: pie_chart_cols.remove('lyrics_text')
-
-    num_cols = 3
-    cols = st.columns(num_cols)
-    for i, col_name in enumerate(pie_chart_cols):
-        try:
-            with cols[i % num_cols]:
-                generate_pie_chart(df_filtered, col_name)
-        except KeyError:
+    pie_chart_cols = [col for col in pie_chart_columns(df.columns) if cube.has_column(col)]
+    for col_name in PIE_CHART_BASE_COLS:
+        if col_name not in pie_chart_cols:
             st.warning(f"Column '{col_name}' missing from the dataset.")
+    render_pie_grid(
+        file_path, cache_key, [col for col in pie_chart_cols if col in PIE_CHART_BASE_COLS], year_range, value_ranges,
+        canonical_only
+    )
+
+    for prefix, label in PIE_CHART_GROUPS.items():
+        group_cols = [col for col in pie_chart_cols if col.startswith(prefix)]
+        if not group_cols:
+            continue
+        # Built only while expanded, so collapsed groups cost nothing on a rerun
+        with st.expander(f"{label} ({len(group_cols)} charts)", key=f'pie_group_{prefix}', on_change='rerun') as group:
+            if group.open:
+                render_pie_grid(file_path, cache_key, group_cols, year_range, value_ranges, canonical_only)
 
     st.markdown("---")
-    st.header("Top 50 Tracks: Quantitative Measures")
-    
-    top_track_cols = ['popularity', 'viewCount', 'likeCount', 'commentCount']
+    st.header(f"Top {TOP_K} Tracks: Quantitative Measures")
     
     num_cols_tables = 2
     table_cols = st.columns(num_cols_tables)
     
-    for i, col_name in enumerate(top_track_cols):
-        try:
-            with table_cols[i % num_cols_tables]:
-                generate_top_tracks_table(df_filtered, col_name)
-        except KeyError:
-             st.warning(f"Column '{col_name}' missing from the dataset.")
-
-
-# --- 5. New Album Dashboard Function ---
-def show_new_album_dashboard(df):
-    """Displays a detailed dashboard for the '屬於' album."""
-    ALBUM_NAME = "屬於"
-    
+    for i, col_name in enumerate(TOP_TRACK_COLS):
+        with table_cols[i % num_cols_tables]:
+            if col_name in df.columns:
+                if view is None:
+                    top_rows = cube.top_rows(col_name, year_range, TOP_K)
+                else:
+                    # Walks the presorted order instead of converting and ranking the column again
+                    top_rows = load_ranked_index(file_path, cache_key, col_name).top(TOP_K, view.rows)
+                links = [track_lookup.link(row) for row in top_rows] if track_lookup is not None else None
+                render_top_tracks_table(df.iloc[top_rows], col_name, TOP_K, links)
+            else:
+                st.warning(f"Column '{col_name}' missing from the dataset.")
+
+
+# --- 5. Album Dashboard Function ---
+NEW_ALBUM_NAME = "屬於" # Selected by default
+ALBUM_DETAIL_COLS = ['normalized_key', 'mood_sad', 'ai_theme', 'genre_ros']
+ALBUM_RANKING_COLS = ['popularity_mean', 'views_total', 'views_median', 'likes_total', 'tracks']
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_album_index(file_path, cache_key):
+    """Groups the prepared table by consolidated album once per dataset version; shared read-only."""
+    return AlbumIndex(load_prepared_table(file_path, cache_key))
+
+@profiled_cache(st.cache_data(max_entries=256))
+def load_album_pie_counts(file_path, cache_key, album, column_name):
+    """Value counts of one feature over one album, computed once per dataset version.
+
+    Columns the AlbumIndex has no distribution for (near-unique ones like
+    normalized_key) are counted over the album's rows.
+    """
+    albums = load_album_index(file_path, cache_key)
+    if albums.has_distribution(column_name):
+        return albums.distribution(album, column_name)
+    value_counts = TableView(load_prepared_table(file_path, cache_key), albums.rows(album))[column_name].value_counts()
+    return value_counts[value_counts > 0]
+
+@PROFILER.timed()
+def show_album_dashboard(df, albums, lyrics_index=None, cache_key=None, file_path=FILE_NAME):
+    """Displays a detailed dashboard for any album (the '屬於' album by default).
+
+    Rows, summaries and feature counts come from the AlbumIndex, so picking
+    another album never scans the full table.
+    """
     if 'consolidated_album_title' not in df.columns:
         st.error("Album consolidation failed. Cannot filter by consolidated title.")
         return
 
-    df_album = df[df['consolidated_album_title'] == ALBUM_NAME].copy()
-
-    if df_album.empty:
-        st.warning(f"Album '{ALBUM_NAME}' not found in the dataset.")
+    if len(albums) == 0:
+        st.warning("No albums found in the dataset.")
         return
 
-    st.title(f"🎵 New Album Analysis: **{ALBUM_NAME}**")
+    album_names = list(albums.by_size())
+    ALBUM_NAME = st.selectbox(
+        "Select an Album:",
+        album_names,
+        index=album_names.index(NEW_ALBUM_NAME) if NEW_ALBUM_NAME in albums else 0,
+        format_func=lambda album: f"{album} ({albums.summaries.loc[album, 'tracks']} tracks)",
+        key='album_select'
+    )
+    df_album = TableView(df, albums.rows(ALBUM_NAME))
+    summary = albums.summaries.loc[ALBUM_NAME]
+
+    st.title(f"🎵 Album Analysis: **{ALBUM_NAME}**")
     st.subheader(f"Analyzing {len(df_album)} tracks from this album.")
+
+    metric_cols = st.columns(4)
+    metric_cols[0].metric("Tracks", int(summary['tracks']))
+    if 'popularity_mean' in summary and pd.notna(summary['popularity_mean']):
+        metric_cols[1].metric("Avg. Popularity", f"{summary['popularity_mean']:.1f}")
+    if 'views_total' in summary and pd.notna(summary['views_total']):
+        metric_cols[2].metric("Total YouTube Views", f"{summary['views_total']:,.0f}")
+    if 'first_year' in summary and pd.notna(summary['first_year']):
+        years = f"{summary['first_year']:.0f}"
+        if summary['last_year'] != summary['first_year']:
+            years += f"–{summary['last_year']:.0f}"
+        metric_cols[3].metric("Released", years)
     
     st.markdown("### Album Track Listing & Features")
     track_list_cols = ['track_name', 'artist_credit_name', 'popularity', 'viewCount', 'ai_sentiment', 'combined_key']
@@ -193,33 +275,136 @@ def show_new_album_dashboard(df):
     st.markdown("---")
     st.markdown("### Detailed Feature Distribution")
     
-    detail_cols = ['normalized_key', 'mood_sad', 'ai_theme', 'genre_ros']
-    
     cols = st.columns(2)
-    for i, col_name in enumerate(detail_cols):
+    for i, col_name in enumerate(ALBUM_DETAIL_COLS):
         with cols[i % 2]:
-            generate_pie_chart(df_album, col_name)
+            if col_name not in df.columns:
+                st.warning(f"Column '{col_name}' missing from the dataset.")
+                continue
+            render_pie_chart(
+                load_album_pie_counts(file_path, cache_key, ALBUM_NAME, col_name), col_name, f'album_pie:{col_name}'
+            )
+
+    if lyrics_index is not None:
+        st.markdown("---")
+        st.markdown("### Most Frequent Lyric Terms")
+        st.dataframe(lyrics_index.top_terms(df_album.rows, n=20), use_container_width=True, hide_index=True)
+
+    # --- Catalogue-wide Ranking ---
+    st.markdown("---")
+    st.markdown("### Album Ranking (Whole Catalogue)")
+    col1, col2 = st.columns(2)
+    with col1:
+        ranking_cols = [col for col in ALBUM_RANKING_COLS if col in albums.summaries.columns]
+        sort_by = st.selectbox("Rank albums by:", ranking_cols, key='album_rank_by')
+    with col2:
+        min_tracks = st.number_input("Minimum tracks per album:", min_value=1, value=1, step=1, key='album_min_tracks')
+    st.dataframe(
+        albums.ranking(sort_by, min_tracks).reset_index(),
+        use_container_width=True,
+        hide_index=True
+    )
 
 
 # --- 6. Song Details Page Function (***UPDATED***) ---
-def show_song_details(df):
-    """Allows selection of a song and displays its full details AND video."""
+SEARCH_RESULTS_PER_PAGE = 20
+SIMILAR_SONGS = 10
+
+def link_selected_track(track_lookup):
+    """Puts the selected song's identifier in the URL so the view can be shared."""
+    link_key = track_lookup.link_key(st.session_state['song_details_track'])
+    if link_key is not None:
+        st.query_params.from_dict({link_key[0]: link_key[1]})
+
+@PROFILER.timed()
+def show_similar_songs(df, similarity_index, track_lookup, row):
+    """Table of the tracks most like row, each linking to its own details."""
+    st.markdown("### 🎧 Songs Like This")
+    rows, scores = similarity_index.similar(row, SIMILAR_SONGS)
+    if len(rows) == 0:
+        st.info("This track has too few audio, lyric or theme features to compare it with others.")
+        return
+    caption = f"Compared on: {', '.join(similarity_index.blocks_of(row))}."
+    if not similarity_index.exact:
+        caption += " Searched among the closest clusters of tracks, so a few matches may be missing."
+    st.caption(caption)
+    similar_cols = ['track_name', 'artist_credit_name', 'consolidated_album_title', 'release_year']
+    similar = df.iloc[rows][[col for col in similar_cols if col in df.columns]].reset_index(drop=True)
+    similar.insert(0, 'similarity', scores)
+    similar['details'] = [track_lookup.link(neighbour) for neighbour in rows]
+    st.dataframe(
+        similar,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'similarity': st.column_config.ProgressColumn("Similarity", min_value=0.0, max_value=1.0, format="%.2f"),
+            'details': st.column_config.LinkColumn("Details", display_text="Open"),
+        }
+    )
+
+@PROFILER.timed()
+def show_song_details(df, search_index, track_lookup, text_store, similarity_index=None):
+    """Search for a song and display its full details AND video.
+
+    A deep link such as ?song_cluster_id=12 (or ?track_id=, ?recording_mbid=) preselects that song.
+    """
     st.title("🔍 Individual Song Details")
-    
-    # Create a unique name for the select box
-    if 'artist_credit_name' in df.columns:
-        df['display_name'] = df['track_name'] + ' - ' + df['artist_credit_name'].fillna('Unknown Artist')
+
+    link_not_found = False
+    try:
+        linked_row = track_lookup.resolve(st.query_params)
+    except AmbiguousTrackError as e:
+        st.warning(f"The link matches more than one song, please pick it from the list. ({e})")
+        linked_row = None
     else:
-        df['display_name'] = df['track_name']
+        linked_params = [f"{col}={st.query_params[col]}" for col in track_lookup.key_cols if col in st.query_params]
+        if linked_row is None and linked_params:
+            # An unknown id must not quietly open another song: nothing is preselected
+            link_not_found = True
+            st.warning(f"The linked track ({linked_params[0]}) was not found in this dataset, please pick a song from the list.")
+
+    query = st.text_input(
+        "Search songs, albums, credits (作詞/作曲/編曲), tags or lyrics:",
+        placeholder="e.g. 愛如潮水, 李宗盛, 寂寞"
+    )
 
-    
-    selected_track_name = st.selectbox(
+    index = 0
+    if query.strip():
+        rows, scores, total = search_index.search(query, page=1, per_page=SEARCH_RESULTS_PER_PAGE)
+        if total == 0:
+            st.info(f"No songs match **{query}**.")
+            return
+
+        n_pages = -(-total // SEARCH_RESULTS_PER_PAGE)
+        page = 1
+        if n_pages > 1:
+            page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1)
+            if page > 1:
+                rows, scores, total = search_index.search(query, page=page, per_page=SEARCH_RESULTS_PER_PAGE)
+        st.caption(f"{total} matching songs, showing page {page} of {n_pages}.")
+        st.dataframe(search_index.results_frame(df, rows, scores), use_container_width=True, hide_index=True)
+        options = rows
+    else:
+        options = search_index.sorted_rows
+        if linked_row is not None:
+            index = int(search_index.label_rank[linked_row])
+        elif link_not_found:
+            index = None
+
+    # Options are row positions, so songs sharing a display name stay distinct
+    selected_position = st.selectbox(
         "Select a Song to View Full Details:", 
-        options=sorted(df['display_name'].unique())
+        options=options,
+        index=index,
+        format_func=lambda row: search_index.labels[row],
+        key='song_details_track',
+        on_change=link_selected_track,
+        args=(track_lookup,)
     )
 
-    if selected_track_name:
-        selected_row = df[df['display_name'] == selected_track_name].iloc[0]
+    if selected_position is not None:
+        # Only this track's lyrics, description, notes and tags are read from disk
+        selected_row = pd.concat([df.iloc[selected_position], pd.Series(text_store.row(selected_position), dtype=object)])
         
         st.markdown("---")
         
@@ -230,21 +415,26 @@ def show_song_details(df):
 
         # --- NEW VIDEO EMBED SECTION ---
         st.markdown("### 🎥 Video / Audio")
-        video_url = selected_row['url']
+        video_url = selected_row.get('url')
         
         # Check if the URL is a valid string (not NaN and not empty/whitespace)
         if pd.notna(video_url) and isinstance(video_url, str) and video_url.strip():
-            st.video(video_url)
+            # Merged versions list several uploads as 'url1 | url2': embed the first, link the rest
+            video_urls = [url.strip() for url in video_url.split('|') if url.strip()]
+            st.video(video_urls[0])
+            for other_url in video_urls[1:]:
+                st.markdown(f"Other upload: {other_url}")
         else:
             st.info("No video link is available for this track.")
         # --- END NEW SECTION ---
 
         st.markdown("### All Feature Details")
         
-        details_df = selected_row.drop('display_name', errors='ignore').reset_index()
+        details_df = selected_row.reset_index()
         details_df.columns = ['Feature', 'Value']
         
         details_df = details_df.dropna(subset=['Value'])
+        details_df['Value'] = details_df['Value'].astype(str) # Mixed types cannot be sent to the browser as one column
         
         st.dataframe(
             details_df, 
@@ -253,28 +443,57 @@ def show_song_details(df):
             height=600
         )
 
+        if similarity_index is not None:
+            show_similar_songs(df, similarity_index, track_lookup, selected_position)
+
 # --- 7. Time Series Dashboard Function ---
-def show_time_series_dashboard(df):
-    """Displays trends of music features over the release year."""
+# Grouping choices for the trend charts: label -> (period, time axis)
+TREND_PERIODS = {
+    "Release year": ('year', 'release'),
+    f"{BUCKET_YEARS}-year buckets": (BUCKET_YEARS, 'release'),
+    "Era (decade)": ('era', 'release'),
+    "YouTube upload year": ('year', 'upload'),
+}
+# Label metrics of the audio feature trend, with the label whose share is drawn
+FEATURE_SHARE_LABELS = {'danceability': 'danceable', 'timbre': 'bright timbre'}
+
+@profiled_cache(st.cache_resource(max_entries=DATASETS_CACHED))
+def load_trend_engine(file_path, cache_key):
+    """Builds the time-series aggregates once per dataset version; shared, so tables it builds lazily are kept."""
+    return TrendEngine(load_prepared_table(file_path, cache_key))
+
+@PROFILER.timed()
+def show_time_series_dashboard(df_ts, trends, cube, lyrics_index=None):
+    """Displays trends of music features over the release year.
+
+    df_ts is a TableView of the rows with a release year. Trend charts are
+    drawn from the precomputed TrendEngine and YearCube aggregates.
+    """
     st.title("📈 Time Series Analysis: Jeff's Music Evolution")
+    df = df_ts.df
     
     # --- Data Prep: Filter and Group ---
-    df_ts = df.dropna(subset=['release_year']).copy()
-    
     if df_ts.empty:
         st.warning("No data available with a valid release year for time series analysis.")
         return
 
-    df_ts['release_year'] = df_ts['release_year'].astype(int)
-    
-    metrics_cols = ['popularity', 'viewCount', 'likeCount', 'danceability', 'timbre']
-    available_metrics_cols = [col for col in metrics_cols if col in df_ts.columns]
-    trend_data = df_ts.groupby('release_year')[available_metrics_cols].mean().reset_index()
-
-    missing_count = len(df) - len(df_ts)
+    missing_count = trends.missing_years
     if missing_count > 0:
         st.info(f"⚠️ **Note:** {missing_count} tracks ({missing_count/len(df)*100:.2f}%) excluded due to missing release year.")
 
+    control_col1, control_col2 = st.columns(2)
+    with control_col1:
+        period_label = st.radio("Group tracks by:", list(TREND_PERIODS), horizontal=True, key='trend_period')
+    with control_col2:
+        stat = st.radio("Statistic:", ['mean', 'median'], horizontal=True, format_func=str.title, key='trend_stat')
+    period, axis = TREND_PERIODS[period_label]
+    if axis not in trends.axes:
+        st.warning("Column 'publishedAt' not found, showing release years instead.")
+        axis = 'release'
+    trend_data = trends.wide(stat, period, axis)
+    x_col = 'start' if period == 'year' else 'period'
+    x_label = {'start': period_label, 'period': period_label}
+
     st.markdown("---")
     
     # --- 1. Popularity/Metrics Trend ---
@@ -283,50 +502,83 @@ def show_time_series_dashboard(df):
     col1, col2 = st.columns(2)
     
     with col1:
-        if 'viewCount' in trend_data.columns:
+        youtube_cols = [col for col in ['viewCount', 'likeCount'] if col in trend_data.columns]
+        if youtube_cols:
             fig_trend_v = px.line(
                 trend_data,
-                x='release_year',
-                y=['viewCount', 'likeCount'],
-                title='Avg. YouTube Metrics (Views/Likes) Over Time',
-                labels={'value': 'Average Count'},
+                x=x_col,
+                y=youtube_cols,
+                title=f'{stat.title()} YouTube Metrics (Views/Likes) Over Time',
+                labels={'value': f'{stat.title()} Count', **x_label},
                 markers=True
             )
             fig_trend_v.update_layout(xaxis_tickformat='d')
-            st.plotly_chart(fig_trend_v, use_container_width=True)
+            render_chart(fig_trend_v)
 
     with col2:
         if 'popularity' in trend_data.columns:
             fig_trend_p = px.line(
                 trend_data,
-                x='release_year',
+                x=x_col,
                 y='popularity',
-                title='Avg. Spotify Popularity Over Time',
-                labels={'value': 'Average Popularity Score'},
+                title=f'{stat.title()} Spotify Popularity Over Time',
+                labels={'value': f'{stat.title()} Popularity Score', **x_label},
                 markers=True
             )
             fig_trend_p.update_layout(xaxis_tickformat='d')
-            st.plotly_chart(fig_trend_p, use_container_width=True)
-        
+            render_chart(fig_trend_p)
+
+    with st.expander("Counts, medians and percentiles per period"):
+        stats_table = trends.table(period, axis)
+        st.dataframe(stats_table.drop(columns='start'), use_container_width=True, hide_index=True)
+
+    # --- Rolling & Cumulative Windows ---
+    st.markdown("#### 滾動與累積平均")
+
+    window_metrics = [metric for metric in trends.metrics if trends.has_values(metric, axis)]
+    if window_metrics:
+        col1, col2 = st.columns(2)
+        with col1:
+            window_metric = st.selectbox("Metric:", window_metrics, key='trend_window_metric')
+        with col2:
+            window = st.slider("Rolling window (years):", min_value=2, max_value=10, value=3, key='trend_window')
+        windows = trends.windows(window_metric, window, axis)
+        fig_windows = px.line(
+            windows,
+            x='year',
+            y=['mean', 'rolling_mean', 'cumulative_mean'],
+            title=f'{window_metric}: Yearly, {window}-Year Rolling and Cumulative Mean',
+            labels={'value': window_metric, 'year': period_label if period == 'year' else 'Year'},
+            markers=True
+        )
+        fig_windows.update_layout(xaxis_tickformat='d')
+        render_chart(fig_windows)
+    else:
+        st.warning("No metric has values with a year to build windows from.")
+
     st.markdown("---")
 
     # --- 2. Feature Trend ---
     st.markdown("### 2. 聲學特徵進化趨勢")
     
-    feature_cols = ['danceability', 'timbre']
-    available_feature_cols = [col for col in feature_cols if col in trend_data.columns]
+    # Labels trended as 0/1 values, so the mean is the share of danceable / bright tracks whatever the statistic
+    feature_cols = list(FEATURE_SHARE_LABELS)
+    label_data = trends.wide('mean', period, axis, metrics=feature_cols).rename(columns=FEATURE_SHARE_LABELS)
+    available_feature_cols = [FEATURE_SHARE_LABELS[col] for col in feature_cols if FEATURE_SHARE_LABELS[col] in label_data.columns]
 
     if available_feature_cols:
         fig_feature = px.line(
-            trend_data,
-            x='release_year',
+            label_data,
+            x=x_col,
             y=available_feature_cols,
-            title='Average Audio Features Over Time',
-            labels={'value': 'Average Feature Value'},
+            title='Share of Danceable and Bright-Timbre Tracks Over Time',
+            labels={'value': 'Share of Tracks', **x_label},
             markers=True
         )
-        fig_feature.update_layout(xaxis_tickformat='d')
-        st.plotly_chart(fig_feature, use_container_width=True)
+        fig_feature.update_layout(xaxis_tickformat='d', yaxis_tickformat='.0%')
+        render_chart(fig_feature)
+    elif any(col in df.columns for col in feature_cols):
+        st.warning("Audio feature columns (danceability, timbre) have no labelled tracks with a year to plot.")
     else:
         st.warning("Audio feature columns (danceability, timbre) not found.")
 
@@ -336,8 +588,8 @@ def show_time_series_dashboard(df):
     st.markdown("### 3. AI 情緒與主題分佈 (年度對比)")
     
     THEME_COL = 'ai_theme'
-    if THEME_COL in df_ts.columns:
-        theme_counts = df_ts.groupby(['release_year', THEME_COL]).size().reset_index(name='Count')
+    if cube.has_column(THEME_COL):
+        theme_counts = cube.yearly_counts(THEME_COL).rename(columns={'count': 'Count'})
         
         fig_theme = px.bar(
             theme_counts,
@@ -348,69 +600,133 @@ def show_time_series_dashboard(df):
             labels={'release_year': 'Release Year', 'Count': 'Number of Tracks'},
         )
         fig_theme.update_layout(xaxis_tickformat='d', legend_title="AI Theme")
-        st.plotly_chart(fig_theme, use_container_width=True)
+        render_chart(fig_theme)
     else:
         st.warning("Column 'ai_theme' not found.")
 
+    st.markdown("---")
+
+    # --- 4. Lyric Vocabulary ---
+    st.markdown("### 4. 歌詞用字趨勢 (jieba 斷詞)")
+
+    if lyrics_index is None:
+        st.warning("Column 'lyrics_text' not found.")
+        return
+
+    lyric_stats = lyrics_index.stats()
+    lyric_stats['release_year'] = df['release_year'].to_numpy()
+    lyric_stats = lyric_stats.dropna(subset=['release_year', 'lyric_word_count'])
+    if lyric_stats.empty:
+        st.info("No tracks with both lyrics and a release year.")
+        return
+
+    lyric_trend = lyric_stats.groupby('release_year')[['lyric_word_count', 'lyric_richness']].mean().reset_index()
+    col1, col2 = st.columns(2)
+    with col1:
+        fig_words = px.line(
+            lyric_trend,
+            x='release_year',
+            y='lyric_word_count',
+            title='Avg. Lyric Word Count Over Time',
+            labels={'lyric_word_count': 'Average Word Count'},
+            markers=True
+        )
+        fig_words.update_layout(xaxis_tickformat='d')
+        render_chart(fig_words)
+    with col2:
+        fig_richness = px.line(
+            lyric_trend,
+            x='release_year',
+            y='lyric_richness',
+            title='Avg. Vocabulary Richness (distinct / total words) Over Time',
+            labels={'lyric_richness': 'Vocabulary Richness'},
+            markers=True
+        )
+        fig_richness.update_layout(xaxis_tickformat='d')
+        render_chart(fig_richness)
+
+    lyric_years = sorted(int(year) for year in lyric_stats['release_year'].unique())
+    selected_year = st.selectbox("Top lyric terms for year:", lyric_years, index=len(lyric_years) - 1)
+    year_rows = df_ts.rows[df_ts['release_year'].to_numpy() == selected_year]
+    st.dataframe(lyrics_index.top_terms(year_rows, n=20), use_container_width=True, hide_index=True)
+
 
 # --- 8. Main App Logic ---
+SONG_DETAILS_TAB = "🎵 Song Details"
 
 def main():
+    start_profiling('dashboard')
     st.title("🎶 Jeff Chang Music Evolution Dashboard")
 
-    # --- 1. UPDATE FILE NAME ---
-    # Make sure this points to your LATEST file
-    # (e.g., 'final_enriched_tracks_v4.csv' if you ran the fill script)
-    FILE_NAME = 'final_enriched_tracks_v3.csv' 
-    
-    df = load_data(FILE_NAME)
-    df = prepare_data(df) # This calls the FIXED function
+    # Only the selected artist / version partition is loaded
+    file_path, dataset_label = sidebar_dataset_selector()
+    if dataset_label is not None:
+        st.caption(f"Dataset: {dataset_label}")
+    cache_key = dataset_cache_key(file_path)
+    df = load_prepared_table(file_path, cache_key) # Snapshot when fresh, CSV otherwise
 
     if df.empty:
         return
 
     # --- Sidebar Filter (CHANGED TO RELEASE YEAR) ---
-    st.sidebar.header("Data Filter")
-    
-    available_years = df['release_year'].dropna().unique()
-    
-    if available_years.size > 0:
-        min_year = int(available_years.min())
-        max_year = int(available_years.max())
-        
-        year_range = st.sidebar.slider(
-            "Filter by Release Year Range:", 
-            min_value=min_year, 
-            max_value=max_year,
-            value=(min_year, max_year) # Default to all years
-        )
-        
-        df_filtered = df[(df['release_year'] >= year_range[0]) & (df['release_year'] <= year_range[1])].copy()
-        st.sidebar.info(f"Filtered to **{len(df_filtered)}** tracks from {year_range[0]} to {year_range[1]}.")
-    else:
-        df_filtered = df
-        st.sidebar.warning("Release year data is not sufficient for range filtering.")
+    with PROFILER.stage('sidebar_filters'):
+        cube = load_year_cube(file_path, cache_key)
+        year_range = sidebar_year_filter(cube.years, cube.row_count)
+        range_index = load_range_index(file_path, cache_key)
+        value_ranges = sidebar_range_filters(range_index)
+        filtered_rows = None
+        if value_ranges:
+            # Binary searches over the sorted year and value orders, no column scans
+            filtered_rows = range_index.rows(year_range, value_ranges)
+            st.sidebar.info(f"Narrowed to **{len(filtered_rows)}** tracks by {', '.join(value_ranges)}.")
+        canonical_rows = sidebar_canonical_toggle(file_path, cache_key)
+        if canonical_rows is not None:
+            if filtered_rows is None:
+                filtered_rows = range_index.rows(year_range)
+            filtered_rows = np.intersect1d(filtered_rows, canonical_rows, assume_unique=True)
 
     # --- Tabbed Interface ---
+    # Only the open tab runs (on_change='rerun' tracks which one it is); the
+    # others cost nothing until selected, and their cached indexes stay warm.
+    # A deep link to a song opens Song Details.
+    linked = any(col in st.query_params for col in TRACK_KEY_COLS)
     tab_dashboard, tab_timeseries, tab_album, tab_details = st.tabs([
         "📊 Main Dashboard (Filtered)", 
         "📈 Time Series Analysis",
-        "💿 New Album: 屬於", 
-        "🎵 Song Details" # <-- This tab is now updated
-    ])
+        "💿 Album Analysis", 
+        SONG_DETAILS_TAB # <-- This tab is now updated
+    ], default=SONG_DETAILS_TAB if linked else None, key='main_tab', on_change='rerun')
 
     with tab_dashboard:
-        show_dashboard(df_filtered)
+        if tab_dashboard.open:
+            show_dashboard(
+                df, cube, year_range, load_track_lookup(file_path, cache_key), filtered_rows, value_ranges, cache_key,
+                file_path, canonical_rows is not None
+            )
 
+    # Tabs read shared row-position views of df instead of filtered copies
     with tab_timeseries: 
-        show_time_series_dashboard(df)
+        if tab_timeseries.open:
+            df_ts = TableView(df, load_notna_rows(file_path, cache_key, 'release_year'))
+            show_time_series_dashboard(
+                df_ts, load_trend_engine(file_path, cache_key), cube, load_lyrics_index(file_path, cache_key)
+            )
 
     with tab_album:
-        show_new_album_dashboard(df)
+        if tab_album.open:
+            show_album_dashboard(
+                df, load_album_index(file_path, cache_key), load_lyrics_index(file_path, cache_key), cache_key,
+                file_path
+            )
 
     with tab_details:
-        show_song_details(df) # <-- This calls the UPDATED function
+        if tab_details.open:
+            show_song_details(
+                df, load_search_index(file_path, cache_key), load_track_lookup(file_path, cache_key),
+                load_text_store(file_path, cache_key), load_similarity_index(file_path, cache_key)
+            ) # <-- This calls the UPDATED function
 
+    sidebar_profiling_panel()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from music_data.albums import consolidate_album_titles
+
+
+def test_album_title_mappings_are_kept_per_source(tmp_path):
+    first = pd.Series(['A | B', 'B', 'B | C'])
+    second = pd.Series(['A | B', 'A', 'A | C'])
+    assert consolidate_album_titles(first, 'first.csv', tmp_path).tolist() == ['B', 'B', 'B']
+    assert consolidate_album_titles(second, 'second.csv', tmp_path).tolist() == ['A', 'A', 'A']
+    # Each source picks up its own mapping again rather than the one saved last
+    assert consolidate_album_titles(first, 'first.csv', tmp_path).tolist() == ['B', 'B', 'B']
+    assert len(list(tmp_path.glob('album_titles-*.pkl'))) == 2
+
+
+def test_album_titles_without_a_source_are_keyed_by_content(tmp_path):
+    titles = pd.Series(['A | B', None, 'B'])
+    result = consolidate_album_titles(titles, artifact_dir=tmp_path)
+    assert result.tolist()[::2] == ['B', 'B'] and pd.isna(result[1])
+    consolidate_album_titles(pd.Series(['C']), artifact_dir=tmp_path)
+    assert len(list(tmp_path.glob('album_titles-*.pkl'))) == 2
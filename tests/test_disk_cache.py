@@ -0,0 +1,26 @@
+import gc
+
+import pandas as pd
+
+from music_data.disk_cache import PreparedTableCache
+from music_data.text_store import TextStore
+
+
+def lyrics_table(n_rows, word):
+    return pd.DataFrame({'track_name': [f'{word} {i}' for i in range(n_rows)], 'lyrics_text': [word * 50] * n_rows})
+
+
+def test_evict_skips_entries_an_open_text_store_reads(tmp_path):
+    cache = PreparedTableCache(tmp_path, max_bytes=1)
+    first = cache.entry_for('first.csv', lambda: lyrics_table(100, '一'), key='first')
+    text_store = TextStore(first)
+    cache.pin(first, text_store)
+
+    cache.entry_for('second.csv', lambda: lyrics_table(100, '二'), key='second') # Over the cap: evicts
+    assert first.exists()
+    assert text_store.row(42)['lyrics_text'] == '一' * 50
+
+    del text_store
+    gc.collect()
+    cache.entry_for('third.csv', lambda: lyrics_table(100, '三'), key='third')
+    assert not first.exists()
@@ -0,0 +1,111 @@
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+from music_data import enrich
+from music_data.enrich_stub import StubHandler
+
+MBIDS = [f'mbid-{i}' for i in range(6)]
+
+
+class RecordingHandler(StubHandler):
+    """Stub that records every request path and can inject failures."""
+    paths = []
+    # Requests answered normally before every further one gets a 401 (the credentials "expire")
+    ok_before_401 = None
+    # Failed attempts before a path is answered: a 503, then a body cut short
+    transient_failures = 0
+
+    def failed(self):
+        self.paths.append(self.path)
+        if self.ok_before_401 is not None and len(self.paths) > self.ok_before_401:
+            self.send_json(401, {'error': 'unauthorized'})
+            return True
+        attempt = Counter(self.paths)[self.path]
+        if attempt <= self.transient_failures:
+            if attempt % 2:
+                self.send_json(503, {'error': 'unavailable'})
+            else:
+                # Announces more bytes than it sends, so the client sees an IncompleteRead
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '100')
+                self.end_headers()
+                self.wfile.write(b'{"id": ')
+            return True
+        return False
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    handler = type('Handler', (RecordingHandler,), {'paths': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(enrich, 'BACKOFF_SECONDS', 0.01)
+    yield handler, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def musicbrainz(base_url):
+    source = enrich.MusicBrainzSource(base_url)
+    source.rate = 1000.0
+    return source
+
+
+def tracks():
+    return pd.DataFrame({'recording_mbid': MBIDS, 'isrcs': '', 'release_mbids': '', 'recording_duration_ms': ''})
+
+
+def requested_ids(paths):
+    return [path.split('/')[-1].split('?')[0] for path in paths]
+
+
+def test_interrupted_run_resumes_without_refetching(stub, tmp_path):
+    handler, base_url = stub
+    handler.ok_before_401 = 3
+    store = enrich.EnrichmentStore(tmp_path / 'store.sqlite')
+    first = enrich.enrich(tracks(), [musicbrainz(base_url)], store)
+    store.close()
+    fetched = requested_ids(handler.paths[:3])
+    assert (first['isrcs'] != '').sum() == 3
+
+    handler.ok_before_401 = None
+    handler.paths.clear()
+    store = enrich.EnrichmentStore(tmp_path / 'store.sqlite')
+    second = enrich.enrich(tracks(), [musicbrainz(base_url)], store)
+    store.close()
+    assert sorted(requested_ids(handler.paths)) == sorted(set(MBIDS) - set(fetched))
+    assert (second['isrcs'] != '').all()
+    assert second['recording_duration_ms'].str.isdigit().all()
+
+
+def test_transient_errors_are_retried(stub, tmp_path):
+    handler, base_url = stub
+    handler.transient_failures = 2
+    store = enrich.EnrichmentStore(tmp_path / 'store.sqlite')
+    df = enrich.enrich(tracks(), [musicbrainz(base_url)], store)
+    store.close()
+    assert (df['isrcs'] != '').all()
+    assert Counter(requested_ids(handler.paths)) == {mbid: 3 for mbid in MBIDS}
+
+
+def test_full_mode_bypasses_the_response_cache(stub, tmp_path):
+    handler, base_url = stub
+    store = enrich.EnrichmentStore(tmp_path / 'store.sqlite')
+    for mode in ['full', 'full']:
+        enrich.enrich(tracks(), [musicbrainz(base_url)], store, mode)
+    store.close()
+    assert Counter(requested_ids(handler.paths)) == {mbid: 2 for mbid in MBIDS}
+
+
+def test_sources_must_implement_request_and_parse():
+    class Incomplete(enrich.Source):
+        name = 'incomplete'
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from music_data.similarity import approximate_neighbours, top_neighbours
+
+
+def clustered_features(n_rows=4000, n_clusters=40, dims=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(n_clusters, dims))
+    features = centres[rng.integers(0, n_clusters, n_rows)] + 0.3 * rng.normal(size=(n_rows, dims))
+    features /= np.linalg.norm(features, axis=1, keepdims=True)
+    present = np.ones((n_rows, 1), dtype=np.float32)
+    present[::10] = 0 # Rows without features have no neighbours
+    features[::10] = 0
+    return features.astype(np.float32), np.ones(1, dtype=np.float32), present
+
+
+def test_exact_search_matches_brute_force():
+    features, weights, present = clustered_features(n_rows=300)
+    neighbours, scores = top_neighbours(features, weights, present, 5, block_size=7)
+    similarity = features @ features.T
+    np.fill_diagonal(similarity, -np.inf)
+    similarity[present[:, 0] == 0] = -np.inf
+    similarity[:, present[:, 0] == 0] = -np.inf
+    for row in np.flatnonzero(present[:, 0]):
+        assert np.allclose(scores[row], np.sort(similarity[row])[::-1][:5], atol=1e-5)
+    assert (neighbours[::10] == -1).all()
+
+
+def test_approximate_search_finds_most_exact_neighbours():
+    features, weights, present = clustered_features()
+    exact_neighbours, exact_scores = top_neighbours(features, weights, present, 10)
+    neighbours, scores = approximate_neighbours(features, weights, present, 10)
+    assert (neighbours[::10] == -1).all()
+    rows = np.flatnonzero(present[:, 0])
+    assert (neighbours[rows] != rows[:, None]).all()
+    # Scores are exact for the neighbours found, and most of the exact top 10 are found
+    found = scores[rows] >= exact_scores[rows, -1:] - 1e-5
+    assert found.mean() > 0.9
+    assert np.allclose(np.einsum('ij,ikj->ik', features[rows], features[neighbours[rows]]), scores[rows], atol=1e-5)
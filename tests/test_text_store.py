@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from music_data.disk_cache import PreparedTableCache
+from music_data.text_store import TextStore
+
+
+def test_reopens_a_deleted_cache_entry(tmp_path):
+    cache = PreparedTableCache(tmp_path)
+    table = pd.DataFrame({'track_name': ['a', 'b', 'c'], 'lyrics_text': ['一', None, '三']})
+    build = lambda: cache.entry_for('tracks.csv', lambda: table, key='tracks')
+    text_store = TextStore(build(), reopen=build)
+
+    cache.invalidate() # As `python -m music_data.disk_cache --clear` would from another process
+    assert text_store.row(2) == {'lyrics_text': '三'}
+    assert text_store.row(1) == {}
+    assert text_store.column('lyrics_text').tolist()[0] == '一'
+
+
+def test_missing_file_without_reopen_raises(tmp_path):
+    cache = PreparedTableCache(tmp_path)
+    path = cache.entry_for('tracks.csv', lambda: pd.DataFrame({'lyrics_text': ['一']}), key='tracks')
+    text_store = TextStore(path)
+    cache.invalidate()
+    with pytest.raises(FileNotFoundError):
+        text_store.row(0)